@@ -3,28 +3,59 @@ import json
 
 from django.contrib.auth.models import User
 from django.conf.urls.defaults import url
+from django.core.cache import cache
 from django.shortcuts import get_object_or_404
 
 from tastypie import fields
 from tastypie.authorization import DjangoAuthorization
 from tastypie.constants import ALL_WITH_RELATIONS, ALL
 from tastypie.resources import ModelResource
-from tastypie.http import HttpCreated, HttpApplicationError
+from tastypie.http import HttpCreated, HttpApplicationError, HttpConflict
 from tastypie.utils import dict_strip_unicode_keys, trailing_slash
 
-from builds.models import Build, Version
+from builds import version_sync
+from builds.models import Build, Version, VersionArtifact
 from projects.models import Project, ImportedFile
-from projects.utils import highest_version, mkversion, slugify_uniquely
+from projects.utils import highest_version, mkversion
 from projects import tasks
 from djangome import views as djangome
 
-from .utils import SearchMixin, PostAuthentication, EnhancedModelResource
+from .utils import (SearchMixin, PostAuthentication, EnhancedModelResource,
+                    CachedResourceMixin)
 
 log = logging.getLogger(__name__)
 
-
-class ProjectResource(ModelResource, SearchMixin):
+SYNC_HASH_TIMEOUT = 60 * 60 * 24 * 7
+
+# What ProjectResource.full_dehydrate reads, fetched in bulk for every page.
+# Downloads are added to the page afterwards, see attach_downloads.
+PROJECT_PREFETCH = ['users']
+
+
+def attach_downloads(project_bundles):
+    """
+    Add the downloads of their latest version to dehydrated projects, with
+    one query for all of them.
+    """
+    bundles = [bundle for bundle in project_bundles
+               if hasattr(bundle, 'data')]
+    downloads = dict((bundle.obj.pk, {}) for bundle in bundles)
+    if not downloads:
+        return
+    artifacts = (VersionArtifact.objects
+                 .filter(version__project__in=downloads.keys(),
+                         version__slug='latest')
+                 .select_related('version'))
+    for artifact in artifacts:
+        downloads[artifact.version.project_id][artifact.type] = (
+            artifact.get_absolute_url())
+    for bundle in bundles:
+        bundle.data['downloads'] = downloads[bundle.obj.pk]
+
+
+class ProjectResource(CachedResourceMixin, ModelResource, SearchMixin):
     users = fields.ToManyField('api.base.UserResource', 'users')
+    response_scope = 'project'
 
     class Meta:
         include_absolute_url = True
@@ -39,18 +70,24 @@ class ProjectResource(ModelResource, SearchMixin):
         }
 
     def get_object_list(self, request):
-        self._meta.queryset = Project.objects.public(user=request.user)
+        self._meta.queryset = (Project.objects.public(user=request.user)
+                               .prefetch_related(*PROJECT_PREFETCH))
         return super(ProjectResource, self).get_object_list(request)
 
+    def response_project(self, obj):
+        return obj.pk
+
     def dehydrate(self, bundle):
         bundle.data['subdomain'] = "http://%s/" % bundle.obj.subdomain
-        downloads = {}
-        downloads['htmlzip'] = bundle.obj.get_htmlzip_url()
-        downloads['epub'] = bundle.obj.get_epub_url()
-        downloads['pdf'] = bundle.obj.get_pdf_url()
-        downloads['manpage'] = bundle.obj.get_manpage_url()
-        downloads['dash'] = bundle.obj.get_dash_url()
-        bundle.data['downloads'] = downloads
+        bundle.data['downloads'] = {}
+        return bundle
+
+    def alter_list_data_to_serialize(self, request, data):
+        attach_downloads(data['objects'])
+        return data
+
+    def alter_detail_data_to_serialize(self, request, bundle):
+        attach_downloads([bundle])
         return bundle
 
     def post_list(self, request, **kwargs):
@@ -74,43 +111,6 @@ class ProjectResource(ModelResource, SearchMixin):
         updated_bundle = self.obj_create(bundle, request=request)
         return HttpCreated(location=self.get_resource_uri(updated_bundle))
 
-    def _sync_versions(self, project, versions): 
-        """
-        Update the database with the current versions from the repository.
-        """
-        old_versions = project.versions.values_list('identifier', flat=True)
-
-        # Add new versions
-        for version in versions:
-            if version['identifier'] in old_versions:
-                continue
-            slug = slugify_uniquely(Version, version['verbose_name'], 'slug', 255, project=project)
-            Version.objects.create(
-                    project=project,
-                    slug=slug,
-                    identifier=version['identifier'],
-                    verbose_name=version['verbose_name'],
-                )
-
-    def _delete_versions(self, project, versions):
-        """
-        Delete all versions not in the current repo.
-        """
-        current_versions = []
-        for version in versions['tags']:
-            current_versions.append(version['identifier'])
-        for version in versions['branches']:
-            current_versions.append(version['identifier'])
-        to_delete_qs = project.versions.exclude(
-                identifier__in=current_versions).exclude(
-                uploaded=True).exclude(
-                active=True
-            )
-        ret_val = to_delete_qs.values_list('identifier', flat=True)
-        to_delete_qs.delete()
-        return ret_val
-
-
     def sync_versions(self, request, **kwargs):
         """
         Sync the version data in the repo (on the build server) with what we have in the database.
@@ -128,9 +128,20 @@ class ProjectResource(ModelResource, SearchMixin):
             self.is_authenticated(request)
             self.throttle_check(request)
             self.log_throttled_access(request)
-            self._sync_versions(project, data['tags'])
-            self._sync_versions(project, data['branches'])
-            deleted_versions = self._delete_versions(project, data)
+            sync_key = 'sync_versions_hash:%s' % project.pk
+            if 'tags' not in data and 'branches' not in data:
+                # Nothing changed on the build server since the last sync.
+                if data.get('hash') and cache.get(sync_key) == data['hash']:
+                    return self.create_response(request, [])
+                return self.create_response(
+                    request,
+                    {'exception': 'Unknown version hash'},
+                    response_class=HttpConflict,
+                )
+            deleted_versions = version_sync.sync_versions(
+                project, data.get('tags', []), data.get('branches', []))
+            if data.get('hash'):
+                cache.set(sync_key, data['hash'], SYNC_HASH_TIMEOUT)
         except Exception, e:
             return self.create_response(
                 request,
@@ -156,8 +167,9 @@ class ProjectResource(ModelResource, SearchMixin):
         ]
 
 
-class VersionResource(EnhancedModelResource):
+class VersionResource(CachedResourceMixin, EnhancedModelResource):
     project = fields.ForeignKey(ProjectResource, 'project', full=True)
+    response_scope = 'version'
 
     class Meta:
         queryset = Version.objects.all()
@@ -180,10 +192,22 @@ class VersionResource(EnhancedModelResource):
     #     return bundle
 
     def get_object_list(self, request):
-        self._meta.queryset = Version.objects.public(user=request.user,
-                                                     only_active=False)
+        self._meta.queryset = (
+            Version.objects.public(user=request.user, only_active=False)
+            .select_related('project')
+            .prefetch_related(*['project__%s' % related
+                                for related in PROJECT_PREFETCH]))
         return super(VersionResource, self).get_object_list(request)
 
+    def alter_list_data_to_serialize(self, request, data):
+        attach_downloads([bundle.data['project']
+                          for bundle in data['objects']])
+        return data
+
+    def alter_detail_data_to_serialize(self, request, bundle):
+        attach_downloads([bundle.data['project']])
+        return bundle
+
     def version_compare(self, request, **kwargs):
         project = get_object_or_404(Project, slug=kwargs['project_slug'])
         highest = highest_version(project.versions.filter(active=True))
@@ -245,15 +269,42 @@ class VersionResource(EnhancedModelResource):
         ]
 
 
-class BuildResource(EnhancedModelResource):
+class ArtifactResource(EnhancedModelResource):
+    version = fields.ForeignKey(VersionResource, 'version')
+
+    class Meta:
+        always_return_data = True
+        allowed_methods = ['get', 'post']
+        queryset = VersionArtifact.objects.select_related('version')
+        authentication = PostAuthentication()
+        authorization = DjangoAuthorization()
+        filtering = {
+            "version": ALL_WITH_RELATIONS,
+            "type": ALL,
+        }
+
+    def obj_create(self, bundle, request=None, **kwargs):
+        """
+        Replace the artifact of the same type an earlier build recorded.
+        """
+        version = self.fields['version'].hydrate(bundle).obj
+        VersionArtifact.objects.filter(
+            version=version, type=bundle.data.get('type')).delete()
+        return super(ArtifactResource, self).obj_create(bundle,
+                                                        request=request,
+                                                        **kwargs)
+
+
+class BuildResource(CachedResourceMixin, EnhancedModelResource):
     project = fields.ForeignKey('api.base.ProjectResource', 'project')
     version = fields.ForeignKey('api.base.VersionResource', 'version')
+    response_scope = 'build'
 
     class Meta:
         always_return_data = True
         include_absolute_url = True
         allowed_methods = ['get', 'post', 'put']
-        queryset = Build.objects.all()
+        queryset = Build.objects.select_related('project', 'version')
         authentication = PostAuthentication()
         authorization = DjangoAuthorization()
         filtering = {
@@ -281,13 +332,24 @@ class FileResource(EnhancedModelResource, SearchMixin):
 
     class Meta:
         allowed_methods = ['get', 'post']
-        queryset = ImportedFile.objects.all()
+        queryset = (ImportedFile.objects.select_related('project', 'version')
+                    .prefetch_related(*['project__%s' % related
+                                        for related in PROJECT_PREFETCH]))
         excludes = ['md5', 'slug']
         include_absolute_url = True
         authentication = PostAuthentication()
         authorization = DjangoAuthorization()
         search_facets = ['project']
 
+    def alter_list_data_to_serialize(self, request, data):
+        attach_downloads([bundle.data['project']
+                          for bundle in data['objects']])
+        return data
+
+    def alter_detail_data_to_serialize(self, request, bundle):
+        attach_downloads([bundle.data['project']])
+        return bundle
+
     def override_urls(self):
         return [
             url(r"^(?P<resource_name>%s)/schema/$" %
@@ -0,0 +1,147 @@
+"""Cached, conditional GET responses for the read-only API.
+
+Build servers and other tools poll the same project, version and build
+resources over and over. Successful GET responses are cached in the Django
+cache with an ETag (a hash of the body) and a Last-Modified date, and
+requests with a matching ``If-None-Match`` or ``If-Modified-Since`` get a 304.
+
+Every project has a generation, the time anything serialized with it last
+changed: saving or deleting a project or one of its versions, artifacts or
+builds bumps it (see ``core.models``). While rendering a response the
+resources record the projects it shows with ``depends_on``, and a cached
+response is only used while none of their generations moved past the time
+it was rendered. Builds only ever invalidate the responses of their own
+project.
+
+Objects added to a list don't touch the projects already in it, so list
+responses are only cached for ``API_LIST_CACHE_SECONDS``.
+"""
+import hashlib
+import time
+
+from django.conf import settings
+from django.core.cache import cache
+from django.http import HttpResponse, HttpResponseNotModified
+from django.utils.http import (http_date, parse_etags, parse_http_date_safe,
+                               quote_etag)
+
+GENERATION_KEY = 'api_response_generation:v2:project:%s'
+RESPONSE_KEY = 'api_response:v2:%s:%s'
+GENERATION_TIMEOUT = 60 * 60 * 24 * 30
+
+
+def bump(*project_pks):
+    """
+    Forget the cached responses that show any of ``project_pks``.
+    """
+    now = time.time()
+    cache.set_many(dict((GENERATION_KEY % pk, now) for pk in project_pks),
+                   GENERATION_TIMEOUT)
+
+
+def depends_on(request, *project_pks):
+    """
+    Record that the response to ``request`` shows ``project_pks``.
+    """
+    if not hasattr(request, '_response_projects'):
+        request._response_projects = set()
+    request._response_projects.update(project_pks)
+
+
+def generations(project_pks, now=None):
+    """
+    The generations of ``project_pks``. Projects without one start a new
+    generation, their old one may have been evicted along with a bump.
+    """
+    keys = dict((GENERATION_KEY % pk, pk) for pk in project_pks)
+    found = cache.get_many(keys.keys())
+    missing = [key for key in keys if key not in found]
+    if missing:
+        if now is None:
+            now = time.time()
+        for key in missing:
+            cache.add(key, now, GENERATION_TIMEOUT)
+        found.update(cache.get_many(missing))
+    return dict((keys[key], value) for key, value in found.items())
+
+
+def is_current(cached):
+    project_pks = cached['projects']
+    if not project_pks:
+        return True
+    current = generations(project_pks)
+    return (len(current) == len(project_pks) and
+            max(current.values()) <= cached['rendered'])
+
+
+def response_key(scope, request):
+    """
+    Responses differ by URL, requested format and whoever is asking, the
+    latter only known from the session or the Authorization header before
+    the API authenticates the request.
+    """
+    user = getattr(request, 'user', None)
+    parts = [
+        request.get_full_path(),
+        request.META.get('HTTP_ACCEPT', ''),
+        request.META.get('HTTP_AUTHORIZATION', ''),
+        str(user.pk) if user is not None and user.is_authenticated() else '',
+    ]
+    digest = hashlib.md5('\n'.join(parts)).hexdigest()
+    return RESPONSE_KEY % (scope, digest)
+
+
+def is_not_modified(request, etag, last_modified):
+    if_none_match = request.META.get('HTTP_IF_NONE_MATCH')
+    if if_none_match:
+        etags = parse_etags(if_none_match)
+        return etag in etags or '*' in etags
+    if_modified_since = parse_http_date_safe(
+        request.META.get('HTTP_IF_MODIFIED_SINCE'))
+    if if_modified_since is not None:
+        return int(last_modified) <= if_modified_since
+    return False
+
+
+def cached_response(scope, request, view, is_list=False):
+    """
+    Call ``view`` for GET requests that aren't cached yet, and answer the
+    others from the cache. ``view`` takes the request and records the
+    projects it shows with ``depends_on``.
+    """
+    if request.method not in ('GET', 'HEAD'):
+        return view(request)
+    key = response_key(scope, request)
+    cached = cache.get(key)
+    if cached is None or not is_current(cached):
+        rendered = time.time()
+        response = view(request)
+        if hasattr(response, 'render') and not response.is_rendered:
+            response.render()
+        if response.status_code != 200 or response.has_header('Set-Cookie'):
+            return response
+        project_pks = sorted(getattr(request, '_response_projects', []))
+        current = generations(project_pks, now=rendered)
+        cached = {
+            'content': response.content,
+            'content_type': response['Content-Type'],
+            'etag': hashlib.md5(response.content).hexdigest(),
+            # Lists can gain members without a bump.
+            'last_modified': (rendered if is_list
+                              else max(current.values() or [rendered])),
+            'projects': project_pks,
+            'rendered': rendered,
+        }
+        if is_list:
+            timeout = getattr(settings, 'API_LIST_CACHE_SECONDS', 60)
+        else:
+            timeout = getattr(settings, 'API_RESPONSE_CACHE_SECONDS', 60 * 60)
+        cache.set(key, cached, timeout)
+    if is_not_modified(request, cached['etag'], cached['last_modified']):
+        response = HttpResponseNotModified()
+    else:
+        response = HttpResponse(cached['content'],
+                                content_type=cached['content_type'])
+    response['ETag'] = quote_etag(cached['etag'])
+    response['Last-Modified'] = http_date(cached['last_modified'])
+    return response
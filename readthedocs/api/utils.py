@@ -13,8 +13,11 @@ from tastypie.exceptions import NotFound, ImmediateHttpResponse
 from tastypie import http
 from tastypie.utils.mime import build_content_type
 
+from core.faceted_search import SearchResults
 from core.forms import FacetedSearchForm
 
+from . import response_cache
+
 log = logging.getLogger(__name__)
 
 
@@ -45,6 +48,7 @@ class SearchMixin(object):
             facets=getattr(self._meta, 'search_facets', []),
             page_size=getattr(self._meta, 'search_page_size', 20),
             highlight=getattr(self._meta, 'search_highlight', True))
+        object_list = self.alter_list_data_to_serialize(request, object_list)
         self.log_throttled_access(request)
         return self.create_response(request, object_list)
 
@@ -76,12 +80,20 @@ class SearchMixin(object):
         form = FacetedSearchForm(request.GET, facets=facets or [],
                                  models=(model,), load_all=True)
         if not form.is_valid():
-            return self.error_response({'errors': form.errors}, request)
-        results = form.search()
+            raise ImmediateHttpResponse(
+                response=self.error_response({'errors': form.errors}, request))
+        try:
+            page_number = int(request.GET.get('page', 1))
+        except ValueError:
+            raise Http404(ugettext("Sorry, no results on that page."))
+        # One backend request for the page, the count and the facets.
+        results = SearchResults(form.search(),
+                                start=max(page_number - 1, 0) * page_size,
+                                page_size=page_size, load_all=True)
 
         paginator = Paginator(results, page_size)
         try:
-            page = paginator.page(int(request.GET.get('page', 1)))
+            page = paginator.page(page_number)
         except InvalidPage:
             raise Http404(ugettext("Sorry, no results on that page."))
 
@@ -121,7 +133,7 @@ class SearchMixin(object):
             'objects': objects,
         }
         if facets:
-            object_list.update({'facets': results.facet_counts()})
+            object_list.update({'facets': results.facets})
         return object_list
 
     # XXX: This method is available in the latest tastypie, remove
@@ -132,10 +144,9 @@ class SearchMixin(object):
         else:
             desired_format = self._meta.default_format
         serialized = self.serialize(request, errors, desired_format)
-        response = http.HttpBadRequest(
+        return http.HttpBadRequest(
             content=serialized,
             content_type=build_content_type(desired_format))
-        raise ImmediateHttpResponse(response=response)
 
 
 class PostAuthentication(BasicAuthentication):
@@ -147,6 +158,32 @@ class PostAuthentication(BasicAuthentication):
         return val
 
 
+class CachedResourceMixin(object):
+    """
+    Answers GET requests from the cached responses of ``response_scope``, see
+    ``api.response_cache``.
+    """
+    response_scope = None
+
+    def response_project(self, obj):
+        """
+        The pk of the project whose changes invalidate ``obj``.
+        """
+        return obj.project_id
+
+    def full_dehydrate(self, bundle):
+        response_cache.depends_on(bundle.request,
+                                  self.response_project(bundle.obj))
+        return super(CachedResourceMixin, self).full_dehydrate(bundle)
+
+    def dispatch(self, request_type, request, **kwargs):
+        parent = super(CachedResourceMixin, self).dispatch
+        return response_cache.cached_response(
+            self.response_scope, request,
+            lambda request: parent(request_type, request, **kwargs),
+            is_list=request_type == 'list')
+
+
 class EnhancedModelResource(ModelResource):
     def obj_get_list(self, request=None, **kwargs):
         """
@@ -3,7 +3,7 @@
 """
 
 from django.contrib import admin
-from builds.models import Build, VersionAlias, Version
+from builds.models import Build, VersionAlias, Version, VersionArtifact
 from guardian.admin import GuardedModelAdmin
 
 
@@ -16,6 +16,13 @@ class VersionAdmin(GuardedModelAdmin):
     list_filter = ('project', 'privacy_level')
 
 
+class VersionArtifactAdmin(admin.ModelAdmin):
+    list_display = ('version', 'type', 'size', 'date')
+    list_filter = ('type',)
+    raw_id_fields = ('version',)
+
+
 admin.site.register(Build, BuildAdmin)
 admin.site.register(VersionAlias)
 admin.site.register(Version, VersionAdmin)
+admin.site.register(VersionArtifact, VersionArtifactAdmin)
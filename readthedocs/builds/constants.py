@@ -13,3 +13,11 @@ BUILD_TYPES = (
     ('man', _('Manpage')),
     ('dash', _('Dash')),
 )
+
+ARTIFACT_TYPES = (
+    ('pdf', _('PDF')),
+    ('htmlzip', _('HTML')),
+    ('epub', _('Epub')),
+    ('manpage', _('Manpage')),
+    ('dash', _('Dash')),
+)
@@ -1,12 +1,18 @@
+import os
+
+from django.conf import settings
 from django.db import models
+from django.utils.datastructures import SortedDict
 from django.utils.translation import ugettext_lazy as _, ugettext
 
-from guardian.shortcuts import assign, get_objects_for_user
+from guardian.shortcuts import get_objects_for_user
 from taggit.managers import TaggableManager
 
+from core.permissions import grant_object_permissions
 from projects.models import Project
 from projects import constants
-from .constants import BUILD_STATE, BUILD_TYPES
+from projects.utils import version_sort_key
+from .constants import ARTIFACT_TYPES, BUILD_STATE, BUILD_TYPES
 
 
 class VersionManager(models.Manager):
@@ -88,6 +94,9 @@ class Version(models.Model):
     privacy_level = models.CharField(
         _('Privacy Level'), max_length=20, choices=constants.PRIVACY_CHOICES,
         default='public', help_text=_("Level of privacy for this Version."))
+    # Orders like the slug's NormalizedVersion, see version_sort_key.
+    sort_key = models.CharField(_('Sort key'), max_length=255, default='',
+                                db_index=True, editable=False)
 
     tags = TaggableManager(blank=True)
     objects = VersionManager()
@@ -117,12 +126,81 @@ class Version(models.Model):
         """
         Add permissions to the Version for all owners on save.
         """
+        self.sort_key = version_sort_key(self.slug)
         obj = super(Version, self).save(*args, **kwargs)
-        for owner in self.project.users.all():
-            assign('view_version', owner, self)
+        grant_object_permissions('view_version', self.project.users.all(),
+                                 [self])
         return obj
 
 
+class VersionArtifactManager(models.Manager):
+
+    def record(self, version, data):
+        """
+        Create or update the artifact of ``version`` with ``data['type']``.
+        """
+        artifact, created = self.get_or_create(
+            version_id=version.pk, type=data['type'], defaults=data)
+        if not created:
+            for key, value in data.items():
+                setattr(artifact, key, value)
+            artifact.save()
+        return artifact
+
+    def download_urls(self, project):
+        """
+        The download URLs of a project's active versions, newest version
+        first, in one query.
+
+        Returns a SortedDict of version slug -> ``{'pdf_url': ..., ...}``,
+        without the versions that have no downloads.
+        """
+        rows = (self.filter(version__project=project, version__active=True)
+                .order_by('-version__sort_key', '-version__verbose_name')
+                .values_list('version__slug', 'type', 'path'))
+        downloads = SortedDict()
+        for version_slug, artifact_type, path in rows:
+            urls = downloads.setdefault(version_slug, {})
+            urls['%s_url' % artifact_type] = os.path.join(settings.MEDIA_URL,
+                                                          path)
+            if artifact_type == 'dash':
+                urls['dash_feed_url'] = project.get_dash_feed_url(version_slug)
+        return downloads
+
+
+class VersionArtifact(models.Model):
+    """
+    A downloadable file built for a version, recorded by the builders when
+    they move it into ``MEDIA_ROOT``.
+    """
+    version = models.ForeignKey(Version, verbose_name=_('Version'),
+                                related_name='artifacts')
+    type = models.CharField(_('Type'), max_length=20, choices=ARTIFACT_TYPES)
+    # Relative to MEDIA_ROOT and MEDIA_URL.
+    path = models.CharField(_('Path'), max_length=255)
+    size = models.BigIntegerField(_('Size'), default=0)
+    sha1 = models.CharField(_('SHA1'), max_length=40, blank=True)
+    date = models.DateTimeField(_('Date'), auto_now=True)
+
+    objects = VersionArtifactManager()
+
+    class Meta:
+        unique_together = [('version', 'type')]
+
+    def __unicode__(self):
+        return ugettext(u"%(type)s of %(version)s" % {
+            'type': self.type,
+            'version': self.version,
+        })
+
+    def get_absolute_url(self):
+        return os.path.join(settings.MEDIA_URL, self.path)
+
+    @property
+    def full_path(self):
+        return os.path.join(settings.MEDIA_ROOT, self.path)
+
+
 class VersionAlias(models.Model):
     project = models.ForeignKey(Project, verbose_name=_('Project'),
                                 related_name='aliases')
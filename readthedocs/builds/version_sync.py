@@ -0,0 +1,95 @@
+"""Set based syncing of a project's versions with the tags and branches in its
+repository.
+
+All existing versions are loaded once. Inserts and deletes are worked out in
+Python, slugs are made unique in memory, and the results are written with
+bulk queries, so the number of queries doesn't grow with the number of refs.
+"""
+import logging
+
+from api import response_cache
+from core import autocomplete, slug_filter
+from core.permissions import BATCH_SIZE, grant_object_permissions
+from projects.utils import _custom_slugify, version_sort_key
+
+from .models import Version
+
+log = logging.getLogger(__name__)
+
+
+def unique_slug(initial, taken, max_length=255):
+    """
+    Pick a slug for ``initial`` that isn't in the set ``taken``, with the same
+    ``-0``, ``-1``, ... suffixes as ``slugify_uniquely``. Adds it to ``taken``.
+
+    ``taken`` holds lowercased slugs. The database compares slugs without
+    regard to case, so ``Feature`` clashes with an existing ``feature``.
+    """
+    slug = _custom_slugify(initial)[:max_length]
+    current = slug
+    index = 0
+    while current.lower() in taken:
+        current = '%s-%s' % (slug, index)
+        index += 1
+    taken.add(current.lower())
+    return current
+
+
+def sync_versions(project, tags, branches):
+    """
+    Create versions for tags and branches that aren't in the database yet and
+    delete inactive versions whose ref is gone.
+
+    ``tags`` and ``branches`` are lists of dicts with ``identifier`` and
+    ``verbose_name``. Returns the identifiers of the deleted versions.
+    """
+    existing = list(project.versions.values_list(
+        'pk', 'identifier', 'slug', 'active', 'uploaded'))
+    identifiers = set(row[1] for row in existing)
+    slugs = set(row[2].lower() for row in existing)
+
+    to_create = []
+    # Tags are added before branches, and versions are only checked against
+    # what existed before each pass, like the per-row sync used to do.
+    for refs in [tags, branches]:
+        new_versions = [ref for ref in refs
+                        if ref['identifier'] not in identifiers]
+        for ref in new_versions:
+            slug = unique_slug(ref['verbose_name'], slugs)
+            to_create.append(Version(
+                project=project,
+                slug=slug,
+                identifier=ref['identifier'],
+                verbose_name=ref['verbose_name'],
+                sort_key=version_sort_key(slug),
+            ))
+        identifiers.update(ref['identifier'] for ref in new_versions)
+
+    if to_create:
+        for start in range(0, len(to_create), BATCH_SIZE):
+            Version.objects.bulk_create(to_create[start:start + BATCH_SIZE])
+        new_slugs = [version.slug for version in to_create]
+        created = []
+        for start in range(0, len(new_slugs), BATCH_SIZE):
+            created.extend(project.versions.filter(
+                slug__in=new_slugs[start:start + BATCH_SIZE]))
+        grant_object_permissions('view_version', project.users.all(),
+                                 created)
+        # bulk_create doesn't send post_save, add them to the filter here.
+        slug_filter.add(project.slug, new_slugs)
+        response_cache.bump(project.pk)
+        autocomplete.changed(project.pk)
+        log.info("Created %s versions for %s" % (len(to_create), project))
+
+    current = set(ref['identifier'] for ref in tags)
+    current.update(ref['identifier'] for ref in branches)
+    to_delete = [(pk, identifier)
+                 for pk, identifier, slug, active, uploaded in existing
+                 if identifier not in current and not active and not uploaded]
+    delete_pks = [pk for pk, identifier in to_delete]
+    for start in range(0, len(delete_pks), BATCH_SIZE):
+        Version.objects.filter(
+            pk__in=delete_pks[start:start + BATCH_SIZE]).delete()
+    if to_delete:
+        log.info("Deleted %s versions for %s" % (len(to_delete), project))
+    return [identifier for pk, identifier in to_delete]
@@ -0,0 +1,207 @@
+"""In-memory indexes for the project and version autocompletes.
+
+The autocompletes used to run a ``LIKE '%term%'`` over all public projects or
+versions on every keystroke. Instead each process keeps:
+
+* a ``PrefixIndex`` of the public project names, a sorted list of every
+  lowercased name and of its suffixes starting at a word ("Read the Docs" is
+  found by "read", "the d" and "docs"), searched with ``bisect``. The best
+  matches for terms of up to ``AUTOCOMPLETE_PRECOMPUTED_LENGTH`` characters
+  are worked out when the index is built, since those match the most names;
+* the active public version slugs of each project, loaded on demand.
+
+Saving or deleting a project, or a version of a project, bumps a generation in
+the Django cache (see ``core.models``). Processes check the generations at
+most every ``AUTOCOMPLETE_REFRESH_SECONDS`` and rebuild what changed on the
+next lookup. Results are ranked: exact matches first, then matches at the
+start of the name, then elsewhere; shorter names first.
+"""
+import bisect
+import heapq
+import re
+import time
+
+from django.conf import settings
+from django.core.cache import cache
+
+PROJECTS_KEY = 'autocomplete:v1:projects'
+VERSIONS_KEY = 'autocomplete:v1:versions:%s'
+GENERATION_TIMEOUT = 60 * 60 * 24 * 30
+LIMIT = 20
+
+WORD_RE = re.compile(r'[^\W_]+', re.UNICODE)
+
+_projects = {'index': None, 'generation': None, 'checked': 0}
+_versions = {}
+
+
+def _rank(term, value, at_start):
+    lowered = value.lower()
+    return (lowered != term, not at_start, len(value), lowered)
+
+
+def rank(term, values, limit=LIMIT):
+    """
+    The best ``limit`` of ``values`` containing ``term``, for values that
+    aren't in an index.
+    """
+    term = term.strip().lower()
+    if not term:
+        return []
+    ranked = [(_rank(term, value, value.lower().startswith(term)), value)
+              for value in values if term in value.lower()]
+    ranked.sort()
+    return [value for _, value in ranked[:limit]]
+
+
+def merge(term, *results, **kwargs):
+    """
+    Merge ranked result lists, dropping duplicates.
+    """
+    return rank(term, set(sum(results, [])), kwargs.get('limit', LIMIT))
+
+
+class PrefixIndex(object):
+    """
+    Values found by the prefixes of their words.
+    """
+
+    def __init__(self, values, precomputed_length=2, limit=LIMIT):
+        entries = []
+        for value in set(values):
+            lowered = value.lower()
+            starts = set([0] + [match.start() for match in
+                                WORD_RE.finditer(lowered)])
+            for start in starts:
+                entries.append((lowered[start:], start == 0, value))
+        entries.sort()
+        self.keys = [entry[0] for entry in entries]
+        self.entries = entries
+        self.limit = limit
+        self.precomputed = {}
+        self.precomputed_length = precomputed_length
+        prefixes = set(key[:length] for key in self.keys
+                       for length in range(1, precomputed_length + 1))
+        for prefix in prefixes:
+            self.precomputed[prefix] = self._search(prefix)
+
+    def __len__(self):
+        return len(self.entries)
+
+    def _search(self, term):
+        low = bisect.bisect_left(self.keys, term)
+        high = bisect.bisect_left(self.keys, term + u'\uffff')
+        best = {}
+        for key, at_start, value in self.entries[low:high]:
+            value_rank = _rank(term, value, at_start)
+            if value not in best or value_rank < best[value]:
+                best[value] = value_rank
+        ranked = heapq.nsmallest(self.limit,
+                                 [(value_rank, value) for value, value_rank
+                                  in best.items()])
+        return [value for _, value in ranked]
+
+    def search(self, term):
+        term = term.strip().lower()
+        if not term:
+            return []
+        if term in self.precomputed:
+            return self.precomputed[term]
+        if len(term) <= self.precomputed_length:
+            # Nothing starts with it.
+            return []
+        return self._search(term)
+
+
+def _refresh_seconds():
+    return getattr(settings, 'AUTOCOMPLETE_REFRESH_SECONDS', 10)
+
+
+def changed(project_pk=None):
+    """
+    Drop the project index, or the version index of ``project_pk``, in every
+    process.
+    """
+    if project_pk is None:
+        key = PROJECTS_KEY
+        _projects['index'] = None
+    else:
+        key = VERSIONS_KEY % project_pk
+        _versions.pop(project_pk, None)
+    cache.set(key, time.time(), GENERATION_TIMEOUT)
+
+
+def _generation(key):
+    value = cache.get(key)
+    if value is None:
+        cache.add(key, time.time(), GENERATION_TIMEOUT)
+        value = cache.get(key)
+    return value
+
+
+def project_index():
+    """
+    This process' index of the public project names.
+    """
+    now = time.time()
+    if _projects['checked'] + _refresh_seconds() < now:
+        generation = _generation(PROJECTS_KEY)
+        if generation != _projects['generation']:
+            _projects['index'] = None
+            _projects['generation'] = generation
+        _projects['checked'] = now
+    index = _projects['index']
+    if index is None:
+        from projects import constants
+        from projects.models import Project
+        names = Project.objects.filter(
+            privacy_level=constants.PUBLIC).values_list('name', flat=True)
+        index = PrefixIndex(
+            names,
+            getattr(settings, 'AUTOCOMPLETE_PRECOMPUTED_LENGTH', 2))
+        _projects['index'] = index
+    return index
+
+
+def version_slugs(project):
+    """
+    The active public version slugs of ``project``, newest first.
+    """
+    now = time.time()
+    cached = _versions.get(project.pk)
+    if cached and cached['checked'] + _refresh_seconds() < now:
+        if _generation(VERSIONS_KEY % project.pk) != cached['generation']:
+            cached = None
+        else:
+            cached['checked'] = now
+    if not cached:
+        from builds.models import Version
+        generation = _generation(VERSIONS_KEY % project.pk)
+        slugs = list(Version.objects.public(project=project)
+                     .order_by('-sort_key')
+                     .values_list('slug', flat=True))
+        cached = {'slugs': slugs, 'generation': generation, 'checked': now}
+        _versions[project.pk] = cached
+    return cached['slugs']
+
+
+def search_projects(term, limit=LIMIT):
+    return project_index().search(term)[:limit]
+
+
+def search_versions(project, term, limit=LIMIT):
+    """
+    The version slugs of ``project`` containing ``term``: the exact match,
+    then the ones starting with it, newest first.
+    """
+    term = term.strip().lower()
+    if not term:
+        return []
+    ranked = []
+    for position, slug in enumerate(version_slugs(project)):
+        lowered = slug.lower()
+        if term in lowered:
+            ranked.append(((lowered != term, not lowered.startswith(term),
+                            position), slug))
+    ranked.sort()
+    return [slug for _, slug in ranked[:limit]]
@@ -0,0 +1,221 @@
+"""Mapping of CNAMEd hosts to project slugs.
+
+Hosts CNAMEd to us used to be resolved with a DNS query inside the request
+whenever the cache missed, and bogus hosts were never cached. Now requests
+only ever read a host -> slug table kept in Redis and loaded into each
+worker's memory, and never block on DNS:
+
+* ``DOMAINS_KEY`` is a hash of the hosts that point at us -> project slug.
+* A host that isn't in it is answered as not ours, and resolved by the
+  ``resolve_domain`` task, queued once per ``DOMAIN_NEGATIVE_SECONDS``. Hosts
+  that don't point at us are kept out of the hash, in ``NEGATIVE_KEY`` keys
+  that expire after ``DOMAIN_NEGATIVE_SECONDS``, so bogus Host headers can't
+  grow the table the workers load.
+* ``refresh`` re-resolves entries older than ``DOMAIN_REFRESH_SECONDS`` and
+  drops the ones that don't point at us anymore, run it from
+  ``./manage.py refresh_domains``.
+* ``seed`` fills the hash from the ``rtd_slug:v1:<slug>`` sets of hosts
+  seen before the map existed, run it once from ``./manage.py seed_domains``.
+
+Workers reload the table every ``DOMAIN_MAP_RELOAD_SECONDS`` in a background
+thread, serving from the previous copy meanwhile.
+"""
+import logging
+import threading
+import time
+
+from django.conf import settings
+
+from core import redis_pool
+from core.resolver import LRUCache
+
+log = logging.getLogger(__name__)
+
+DOMAINS_KEY = 'rtd_domains:v1'
+CHECKED_KEY = 'rtd_domains:v1:checked'
+NEGATIVE_KEY = 'rtd_domains:v1:negative:%s'
+SLUG_HOSTS_KEY = 'rtd_slug:v1:%s'
+
+
+def get_redis():
+    return redis_pool.get_redis('domains')
+
+
+def resolve_cname(host):
+    """
+    The project slug ``host`` is CNAMEd to, or None. This blocks on DNS and
+    must only be called outside of requests, see ``queue_host``.
+    """
+    from dns import resolver
+    from dns.exception import DNSException
+    dns_resolver = resolver.Resolver()
+    dns_resolver.lifetime = getattr(settings, 'DOMAIN_RESOLVE_TIMEOUT', 5)
+    try:
+        answer = [ans for ans in dns_resolver.query(host, 'CNAME')][0]
+    except (DNSException, IndexError):
+        return None
+    domain = answer.target.to_unicode()
+    return domain.split('.')[0]
+
+
+def _negative_seconds():
+    return getattr(settings, 'DOMAIN_NEGATIVE_SECONDS', 60 * 60)
+
+
+def update_host(host, redis_conn=None):
+    """
+    Resolve ``host`` and store the result in the domain table.
+    """
+    if redis_conn is None:
+        redis_conn = get_redis()
+    slug = resolve_cname(host)
+    pipe = redis_conn.pipeline()
+    if slug:
+        pipe.hset(DOMAINS_KEY, host, slug)
+        pipe.hset(CHECKED_KEY, host, time.time())
+        pipe.delete(NEGATIVE_KEY % host)
+        # Cache the slug -> host mapping permanently.
+        pipe.sadd(SLUG_HOSTS_KEY % slug, host)
+    else:
+        pipe.hdel(DOMAINS_KEY, host)
+        pipe.hdel(CHECKED_KEY, host)
+        pipe.set(NEGATIVE_KEY % host, '1')
+        pipe.expire(NEGATIVE_KEY % host, _negative_seconds())
+    pipe.execute()
+    log.info("Domain map: %s -> %s" % (host, slug))
+    return slug
+
+
+def queue_host(host, redis_conn=None):
+    """
+    Queue resolving ``host``, unless it was resolved as not ours or queued
+    in the last ``DOMAIN_NEGATIVE_SECONDS``.
+
+    Returns whether it was queued.
+    """
+    from projects.tasks import resolve_domain
+    if redis_conn is None:
+        redis_conn = get_redis()
+    if not redis_conn.setnx(NEGATIVE_KEY % host, ''):
+        return False
+    redis_conn.expire(NEGATIVE_KEY % host, _negative_seconds())
+    resolve_domain.delay(host)
+    return True
+
+
+def refresh(redis_conn=None):
+    """
+    Resolve hosts that haven't been checked in a while.
+
+    Returns the number of hosts resolved.
+    """
+    if redis_conn is None:
+        redis_conn = get_redis()
+    now = time.time()
+    max_age = getattr(settings, 'DOMAIN_REFRESH_SECONDS', 60 * 60 * 24)
+    checked = redis_conn.hgetall(CHECKED_KEY)
+    hosts = [host for host in redis_conn.hkeys(DOMAINS_KEY)
+             if now - float(checked.get(host, 0)) > max_age]
+    for host in hosts:
+        update_host(host, redis_conn)
+    return len(hosts)
+
+
+def seed(redis_conn=None):
+    """
+    Add the hosts of the ``rtd_slug:v1:<slug>`` sets that aren't in the
+    domain table yet, so custom domains keep working without a DNS query.
+
+    They're marked as never checked, the next ``refresh`` re-resolves them.
+    Returns the number of hosts added.
+    """
+    if redis_conn is None:
+        redis_conn = get_redis()
+    prefix = SLUG_HOSTS_KEY % ''
+    added = 0
+    for key in redis_conn.keys(prefix + '*'):
+        slug = key[len(prefix):]
+        for host in redis_conn.smembers(key):
+            if redis_conn.hsetnx(DOMAINS_KEY, host, slug):
+                added += 1
+    log.info("Domain map: Seeded %s hosts" % added)
+    return added
+
+
+class DomainMap(object):
+    """
+    This worker's copy of the domain table.
+
+    Hosts missing from it are looked up in Redis once per reload, at most
+    ``DOMAIN_MISS_CACHE_SIZE`` of them are remembered.
+    """
+
+    def __init__(self, reload_seconds=None):
+        if reload_seconds is None:
+            reload_seconds = getattr(settings, 'DOMAIN_MAP_RELOAD_SECONDS', 60)
+        self.reload_seconds = reload_seconds
+        self.table = None
+        self.loaded = 0
+        self.misses = LRUCache(
+            getattr(settings, 'DOMAIN_MISS_CACHE_SIZE', 1000), reload_seconds)
+        self._reloading = False
+        self._lock = threading.Lock()
+
+    def reload(self):
+        table = get_redis().hgetall(DOMAINS_KEY)
+        with self._lock:
+            self.table = table
+            self.loaded = time.time()
+            self._reloading = False
+        return table
+
+    def _reload_in_background(self):
+        try:
+            self.reload()
+        except Exception:
+            log.exception("Domain map: Unable to reload")
+            with self._lock:
+                self._reloading = False
+
+    def _maybe_reload(self):
+        if self.table is None:
+            # Nothing to serve from yet, one Redis round trip it is.
+            self.reload()
+            return
+        with self._lock:
+            if (self._reloading or
+                    self.loaded + self.reload_seconds > time.time()):
+                return
+            self._reloading = True
+        thread = threading.Thread(target=self._reload_in_background)
+        thread.daemon = True
+        thread.start()
+
+    def _resolve(self, host):
+        if self.misses.get(host):
+            return None
+        redis_conn = get_redis()
+        # Another worker may have resolved it since our last reload.
+        slug = redis_conn.hget(DOMAINS_KEY, host)
+        if slug:
+            with self._lock:
+                self.table[host] = slug
+            return slug
+        self.misses.set(host, True)
+        queue_host(host, redis_conn)
+        return None
+
+    def lookup(self, host):
+        """
+        The project slug for ``host``, or None if it's not ours.
+
+        Hosts this worker hasn't seen yet are looked up in Redis, and queued
+        to be resolved if they aren't there.
+        """
+        self._maybe_reload()
+        if host in self.table:
+            return self.table[host] or None
+        return self._resolve(host)
+
+
+domain_map = DomainMap()
@@ -0,0 +1,151 @@
+"""Running faceted searches against the search backend.
+
+Going through a ``SearchQuerySet`` the usual way sends a request to Solr for
+the facet counts, another for the total and another for each page of hits.
+``search_page`` asks for a page of hits with the total and facet counts in a
+single request, and caches the answer for ``SEARCH_CACHE_SECONDS`` keyed by
+the normalized backend query, so the same search from many users (or the
+same user paging back and forth) doesn't hit Solr again.
+"""
+import hashlib
+import logging
+
+from django.conf import settings
+from django.core.cache import cache
+
+from haystack.query import EmptySearchQuerySet
+
+log = logging.getLogger(__name__)
+
+CACHE_KEY = 'faceted_search:v1:%s'
+
+
+class SearchPage(object):
+    """
+    The hits from ``start`` to ``end`` of a search, with the total number of
+    hits and the facet counts.
+    """
+
+    def __init__(self, start, end, results, count, facets):
+        self.start = start
+        self.end = end
+        self.results = results
+        self.count = count
+        self.facets = facets
+
+
+def _normalize(value):
+    if isinstance(value, dict):
+        return sorted((key, _normalize(item)) for key, item in value.items())
+    if isinstance(value, (set, frozenset, list, tuple)):
+        return sorted(_normalize(item) for item in value)
+    if isinstance(value, type):
+        return '%s.%s' % (value.__module__, value.__name__)
+    return value
+
+
+def cache_key(query_string, params):
+    """
+    Queries differing only in whitespace or in the order of their facets,
+    narrowing queries and models share a key.
+    """
+    normalized = repr((u' '.join(query_string.split()), _normalize(params)))
+    if isinstance(normalized, unicode):
+        normalized = normalized.encode('utf-8')
+    return CACHE_KEY % hashlib.md5(normalized).hexdigest()
+
+
+def load_objects(results):
+    """
+    Load the model instances of ``results`` with a query per model, instead
+    of one per result. Results whose instance is gone are left out.
+    """
+    pks_by_model = {}
+    for result in results:
+        pks_by_model.setdefault(result.model, []).append(result.pk)
+    loaded = {}
+    for model, pks in pks_by_model.items():
+        to_python = model._meta.pk.to_python
+        objects = model._default_manager.in_bulk([to_python(pk)
+                                                  for pk in pks])
+        for pk, obj in objects.items():
+            loaded[(model, unicode(pk))] = obj
+    found = []
+    for result in results:
+        obj = loaded.get((result.model, unicode(result.pk)))
+        if obj is not None:
+            result._object = obj
+            found.append(result)
+    return found
+
+
+def search_page(searchqueryset, start, end, load_all=False):
+    """
+    Run ``searchqueryset`` for the hits from ``start`` to ``end`` with one
+    backend request, or none if it's cached.
+    """
+    if isinstance(searchqueryset, EmptySearchQuerySet):
+        return SearchPage(start, end, [], 0, {})
+    query = searchqueryset.all().query
+    query.set_limits(start, end)
+    query_string = query.build_query()
+    params = query.build_params()
+    key = cache_key(query_string, params)
+    page = cache.get(key)
+    if page is None:
+        log.debug("Searching for %s" % query_string)
+        raw = query.backend.search(query_string, **params)
+        page = SearchPage(start, end, raw.get('results', []),
+                          raw.get('hits', 0),
+                          query.post_process_facets(raw) or {})
+        cache.set(key, page, getattr(settings, 'SEARCH_CACHE_SECONDS', 60))
+    if load_all:
+        page.results = load_objects(page.results)
+    return page
+
+
+class SearchResults(object):
+    """
+    All the hits of a search as far as paginators can tell, fetching the page
+    they ask for with ``search_page``. The first page is fetched up front for
+    the total and facet counts.
+    """
+
+    def __init__(self, searchqueryset, start=0, page_size=20, load_all=False):
+        self.searchqueryset = searchqueryset
+        self.load_all = load_all
+        self.current = search_page(searchqueryset, start, start + page_size,
+                                   load_all)
+
+    @property
+    def facets(self):
+        return self.current.facets
+
+    def count(self):
+        return self.current.count
+
+    def __len__(self):
+        return self.current.count
+
+    def __iter__(self):
+        return iter(self.current.results)
+
+    def _page(self, start, end):
+        current = self.current
+        # Paginators cut the last page short at the total.
+        if start == current.start and (end <= current.end or
+                                       current.end >= current.count):
+            return current.results[:end - start]
+        self.current = search_page(self.searchqueryset, start, end,
+                                   self.load_all)
+        return self.current.results
+
+    def __getitem__(self, index):
+        if isinstance(index, slice):
+            start = index.start or 0
+            end = index.stop if index.stop is not None else self.count()
+            return self._page(start, end)
+        results = self._page(index, index + 1)
+        if not results:
+            raise IndexError(index)
+        return results[0]
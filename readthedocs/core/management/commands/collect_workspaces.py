@@ -0,0 +1,32 @@
+import logging
+from optparse import make_option
+
+from django.core.management.base import BaseCommand
+
+from projects import workspace_gc
+
+log = logging.getLogger(__name__)
+
+
+class Command(BaseCommand):
+    """Evict least recently used checkouts and virtualenvs until the build
+    server is under its disk budget. Invoked via
+    ``./manage.py collect_workspaces``.
+    """
+
+    option_list = BaseCommand.option_list + (
+        make_option('-b',
+                    dest='budget',
+                    default=None,
+                    type='int',
+                    help='Disk budget in bytes, defaults to '
+                         'WORKSPACE_DISK_BUDGET'),
+    )
+
+    def handle(self, *args, **options):
+        freed = workspace_gc.collect(budget=options['budget'])
+        log.info("Freed %s bytes" % freed)
+
+    @property
+    def help(self):
+        return Command.__doc__
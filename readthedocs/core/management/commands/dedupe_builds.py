@@ -0,0 +1,46 @@
+import logging
+import os
+from optparse import make_option
+
+from django.conf import settings
+from django.core.management.base import BaseCommand
+
+from doc_builder.dedupe import dedupe_tree, prune_store
+
+log = logging.getLogger(__name__)
+
+
+class Command(BaseCommand):
+    """Hardlink identical files across all built documentation and downloads.
+    Invoked via ``./manage.py dedupe_builds [slug ...]``.
+    """
+
+    option_list = BaseCommand.option_list + (
+        make_option('--prune',
+                    action='store_true',
+                    dest='prune',
+                    default=False,
+                    help='Remove store objects no build links to anymore'),
+    )
+
+    def handle(self, *args, **options):
+        if options['prune']:
+            prune_store()
+            return
+        if len(args):
+            roots = [os.path.join(settings.DOCROOT, slug, 'rtd-builds')
+                     for slug in args]
+        else:
+            roots = [os.path.join(settings.DOCROOT, slug, 'rtd-builds')
+                     for slug in os.listdir(settings.DOCROOT)]
+            for media_type in ['htmlzip', 'pdf', 'epub', 'man', 'dash']:
+                roots.append(os.path.join(settings.MEDIA_ROOT, media_type))
+        saved = 0
+        for root in roots:
+            if os.path.isdir(root):
+                saved += dedupe_tree(root)
+        log.info("Deduplicated builds, saved %s bytes" % saved)
+
+    @property
+    def help(self):
+        return Command.__doc__
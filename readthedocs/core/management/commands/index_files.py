@@ -0,0 +1,51 @@
+import logging
+import time
+from optparse import make_option
+
+from django.core.management.base import BaseCommand
+
+from builds.models import Version
+from projects import bulk_index, constants
+
+log = logging.getLogger(__name__)
+
+
+class Command(BaseCommand):
+    """Index the files of public projects for search, a version at a time,
+    extracting their text in a pool of processes. Invoked via
+    ``./manage.py index_files [slug ...]``.
+    """
+
+    option_list = BaseCommand.option_list + (
+        make_option('--processes',
+                    type='int',
+                    dest='processes',
+                    default=None,
+                    help='Number of text extraction processes'),
+        make_option('--batch-size',
+                    type='int',
+                    dest='batch_size',
+                    default=None,
+                    help='Number of documents sent to the backend at once'),
+    )
+
+    def handle(self, *args, **options):
+        versions = (Version.objects.select_related('project')
+                    .filter(project__privacy_level=constants.PUBLIC,
+                            imported_filed__isnull=False)
+                    .distinct())
+        if len(args):
+            versions = versions.filter(project__slug__in=args)
+        start = time.time()
+        total = 0
+        for version in versions.iterator():
+            total += bulk_index.index_version(
+                version, processes=options['processes'],
+                batch_size=options['batch_size'])
+        elapsed = time.time() - start
+        log.info("Indexed %s files in %.1f seconds (%.1f files/second)"
+                 % (total, elapsed, total / max(elapsed, 0.001)))
+
+    @property
+    def help(self):
+        return Command.__doc__
@@ -0,0 +1,22 @@
+import logging
+
+from django.core.management.base import BaseCommand
+
+from core import slug_filter
+
+log = logging.getLogger(__name__)
+
+
+class Command(BaseCommand):
+    """Rebuild the filter of existing project and version slugs that lets
+    requests for nonexistent docs 404 without a query. Invoked via
+    ``./manage.py rebuild_slug_filter``, run it periodically from cron.
+    """
+
+    def handle(self, *args, **options):
+        bloom = slug_filter.rebuild()
+        log.info("Slug filter is %s bytes" % len(bloom.bits))
+
+    @property
+    def help(self):
+        return Command.__doc__
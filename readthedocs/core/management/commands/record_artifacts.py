@@ -0,0 +1,41 @@
+import logging
+
+from django.core.management.base import BaseCommand
+
+from builds.models import Version, VersionArtifact
+from doc_builder.artifacts import artifact_data
+
+log = logging.getLogger(__name__)
+
+ARTIFACT_PATHS = (
+    ('pdf', 'get_pdf_path'),
+    ('htmlzip', 'get_htmlzip_path'),
+    ('epub', 'get_epub_path'),
+    ('manpage', 'get_manpage_path'),
+    ('dash', 'get_dash_path'),
+)
+
+
+class Command(BaseCommand):
+    """Record the downloads already in MEDIA_ROOT as version artifacts, for
+    builds made before builders recorded them. Invoked via
+    ``./manage.py record_artifacts [slug ...]``.
+    """
+
+    def handle(self, *args, **options):
+        versions = Version.objects.select_related('project')
+        if len(args):
+            versions = versions.filter(project__slug__in=args)
+        recorded = 0
+        for version in versions.iterator():
+            for artifact_type, path_method in ARTIFACT_PATHS:
+                path = getattr(version.project, path_method)(version.slug)
+                data = artifact_data(artifact_type, path)
+                if data is not None:
+                    VersionArtifact.objects.record(version, data)
+                    recorded += 1
+        log.info("Recorded %s artifacts" % recorded)
+
+    @property
+    def help(self):
+        return Command.__doc__
@@ -0,0 +1,22 @@
+import logging
+
+from django.core.management.base import BaseCommand
+
+from core import domains
+
+log = logging.getLogger(__name__)
+
+
+class Command(BaseCommand):
+    """Resolve newly seen CNAMEd hosts and re-check stale entries in the
+    domain map the subdomain middleware serves from. Invoked via
+    ``./manage.py refresh_domains``, run it periodically from cron.
+    """
+
+    def handle(self, *args, **options):
+        resolved = domains.refresh()
+        log.info("Resolved %s hosts" % resolved)
+
+    @property
+    def help(self):
+        return Command.__doc__
@@ -0,0 +1,22 @@
+import logging
+
+from django.core.management.base import BaseCommand
+
+from core import domains
+
+log = logging.getLogger(__name__)
+
+
+class Command(BaseCommand):
+    """Add the CNAMEd hosts recorded before the domain map existed to it, so
+    they're served without a DNS query. Invoked via
+    ``./manage.py seed_domains``, run it once when deploying the domain map.
+    """
+
+    def handle(self, *args, **options):
+        added = domains.seed()
+        log.info("Seeded %s hosts" % added)
+
+    @property
+    def help(self):
+        return Command.__doc__
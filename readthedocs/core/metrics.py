@@ -0,0 +1,225 @@
+"""Metrics of the web and worker processes, in the Prometheus text format.
+
+Processes record counters with ``inc`` and histograms with ``observe`` in
+memory, and a background thread adds them to shared totals in a Redis hash
+every ``METRICS_FLUSH_SECONDS`` (builds also flush when they end), so
+recording a metric doesn't cost a round trip. ``/metrics/`` renders the shared totals along with
+the depth of every celery queue, read when scraped: a scrape is one HGETALL
+and one pipeline of LLENs.
+"""
+from functools import wraps
+import logging
+import os
+import threading
+import time
+
+from django.conf import settings
+from django.http import Http404
+
+import redis
+
+from core import redis_pool
+
+log = logging.getLogger(__name__)
+
+METRICS_KEY = 'metrics:v1'
+CONTENT_TYPE = 'text/plain; version=0.0.4'
+
+LATENCY_BUCKETS = (0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1, 2.5, 5, 10)
+BUILD_BUCKETS = (5, 10, 30, 60, 120, 300, 600, 1200, 1800, 3600)
+
+METRICS = {
+    'rtd_builds_total': (
+        'counter', 'Finished builds by outcome.'),
+    'rtd_build_phase_seconds': (
+        'histogram', 'Time spent in each phase of a build, by outcome.'),
+    'rtd_lock_wait_seconds': (
+        'histogram', 'Time spent waiting for project locks.'),
+    'rtd_serve_docs_seconds': (
+        'histogram', 'Time to serve a docs page, by status.'),
+    'rtd_serve_docs_cache_total': (
+        'counter', 'serve_docs lookups by cache and the tier that had it.'),
+    'rtd_slug_filter_lookups_total': (
+        'counter', 'Slug filter lookups by result.'),
+    'rtd_api_client_seconds': (
+        'histogram', 'Time of API requests made by the builders.'),
+    'rtd_queue_depth': (
+        'gauge', 'Tasks waiting in each celery queue.'),
+}
+
+_lock = threading.Lock()
+_pending = {}
+_flusher = {'pid': None}
+
+
+def _escape(value):
+    return (unicode(value).replace('\\', r'\\').replace('"', r'\"')
+            .replace('\n', r'\n'))
+
+
+def series(name, labels):
+    """
+    The exposition name of the series of ``name`` with ``labels``.
+    """
+    if not labels:
+        return name
+    return '%s{%s}' % (name, ','.join('%s="%s"' % (key, _escape(value))
+                                      for key, value
+                                      in sorted(labels.items())))
+
+
+def _flush_periodically():
+    while True:
+        time.sleep(getattr(settings, 'METRICS_FLUSH_SECONDS', 10))
+        try:
+            flush()
+        except Exception:
+            log.exception("Unable to flush metrics")
+
+
+def _start_flusher():
+    # Threads don't survive a fork, every worker process needs its own.
+    pid = os.getpid()
+    with _lock:
+        if _flusher['pid'] == pid:
+            return
+        _flusher['pid'] = pid
+    thread = threading.Thread(target=_flush_periodically)
+    thread.daemon = True
+    thread.start()
+
+
+def _add(amounts):
+    with _lock:
+        for key, amount in amounts:
+            _pending[key] = _pending.get(key, 0) + amount
+    _start_flusher()
+
+
+def inc(name, amount=1, **labels):
+    """
+    Add ``amount`` to the counter ``name``.
+    """
+    _add([(series(name, labels), amount)])
+
+
+def observe(name, value, buckets=LATENCY_BUCKETS, **labels):
+    """
+    Record ``value`` in the histogram ``name``.
+
+    Every bucket gets a series, 0 for those above ``value``, so the first
+    observation creates them all.
+    """
+    amounts = [(series(name + '_bucket', dict(labels, le=repr(float(le)))),
+                1 if value <= le else 0)
+               for le in buckets]
+    amounts.append((series(name + '_bucket', dict(labels, le='+Inf')), 1))
+    amounts.append((series(name + '_sum', labels), value))
+    amounts.append((series(name + '_count', labels), 1))
+    _add(amounts)
+
+
+def flush():
+    """
+    Add what this process recorded to the shared totals.
+    """
+    with _lock:
+        pending = _pending.copy()
+        _pending.clear()
+    if not pending:
+        return
+    pipe = redis_pool.pipeline()
+    for key, amount in pending.items():
+        pipe.hincrbyfloat(METRICS_KEY, key, amount)
+    try:
+        pipe.execute()
+    except redis.RedisError:
+        log.warning("Unable to flush %s metrics" % len(pending),
+                    exc_info=True)
+
+
+def timed_view(name):
+    """
+    Record how long the view takes in the histogram ``name``, by status.
+    """
+    def decorator(view):
+        @wraps(view)
+        def wrapper(request, *args, **kwargs):
+            start = time.time()
+            status = 500
+            try:
+                response = view(request, *args, **kwargs)
+                status = response.status_code
+                return response
+            except Http404:
+                status = 404
+                raise
+            finally:
+                observe(name, time.time() - start, status=status)
+        return wrapper
+    return decorator
+
+
+def queues():
+    """
+    The celery queues tasks are routed to.
+    """
+    names = set([getattr(settings, 'CELERY_DEFAULT_QUEUE', 'celery')])
+    for route in getattr(settings, 'CELERY_ROUTES', {}).values():
+        if 'queue' in route:
+            names.add(route['queue'])
+    return sorted(names)
+
+
+def _family(key):
+    name = key.split('{', 1)[0]
+    for suffix in ['_bucket', '_sum', '_count']:
+        base = name[:-len(suffix)]
+        if (name.endswith(suffix) and
+                METRICS.get(base, ('',))[0] == 'histogram'):
+            return base
+    return name
+
+
+def _sort_key(item):
+    # Histogram buckets in order of their upper bound.
+    key = item[0]
+    if 'le="' not in key:
+        return key, 0
+    le = key.split('le="', 1)[1].split('"', 1)[0]
+    return key.replace('le="%s"' % le, ''), float(le.replace('+Inf', 'inf'))
+
+
+def render(values):
+    """
+    ``values``, a mapping of series to numbers, in the text exposition
+    format.
+    """
+    families = {}
+    for key, value in values.items():
+        families.setdefault(_family(key), []).append((key, value))
+    lines = []
+    for family in sorted(families):
+        if family in METRICS:
+            metric_type, help_text = METRICS[family]
+            lines.append('# HELP %s %s' % (family, help_text))
+            lines.append('# TYPE %s %s' % (family, metric_type))
+        for key, value in sorted(families[family], key=_sort_key):
+            lines.append('%s %s' % (key, repr(float(value))))
+    return '\n'.join(lines) + '\n'
+
+
+def collect():
+    """
+    The shared totals and the queue depths, in the text exposition format.
+    """
+    names = queues()
+    pipe = redis_pool.pipeline()
+    pipe.hgetall(METRICS_KEY)
+    for queue in names:
+        pipe.llen(queue)
+    results = pipe.execute()
+    values = dict(results[0])
+    for queue, depth in zip(names, results[1:]):
+        values[series('rtd_queue_depth', {'queue': queue})] = depth
+    return render(values)
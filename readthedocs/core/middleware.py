@@ -1,9 +1,12 @@
+import logging
+
 from django.utils.translation import ugettext_lazy as _
 from django.conf import settings
-from django.core.cache import cache
 from django.http import Http404
 
-import redis
+from core.domains import domain_map
+
+log = logging.getLogger(__name__)
 
 
 class SubdomainMiddleware(object):
@@ -45,22 +48,17 @@ class SubdomainMiddleware(object):
                 request.urlconf = 'core.subdomain_urls'
                 request.rtdheader = True
             except KeyError:
-                # Try header first, then DNS
+                # Try header first, then the domain map. Unknown hosts are
+                # resolved by a task, never in the request.
                 try:
-                    slug = cache.get(host)
-                    if not slug:
-                        redis_conn = redis.Redis(**settings.REDIS)
-                        from dns import resolver
-                        answer = [ans for ans in resolver.query(host, 'CNAME')][0]
-                        domain = answer.target.to_unicode()
-                        slug = domain.split('.')[0]
-                        cache.set(host, slug, 60*60)
-                        #Cache the slug -> host mapping permanently.
-                        redis_conn.sadd("rtd_slug:v1:%s" % slug, host)
-                    request.slug = slug
-                    request.urlconf = 'core.subdomain_urls'
-                except:
+                    slug = domain_map.lookup(host)
+                except Exception:
+                    log.exception("Domain map: Lookup of %s failed" % host)
+                    slug = None
+                if not slug:
                     # Some crazy person is CNAMEing to us. 404.
                     raise Http404(_('Invalid Host Name.'))
+                request.slug = slug
+                request.urlconf = 'core.subdomain_urls'
         # Normal request.
         return None
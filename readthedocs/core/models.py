@@ -1,10 +1,16 @@
 from django.db import models
-from django.db.models.signals import post_save
+from django.db.models.signals import (m2m_changed, post_delete, post_save,
+                                      pre_delete)
 from django.db.utils import DatabaseError
 from django.dispatch import receiver
 from django.contrib.auth.models import User
 from django.utils.translation import ugettext_lazy as _, ugettext
 
+from api import response_cache
+from builds.models import Build, Version, VersionAlias, VersionArtifact
+from core import autocomplete, resolver, slug_filter
+from projects.models import Project
+
 STANDARD_EMAIL = "anonymous@readthedocs.org"
 
 
@@ -58,3 +64,104 @@ def create_profile(sender, **kwargs):
             UserProfile.objects.create(user_id=kwargs['instance'].id)
         except DatabaseError:
             pass
+
+
+@receiver(post_save, sender=Project)
+@receiver(pre_delete, sender=Project)
+def clear_project_doc_targets(sender, instance, **kwargs):
+    slugs = Version.objects.filter(project__pk=instance.pk).values_list(
+        'slug', flat=True)
+    resolver.invalidate(instance.slug, slugs)
+    resolver.invalidate_routes(instance.slug)
+
+
+@receiver(post_save, sender=Version)
+@receiver(post_delete, sender=Version)
+def clear_version_doc_targets(sender, instance, **kwargs):
+    try:
+        project_slug = instance.project.slug
+    except Project.DoesNotExist:
+        # Deleted along with its project, which already cleared it.
+        return
+    resolver.invalidate(project_slug, [instance.slug])
+    # The default version and "largest" aliases depend on the versions.
+    resolver.invalidate_routes(project_slug)
+
+
+@receiver(post_save, sender=VersionAlias)
+@receiver(post_delete, sender=VersionAlias)
+def clear_alias_routes(sender, instance, **kwargs):
+    try:
+        project_slug = instance.project.slug
+    except Project.DoesNotExist:
+        return
+    resolver.invalidate_routes(project_slug)
+
+
+@receiver(post_save, sender=Project)
+def add_project_to_slug_filter(sender, instance, created, **kwargs):
+    if created:
+        slug_filter.add(instance.slug)
+
+
+@receiver(post_save, sender=Version)
+def add_version_to_slug_filter(sender, instance, created, **kwargs):
+    if created:
+        slug_filter.add(instance.project.slug, [instance.slug])
+
+
+@receiver(post_save, sender=Project)
+@receiver(post_delete, sender=Project)
+def clear_project_autocomplete(sender, **kwargs):
+    autocomplete.changed()
+
+
+@receiver(post_save, sender=Version)
+@receiver(post_delete, sender=Version)
+def clear_version_autocomplete(sender, instance, **kwargs):
+    autocomplete.changed(instance.project_id)
+
+
+@receiver(pre_delete, sender=Version)
+def remove_version_from_search(sender, instance, **kwargs):
+    """
+    Files aren't removed from the index one at a time as they are deleted,
+    remove all of a version's with one task instead.
+    """
+    from projects import bulk_index, tasks
+    identifiers = [bulk_index.search_identifier(pk) for pk in
+                   instance.imported_filed.values_list('pk', flat=True)]
+    if identifiers:
+        tasks.remove_search_documents.delay(identifiers)
+
+
+@receiver(post_save, sender=Project)
+@receiver(post_delete, sender=Project)
+def clear_project_api_responses(sender, instance, **kwargs):
+    response_cache.bump(instance.pk)
+
+
+@receiver(m2m_changed, sender=Project.users.through)
+def clear_project_users_api_responses(sender, instance, action, reverse,
+                                      pk_set, **kwargs):
+    if not reverse:
+        response_cache.bump(instance.pk)
+    elif pk_set:
+        response_cache.bump(*pk_set)
+    elif action == 'pre_clear':
+        response_cache.bump(*instance.projects.values_list('pk', flat=True))
+
+
+@receiver(post_save, sender=Version)
+@receiver(post_delete, sender=Version)
+@receiver(post_save, sender=Build)
+@receiver(post_delete, sender=Build)
+def clear_version_api_responses(sender, instance, **kwargs):
+    response_cache.bump(instance.project_id)
+
+
+@receiver(post_save, sender=VersionArtifact)
+@receiver(post_delete, sender=VersionArtifact)
+def clear_artifact_api_responses(sender, instance, **kwargs):
+    # Projects embed the downloads of their latest version.
+    response_cache.bump(instance.version.project_id)
@@ -0,0 +1,82 @@
+"""Bulk helpers around django-guardian's object permissions.
+
+guardian's ``assign`` does a get_or_create per (user, object), which adds up
+to thousands of queries when granting on many objects at once. These compute
+the missing grants with one read per batch and insert them with
+``bulk_create``.
+"""
+import logging
+
+from django.contrib.auth.models import Permission
+from django.contrib.contenttypes.models import ContentType
+from django.utils.encoding import force_unicode
+
+from guardian.models import UserObjectPermission
+
+log = logging.getLogger(__name__)
+
+# Keep batches well below SQLite's limit of 999 query parameters.
+BATCH_SIZE = 200
+
+
+def _batches(items, size=BATCH_SIZE):
+    for start in range(0, len(items), size):
+        yield items[start:start + size]
+
+
+def grant_object_permissions(codename, users, objects):
+    """
+    Give every user in ``users`` the ``codename`` permission on every object
+    in ``objects``, which must all be instances of the same model.
+
+    Grants that already exist are left alone. Returns the number of grants
+    created.
+    """
+    users = list(users)
+    objects = list(objects)
+    if not users or not objects:
+        return 0
+    content_type = ContentType.objects.get_for_model(objects[0])
+    permission = Permission.objects.get(content_type=content_type,
+                                        codename=codename)
+    object_pks = [force_unicode(obj.pk) for obj in objects]
+    user_pks = [user.pk for user in users]
+    existing = set()
+    for pk_batch in _batches(object_pks):
+        existing.update(
+            UserObjectPermission.objects
+            .filter(permission=permission, content_type=content_type,
+                    object_pk__in=pk_batch, user__in=user_pks)
+            .values_list('user', 'object_pk'))
+    to_create = [
+        UserObjectPermission(permission=permission,
+                             content_type=content_type,
+                             object_pk=object_pk,
+                             user_id=user_pk)
+        for user_pk in user_pks
+        for object_pk in object_pks
+        if (user_pk, object_pk) not in existing
+    ]
+    for batch in _batches(to_create):
+        UserObjectPermission.objects.bulk_create(batch)
+    if to_create:
+        log.debug("Granted %s on %s objects: %s new permissions"
+                  % (codename, len(objects), len(to_create)))
+    return len(to_create)
+
+
+def sync_project_permissions(project, users=None):
+    """
+    Make sure ``users`` (all of the project's owners by default) can view
+    ``project`` and every one of its versions.
+
+    Call this after adding owners to a project; it only writes the grants
+    that are missing. Returns the number of grants created.
+    """
+    if users is None:
+        users = project.users.all()
+    users = list(users)
+    created = grant_object_permissions('view_project', users, [project])
+    created += grant_object_permissions('view_version', users,
+                                        project.versions.all())
+    return created
@@ -0,0 +1,105 @@
+"""Picking a random ImportedFile without sorting the table.
+
+``order_by('?')`` sorts all of ImportedFile, the largest table, on every
+"random page" click. Instead some ids are cached for
+``RANDOM_PAGE_CACHE_SECONDS``:
+
+* For a project, a pool of up to ``RANDOM_PAGE_POOL_SIZE`` of its file ids,
+  sampled from all of them when the pool is built. A click fetches a random
+  one of them by primary key.
+* Overall, the smallest and largest file id. Random ids in that range are
+  looked up by primary key until one exists, up to ``RANDOM_PAGE_TRIES``
+  times, so every file is equally likely. When all of them land in gaps the
+  first file after the last one is used.
+
+Files of one project are interleaved with every other project's, so random
+ids in a project's range would mostly land on other projects' files.
+"""
+import random
+
+from django.conf import settings
+from django.core.cache import cache
+from django.db.models import Max, Min
+
+CACHE_KEY = 'random_page:v3:%s'
+
+
+def _cache_timeout():
+    return getattr(settings, 'RANDOM_PAGE_CACHE_SECONDS', 60 * 10)
+
+
+def _tries():
+    return getattr(settings, 'RANDOM_PAGE_TRIES', 5)
+
+
+def _project_pool(project_slug, refresh=False):
+    """
+    A sample of the file ids of the project ``project_slug``, empty if it has
+    none.
+    """
+    from projects.models import ImportedFile
+    key = CACHE_KEY % project_slug
+    pool = None if refresh else cache.get(key)
+    if pool is None:
+        pks = list(ImportedFile.objects.filter(project__slug=project_slug)
+                   .values_list('pk', flat=True))
+        size = getattr(settings, 'RANDOM_PAGE_POOL_SIZE', 1000)
+        pool = random.sample(pks, min(size, len(pks)))
+        cache.set(key, pool, _cache_timeout())
+    return pool
+
+
+def _random_project_file(project_slug):
+    from projects.models import ImportedFile
+    for refresh in [False, True]:
+        pool = _project_pool(project_slug, refresh=refresh)
+        if not pool:
+            return None
+        for pk in random.sample(pool, min(_tries(), len(pool))):
+            found = list(ImportedFile.objects.filter(pk=pk))
+            if found:
+                return found[0]
+        # Files were deleted since the pool was built, build it again.
+    return None
+
+
+def _bounds():
+    from projects.models import ImportedFile
+    key = CACHE_KEY % ''
+    bounds = cache.get(key)
+    if bounds is None:
+        ids = ImportedFile.objects.aggregate(low=Min('pk'), high=Max('pk'))
+        if ids['low'] is None:
+            return None
+        bounds = (ids['low'], ids['high'])
+        cache.set(key, bounds, _cache_timeout())
+    return bounds
+
+
+def _random_any_file():
+    from projects.models import ImportedFile
+    bounds = _bounds()
+    if bounds is None:
+        return None
+    low, high = bounds
+    queryset = ImportedFile.objects.all()
+    for _ in range(_tries()):
+        pivot = random.randint(low, high)
+        found = list(queryset.filter(pk=pivot))
+        if found:
+            return found[0]
+    found = list(queryset.filter(pk__gte=pivot).order_by('pk')[:1])
+    if not found:
+        # The files at the end were deleted since the bounds were cached.
+        found = list(queryset.filter(pk__lt=pivot).order_by('-pk')[:1])
+    return found[0] if found else None
+
+
+def random_file(project_slug=None):
+    """
+    A random ImportedFile, optionally of the project ``project_slug``, or
+    None if there are none.
+    """
+    if project_slug:
+        return _random_project_file(project_slug)
+    return _random_any_file()
@@ -0,0 +1,142 @@
+"""Shared Redis connection pools.
+
+Use ``get_redis()`` instead of ``redis.Redis(**settings.REDIS)``: each of
+those made a new connection pool, so every call opened (and left in
+TIME_WAIT) a new connection.
+
+Pools are named. Every pool uses ``settings.REDIS`` updated with its entry
+in ``REDIS_POOLS``, which can also set ``max_connections`` (default
+``REDIS_MAX_CONNECTIONS``)::
+
+    REDIS_POOLS = {
+        'domains': {'max_connections': 10},
+    }
+
+Every command and pipeline is timed, see ``stats()``. Commands slower than
+``REDIS_SLOW_SECONDS`` are logged.
+"""
+import logging
+import threading
+import time
+
+from django.conf import settings
+
+import redis
+from redis.client import Pipeline
+from redis.connection import UnixDomainSocketConnection
+
+log = logging.getLogger(__name__)
+
+_pools = {}
+_lock = threading.Lock()
+_timings = {}
+
+
+def _record(pool_name, command, seconds):
+    with _lock:
+        timing = _timings.setdefault((pool_name, command), [0, 0.0, 0.0])
+        timing[0] += 1
+        timing[1] += seconds
+        timing[2] = max(timing[2], seconds)
+    if seconds > getattr(settings, 'REDIS_SLOW_SECONDS', 0.1):
+        log.warning("Redis: Slow %s on pool %s: %.3f seconds"
+                    % (command, pool_name, seconds))
+
+
+class InstrumentedPipeline(Pipeline):
+    pool_name = 'default'
+
+    def execute(self, *args, **kwargs):
+        start = time.time()
+        try:
+            return super(InstrumentedPipeline, self).execute(*args, **kwargs)
+        finally:
+            _record(self.pool_name, 'PIPELINE', time.time() - start)
+
+
+class InstrumentedRedis(redis.Redis):
+    """
+    A ``redis.Redis`` client that records how long its commands take.
+    """
+    pool_name = 'default'
+
+    def execute_command(self, *args, **options):
+        start = time.time()
+        try:
+            return super(InstrumentedRedis, self).execute_command(*args,
+                                                                  **options)
+        finally:
+            _record(self.pool_name, args[0], time.time() - start)
+
+    def pipeline(self, transaction=True, shard_hint=None):
+        pipe = InstrumentedPipeline(self.connection_pool,
+                                    self.response_callbacks,
+                                    transaction, shard_hint)
+        pipe.pool_name = self.pool_name
+        return pipe
+
+
+def pool_settings(name):
+    params = dict(settings.REDIS)
+    params.update(getattr(settings, 'REDIS_POOLS', {}).get(name, {}))
+    params.setdefault('max_connections',
+                      getattr(settings, 'REDIS_MAX_CONNECTIONS', 100))
+    return params
+
+
+def get_pool(name='default'):
+    """
+    The connection pool called ``name``, created on first use.
+
+    Pools are per process, redis-py resets them after a fork.
+    """
+    with _lock:
+        if name not in _pools:
+            params = pool_settings(name)
+            if 'unix_socket_path' in params:
+                params['connection_class'] = UnixDomainSocketConnection
+                params['path'] = params.pop('unix_socket_path')
+            _pools[name] = redis.ConnectionPool(**params)
+        return _pools[name]
+
+
+def get_redis(name='default'):
+    """
+    A Redis client using the shared pool called ``name``.
+    """
+    client = InstrumentedRedis(connection_pool=get_pool(name))
+    client.pool_name = name
+    return client
+
+
+def pipeline(name='default', transaction=False):
+    """
+    A pipeline on the pool called ``name``. Queue commands on it and send
+    them in one round trip with ``execute()``.
+    """
+    return get_redis(name).pipeline(transaction=transaction)
+
+
+def stats():
+    """
+    Per pool connection counts and per command timings of this process.
+    """
+    with _lock:
+        timings = dict(_timings)
+        pools = dict(_pools)
+    result = {}
+    for name, pool in pools.items():
+        result[name] = {
+            'max_connections': pool.max_connections,
+            'created_connections': pool._created_connections,
+            'in_use_connections': len(pool._in_use_connections),
+            'commands': {},
+        }
+    for (name, command), (count, total, slowest) in timings.items():
+        pool_stats = result.setdefault(name, {'commands': {}})
+        pool_stats['commands'][command] = {
+            'count': count,
+            'seconds': total,
+            'max_seconds': slowest,
+        }
+    return result
@@ -0,0 +1,225 @@
+"""Cached lookups of what ``serve_docs`` and ``subdomain_handler`` need.
+
+Serving a page only needs a handful of fields from the project and version,
+so those are cached as a ``DocTarget`` per (project slug, version slug).
+Redirecting ``/`` and ``/<version>/`` only needs the project's default version
+and aliases, cached as a ``RoutingTable`` per project slug.
+
+Both are cached in two tiers: a small LRU in each process and the shared
+Django cache. Saving or deleting a project, version or alias clears the shared
+entries (see ``core.models``); the in-process entries expire after
+``SERVE_DOCS_LOCAL_CACHE_SECONDS`` so other processes pick up changes quickly.
+"""
+from collections import namedtuple, OrderedDict
+import logging
+import os
+import threading
+import time
+
+from django.conf import settings
+from django.core.cache import cache
+
+from builds.models import Version
+from core import metrics
+from projects import constants
+from projects.models import Project
+from projects.utils import highest_version
+
+log = logging.getLogger(__name__)
+
+
+class DocTarget(namedtuple('DocTarget', [
+        'project_pk', 'project_slug', 'language', 'documentation_type',
+        'version_pk', 'version_slug', 'privacy_level', 'active',
+        'build_path', 'translations_path'])):
+
+    @property
+    def is_public(self):
+        """
+        Whether everybody can see this version, without checking permissions.
+        """
+        return self.active and self.privacy_level == constants.PUBLIC
+
+    def base_path(self, lang_slug):
+        # Use the old paths if we're on our old location.
+        # Otherwise use the new language symlinks.
+        # This can be removed once we have 'en' symlinks for every project.
+        if lang_slug == self.language:
+            return self.build_path
+        return os.path.join(self.translations_path, lang_slug,
+                            self.version_slug)
+
+
+class RoutingTable(namedtuple('RoutingTable', [
+        'project_slug', 'language', 'documentation_type', 'default_version',
+        'aliases'])):
+    """
+    ``aliases`` maps alias slugs to the version slug they point to, with
+    "largest" aliases already resolved, or None if nothing matches.
+    """
+    pass
+
+
+class LRUCache(object):
+    """
+    A thread safe, size bounded mapping whose entries expire after
+    ``timeout`` seconds.
+    """
+
+    def __init__(self, max_size, timeout):
+        self.max_size = max_size
+        self.timeout = timeout
+        self._data = OrderedDict()
+        self._lock = threading.Lock()
+
+    def get(self, key):
+        with self._lock:
+            try:
+                expires, value = self._data.pop(key)
+            except KeyError:
+                return None
+            if expires < time.time():
+                return None
+            # Re-insert to mark it as most recently used.
+            self._data[key] = (expires, value)
+            return value
+
+    def set(self, key, value):
+        with self._lock:
+            self._data.pop(key, None)
+            self._data[key] = (time.time() + self.timeout, value)
+            while len(self._data) > self.max_size:
+                self._data.popitem(last=False)
+
+    def delete(self, key):
+        with self._lock:
+            self._data.pop(key, None)
+
+    def clear(self):
+        with self._lock:
+            self._data.clear()
+
+
+local_cache = LRUCache(
+    getattr(settings, 'SERVE_DOCS_LOCAL_CACHE_SIZE', 10000),
+    getattr(settings, 'SERVE_DOCS_LOCAL_CACHE_SECONDS', 10),
+)
+
+
+def cache_key(project_slug, version_slug):
+    return 'serve_docs:v1:%s:%s' % (project_slug, version_slug)
+
+
+def _lookup(project_slug, version_slug):
+    try:
+        version = (Version.objects.select_related('project')
+                   .get(project__slug=project_slug, slug=version_slug))
+    except Version.DoesNotExist:
+        return None
+    project = version.project
+    return DocTarget(
+        project_pk=project.pk,
+        project_slug=project.slug,
+        language=project.language,
+        documentation_type=project.documentation_type,
+        version_pk=version.pk,
+        version_slug=version.slug,
+        privacy_level=version.privacy_level,
+        active=version.active,
+        build_path=project.rtd_build_path(version.slug),
+        translations_path=os.path.join(project.doc_path, 'translations'),
+    )
+
+
+def resolve(project_slug, version_slug):
+    """
+    The ``DocTarget`` for a version of a project, or None if there is no such
+    version.
+    """
+    key = cache_key(project_slug, version_slug)
+    target = local_cache.get(key)
+    if target is not None:
+        metrics.inc('rtd_serve_docs_cache_total', cache='target', tier='local')
+        return target
+    target = cache.get(key)
+    if target is not None:
+        metrics.inc('rtd_serve_docs_cache_total', cache='target',
+                    tier='shared')
+    else:
+        metrics.inc('rtd_serve_docs_cache_total', cache='target', tier='miss')
+        target = _lookup(project_slug, version_slug)
+        if target is None:
+            return None
+        cache.set(key, target,
+                  getattr(settings, 'SERVE_DOCS_CACHE_SECONDS', 60 * 60))
+    local_cache.set(key, target)
+    return target
+
+
+def invalidate(project_slug, version_slugs):
+    """
+    Forget the cached targets of ``version_slugs`` in a project.
+    """
+    keys = [cache_key(project_slug, slug) for slug in version_slugs]
+    for key in keys:
+        local_cache.delete(key)
+    if keys:
+        cache.delete_many(keys)
+
+
+def routes_cache_key(project_slug):
+    return 'routing:v1:%s' % project_slug
+
+
+def _build_routes(project_slug):
+    try:
+        project = Project.objects.get(slug=project_slug)
+    except Project.DoesNotExist:
+        return None
+    aliases = {}
+    for alias in project.aliases.order_by('pk'):
+        if alias.from_slug in aliases:
+            continue
+        if alias.largest:
+            highest = highest_version(project.versions.filter(
+                slug__contains=alias.from_slug, active=True))
+            aliases[alias.from_slug] = highest[0].slug if highest[0] else None
+        else:
+            aliases[alias.from_slug] = alias.to_slug
+    return RoutingTable(
+        project_slug=project.slug,
+        language=project.language,
+        documentation_type=project.documentation_type,
+        default_version=project.get_default_version(),
+        aliases=aliases,
+    )
+
+
+def routes(project_slug):
+    """
+    The ``RoutingTable`` of a project, or None if there is no such project.
+    """
+    key = routes_cache_key(project_slug)
+    table = local_cache.get(key)
+    if table is not None:
+        metrics.inc('rtd_serve_docs_cache_total', cache='routes', tier='local')
+        return table
+    table = cache.get(key)
+    if table is not None:
+        metrics.inc('rtd_serve_docs_cache_total', cache='routes',
+                    tier='shared')
+    else:
+        metrics.inc('rtd_serve_docs_cache_total', cache='routes', tier='miss')
+        table = _build_routes(project_slug)
+        if table is None:
+            return None
+        cache.set(key, table,
+                  getattr(settings, 'SERVE_DOCS_CACHE_SECONDS', 60 * 60))
+    local_cache.set(key, table)
+    return table
+
+
+def invalidate_routes(project_slug):
+    key = routes_cache_key(project_slug)
+    local_cache.delete(key)
+    cache.delete(key)
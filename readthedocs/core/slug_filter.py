@@ -0,0 +1,231 @@
+"""A Bloom filter of the project slugs and project/version pairs that exist.
+
+Crawlers request lots of subdomains and versions that don't exist, and each
+of those used to cost database queries before the 404. The filter answers
+"definitely doesn't exist" without touching the database; "might exist"
+falls through to the normal lookups.
+
+The filter is rebuilt from the database by ``./manage.py rebuild_slug_filter``
+(or the ``rebuild_slug_filter`` task) and shared through the Django cache.
+Each process reloads it every ``SLUG_FILTER_REFRESH_SECONDS``, so its copy
+can miss projects and versions created since. Those are recorded with their
+creation time in the ``RECENT_KEY`` sorted set in Redis as they are saved,
+and a key the filter doesn't hold is only rejected when it isn't in there
+either. A rebuild drops the entries it has picked up, keeping a margin for
+processes still holding the previous filter. When no filter has been built,
+or Redis can't be reached, every lookup is let through.
+"""
+import hashlib
+import logging
+import math
+import threading
+import time
+
+from django.conf import settings
+from django.core.cache import cache
+
+import redis
+
+from core import metrics, redis_pool
+
+log = logging.getLogger(__name__)
+
+CACHE_KEY = 'slug_filter:v1'
+RECENT_KEY = 'slug_filter:v1:recent'
+
+_lock = threading.Lock()
+_local = {'filter': None, 'loaded': 0}
+_stats = {'rejected': 0, 'passed': 0, 'false_positives': 0,
+          'unavailable': 0}
+
+
+class BloomFilter(object):
+
+    def __init__(self, num_bits, num_hashes, bits=None):
+        self.num_bits = num_bits
+        self.num_hashes = num_hashes
+        if bits is None:
+            bits = bytearray((num_bits + 7) // 8)
+        self.bits = bytearray(bits)
+
+    @classmethod
+    def for_capacity(cls, capacity, error_rate=0.01):
+        """
+        A filter sized to hold ``capacity`` keys with a false positive rate
+        of about ``error_rate``.
+        """
+        capacity = max(capacity, 1)
+        num_bits = int(math.ceil(-capacity * math.log(error_rate) /
+                                 (math.log(2) ** 2)))
+        num_hashes = max(1, int(round(num_bits * math.log(2) / capacity)))
+        return cls(num_bits, num_hashes)
+
+    def _offsets(self, key):
+        if isinstance(key, unicode):
+            key = key.encode('utf-8')
+        digest = hashlib.md5(key).hexdigest()
+        first = int(digest[:16], 16)
+        second = int(digest[16:], 16) | 1
+        return [(first + i * second) % self.num_bits
+                for i in range(self.num_hashes)]
+
+    def add(self, key):
+        for offset in self._offsets(key):
+            self.bits[offset >> 3] |= 1 << (offset & 7)
+
+    def __contains__(self, key):
+        for offset in self._offsets(key):
+            if not self.bits[offset >> 3] & (1 << (offset & 7)):
+                return False
+        return True
+
+    def dumps(self):
+        return {'num_bits': self.num_bits, 'num_hashes': self.num_hashes,
+                'bits': str(self.bits)}
+
+    @classmethod
+    def loads(cls, data):
+        return cls(data['num_bits'], data['num_hashes'], data['bits'])
+
+
+def project_key(project_slug):
+    return u'p:%s' % project_slug
+
+
+def version_key(project_slug, version_slug):
+    return u'v:%s:%s' % (project_slug, version_slug)
+
+
+def _count(name, amount=1):
+    with _lock:
+        _stats[name] += amount
+    metrics.inc('rtd_slug_filter_lookups_total', amount, result=name)
+
+
+def get_redis():
+    return redis_pool.get_redis('slug_filter')
+
+
+def _store(bloom):
+    cache.set(CACHE_KEY, bloom.dumps(),
+              getattr(settings, 'SLUG_FILTER_TIMEOUT', 60 * 60 * 24))
+    _local['filter'] = bloom
+    _local['loaded'] = time.time()
+
+
+def rebuild():
+    """
+    Build a new filter from the database and share it.
+    """
+    from builds.models import Version
+    from projects.models import Project
+    started = time.time()
+    project_slugs = list(Project.objects.values_list('slug', flat=True))
+    version_pairs = list(Version.objects.values_list('project__slug', 'slug'))
+    bloom = BloomFilter.for_capacity(
+        len(project_slugs) + len(version_pairs),
+        getattr(settings, 'SLUG_FILTER_ERROR_RATE', 0.01))
+    for slug in project_slugs:
+        bloom.add(project_key(slug))
+    for project_slug, version_slug in version_pairs:
+        bloom.add(version_key(project_slug, version_slug))
+    _store(bloom)
+    # Saves that weren't committed yet when we read the database, and
+    # processes that haven't reloaded the filter yet, still need the
+    # entries from just before the rebuild.
+    margin = max(getattr(settings, 'SLUG_FILTER_RECENT_MARGIN', 60 * 5),
+                 2 * getattr(settings, 'SLUG_FILTER_REFRESH_SECONDS', 60))
+    try:
+        get_redis().zremrangebyscore(RECENT_KEY, '-inf', started - margin)
+    except redis.RedisError:
+        log.exception("Slug filter: Unable to prune recent additions")
+    log.info("Built slug filter of %s bytes for %s projects and %s versions"
+             % (len(bloom.bits), len(project_slugs), len(version_pairs)))
+    return bloom
+
+
+def current():
+    """
+    This process' copy of the filter, or None if none was built yet.
+    """
+    refresh = getattr(settings, 'SLUG_FILTER_REFRESH_SECONDS', 60)
+    if _local['loaded'] + refresh < time.time():
+        data = cache.get(CACHE_KEY)
+        _local['filter'] = BloomFilter.loads(data) if data else None
+        _local['loaded'] = time.time()
+    return _local['filter']
+
+
+def add(project_slug, version_slugs=()):
+    """
+    Record a new project, and optionally some of its versions, until the
+    next rebuild picks them up.
+
+    Every key is its own sorted set member, so concurrent saves don't
+    overwrite each other.
+    """
+    now = time.time()
+    pipe = redis_pool.pipeline('slug_filter')
+    # redis-py's Redis.zadd takes the member before the score.
+    pipe.zadd(RECENT_KEY, project_key(project_slug), now)
+    for version_slug in version_slugs:
+        pipe.zadd(RECENT_KEY, version_key(project_slug, version_slug), now)
+    try:
+        pipe.execute()
+    except redis.RedisError:
+        # Rejecting the new objects would 404 them, drop the filter instead.
+        log.exception("Slug filter: Unable to record additions")
+        cache.delete(CACHE_KEY)
+        _local['filter'] = None
+
+
+def _recently_added(key):
+    """
+    Whether ``key`` was added since the last rebuild. Errs on the side of
+    letting the lookup through.
+    """
+    try:
+        return get_redis().zscore(RECENT_KEY, key) is not None
+    except redis.RedisError:
+        log.exception("Slug filter: Unable to check recent additions")
+        return True
+
+
+def might_exist(project_slug, version_slug=None):
+    """
+    False if the project (or the version in it) definitely doesn't exist.
+    """
+    bloom = current()
+    if bloom is None:
+        _count('unavailable')
+        return True
+    if version_slug is None:
+        key = project_key(project_slug)
+    else:
+        key = version_key(project_slug, version_slug)
+    if key in bloom or _recently_added(key):
+        _count('passed')
+        return True
+    _count('rejected')
+    return False
+
+
+def record_false_positive():
+    """
+    Call when a lookup the filter let through turned out not to exist.
+    """
+    if _local['filter'] is not None:
+        _count('false_positives')
+
+
+def stats():
+    """
+    Counters for this process: lookups rejected by the filter, lookups let
+    through, how many of those didn't exist, and lookups made while no
+    filter was available.
+    """
+    with _lock:
+        counts = dict(_stats)
+    bloom = _local['filter']
+    counts['size'] = len(bloom.bits) if bloom is not None else 0
+    return counts
@@ -0,0 +1,143 @@
+"""Answering searches inside one project from its static search index.
+
+A search filtered to a single project (the search box in the docs) only needs
+that project's pages, and the builders already published a search index of
+them with the docs, see ``doc_builder.search_index``. ``facet_search``
+answers such searches from the index of the project's default version instead
+of Solr. Each process keeps the ``STATIC_SEARCH_CACHE_SIZE`` most recently
+used indexes loaded, until their file changes.
+"""
+import json
+import logging
+import os
+
+from django.conf import settings
+from django.core.urlresolvers import reverse
+
+from core.resolver import LRUCache
+from doc_builder.search_index import FORMAT_VERSION, INDEX_NAME, tokenize
+
+log = logging.getLogger(__name__)
+
+_loaded = LRUCache(
+    getattr(settings, 'STATIC_SEARCH_CACHE_SIZE', 20),
+    getattr(settings, 'STATIC_SEARCH_CACHE_SECONDS', 60 * 60),
+)
+
+
+class StaticResult(object):
+    """
+    A hit from a static index, with the attributes the search templates use
+    from haystack results.
+    """
+    model_name = 'importedfile'
+
+    def __init__(self, project, version, title, text, absolute_url, score):
+        self.project = project
+        self.version = version
+        self.title = title
+        self.text = text
+        self.absolute_url = absolute_url
+        self.score = score
+
+
+class StaticResults(list):
+    """
+    All the hits of a static search; static indexes have no facets.
+    """
+    facets = {}
+
+
+def load_index(index_path):
+    """
+    The search index at ``index_path``, or None if there isn't a usable one.
+    """
+    try:
+        mtime = os.path.getmtime(index_path)
+    except OSError:
+        return None
+    cached = _loaded.get(index_path)
+    if cached and cached[0] == mtime:
+        return cached[1]
+    try:
+        with open(index_path) as fh:
+            index = json.load(fh)
+    except (IOError, ValueError):
+        log.warning("Unable to load search index %s" % index_path,
+                    exc_info=True)
+        return None
+    if index.get('version') != FORMAT_VERSION:
+        return None
+    _loaded.set(index_path, (mtime, index))
+    return index
+
+
+def search(index, query):
+    """
+    The pages of ``index`` that have all the terms of ``query``, as
+    ``(page, score)`` with the best first.
+    """
+    terms = set(tokenize(query))
+    if not terms:
+        return []
+    scores = None
+    for term in terms:
+        postings = index['terms'].get(term)
+        if not postings:
+            return []
+        weights = dict(zip(postings[::2], postings[1::2]))
+        if scores is None:
+            scores = weights
+        else:
+            scores = dict((page, score + weights[page])
+                          for page, score in scores.items()
+                          if page in weights)
+    return sorted(scores.items(), key=lambda hit: (-hit[1], hit[0]))
+
+
+def _anchor(sections, terms):
+    for anchor, title in sections:
+        if terms.intersection(tokenize(title)):
+            return anchor
+    return None
+
+
+def project_search(project, version_slug, query):
+    """
+    Search the docs of ``version_slug`` of ``project``, or return None if
+    they have no static index.
+    """
+    index = load_index(os.path.join(project.rtd_build_path(version_slug),
+                                    INDEX_NAME))
+    if index is None:
+        return None
+    terms = set(tokenize(query))
+    results = StaticResults()
+    for page, score in search(index, query):
+        path, title, excerpt = index['pages'][page]
+        url = reverse('docs_detail', args=[project.slug, project.language,
+                                           version_slug, path])
+        anchor = _anchor(index['sections'][page], terms)
+        if anchor:
+            url = '%s#%s' % (url, anchor)
+        results.append(StaticResult(project.name, version_slug, title,
+                                    excerpt, url, score))
+    return results
+
+
+def facet_search(query, selected_facets):
+    """
+    Answer a search filtered to just one project from its static index, or
+    return None for Solr to answer it.
+    """
+    if not query or not selected_facets or len(selected_facets) != 1:
+        return None
+    field, _, value = selected_facets[0].partition(':')
+    if field != 'project_exact' or not value:
+        return None
+    from projects.models import Project
+    try:
+        project = Project.objects.public().get(name=value)
+    except (Project.DoesNotExist, Project.MultipleObjectsReturned):
+        return None
+    return project_search(project, project.get_default_version(), query)
@@ -14,22 +14,23 @@ from django.views.decorators.csrf import csrf_view_exempt
 from django.views.static import serve
 from django.views.generic import TemplateView
 
-from haystack.query import EmptySearchQuerySet
 from haystack.query import SearchQuerySet
 
 from builds.models import Build
 from builds.models import Version
 from core.forms import FacetedSearchForm
+from core import (faceted_search, metrics, redis_pool, resolver,
+                  slug_filter, static_search)
+from core.permissions import sync_project_permissions
+from core.random_page import random_file
 from projects.models import Project, ImportedFile, ProjectRelationship
 from projects.tasks import update_docs, remove_dir
-from projects.utils import highest_version
 
 
 import json
 import mimetypes
 import os
 import logging
-import redis
 
 log = logging.getLogger(__name__)
 
@@ -46,15 +47,18 @@ def homepage(request):
 
 
 def random_page(request, project=None):
-    imp_file = ImportedFile.objects.order_by('?')
-    if project:
-        return HttpResponseRedirect((imp_file.filter(project__slug=project)[0]
-                                             .get_absolute_url()))
-    return HttpResponseRedirect(imp_file[0].get_absolute_url())
+    imp_file = random_file(project)
+    if imp_file is None:
+        raise Http404
+    return HttpResponseRedirect(imp_file.get_absolute_url())
+
+
+def metrics_view(request):
+    return HttpResponse(metrics.collect(), mimetype=metrics.CONTENT_TYPE)
 
 
 def queue_depth(request):
-    r = redis.Redis(**settings.REDIS)
+    r = redis_pool.get_redis()
     return HttpResponse(r.llen('celery'))
 
 
@@ -160,6 +164,7 @@ def github_build(request):
                     repo=repo,
                 )
                 proj.users.add(user)
+                sync_project_permissions(proj, [user])
                 log.error("Created new project %s" % (proj))
             except Exception, e:
                 log.error("Error creating new project %s: %s" % (name, e))
@@ -210,6 +215,20 @@ def generic_build(request, pk=None):
     return redirect('builds_project_list', project.slug)
 
 
+def _get_routes_or_404(project_slug):
+    """
+    The cached routing table of a project, rejecting slugs the slug filter
+    knows don't exist without a query.
+    """
+    if not slug_filter.might_exist(project_slug):
+        raise Http404
+    routes = resolver.routes(project_slug)
+    if routes is None:
+        slug_filter.record_false_positive()
+        raise Http404
+    return routes
+
+
 def subdomain_handler(request, lang_slug=None, version_slug=None, filename=''):
     """This provides the fall-back routing for subdomain requests.
 
@@ -217,40 +236,36 @@ def subdomain_handler(request, lang_slug=None, version_slug=None, filename=''):
     brothers.
 
     """
-    project = get_object_or_404(Project, slug=request.slug)
+    routes = _get_routes_or_404(request.slug)
     # Don't add index.html for htmldir.
-    if not filename and project.documentation_type != 'sphinx_htmldir':
+    if not filename and routes.documentation_type != 'sphinx_htmldir':
         filename = "index.html"
     if version_slug is None:
         # Handle / on subdomain.
-        default_version = project.get_default_version()
         url = reverse(serve_docs, kwargs={
-            'version_slug': default_version,
-            'lang_slug': project.language,
+            'version_slug': routes.default_version,
+            'lang_slug': routes.language,
             'filename': filename
         })
         return HttpResponseRedirect(url)
     if version_slug and lang_slug is None:
         # Handle /version/ on subdomain.
-        aliases = project.aliases.filter(from_slug=version_slug)
         # Handle Aliases.
-        if aliases.count():
-            if aliases[0].largest:
-                highest_ver = highest_version(project.versions.filter(
-                    slug__contains=version_slug, active=True))
-                version_slug = highest_ver[0].slug
-            else:
-                version_slug = aliases[0].to_slug
+        if version_slug in routes.aliases:
+            version_slug = routes.aliases[version_slug]
+            if version_slug is None:
+                # A "largest" alias without any matching version.
+                raise Http404
             url = reverse(serve_docs, kwargs={
                 'version_slug': version_slug,
-                'lang_slug': project.language,
+                'lang_slug': routes.language,
                 'filename': filename
             })
         else:
             try:
                 url = reverse(serve_docs, kwargs={
                     'version_slug': version_slug,
-                    'lang_slug': project.language,
+                    'lang_slug': routes.language,
                     'filename': filename
                 })
             except NoReverseMatch:
@@ -258,7 +273,7 @@ def subdomain_handler(request, lang_slug=None, version_slug=None, filename=''):
         return HttpResponseRedirect(url)
     # Serve normal docs
     return serve_docs(request=request,
-                      project_slug=project.slug,
+                      project_slug=routes.project_slug,
                       lang_slug=lang_slug,
                       version_slug=version_slug,
                       filename=filename)
@@ -290,29 +305,36 @@ def subproject_serve_docs(request, project_slug, lang_slug=None,
         raise Http404("Subproject does not exist")
 
 
+@metrics.timed_view('rtd_serve_docs_seconds')
 def serve_docs(request, lang_slug, version_slug, filename, project_slug=None):
     if not project_slug:
         project_slug = request.slug
-    proj = get_object_or_404(Project, slug=project_slug)
 
     # Redirects
     if not version_slug or not lang_slug:
-        version_slug = proj.get_default_version()
+        routes = _get_routes_or_404(project_slug)
         url = reverse(serve_docs, kwargs={
             'project_slug': project_slug,
-            'version_slug': version_slug,
-            'lang_slug': proj.language,
+            'version_slug': routes.default_version,
+            'lang_slug': routes.language,
             'filename': filename
         })
         return HttpResponseRedirect(url)
 
-    ver = get_object_or_404(Version, project__slug=project_slug,
-                            slug=version_slug)
-    # Auth checks
-    if ver not in proj.versions.public(request.user, proj):
-        res = HttpResponse("You don't have access to this version.")
-        res.status_code = 401
-        return res
+    if not slug_filter.might_exist(project_slug, version_slug):
+        raise Http404
+    target = resolver.resolve(project_slug, version_slug)
+    if target is None:
+        slug_filter.record_false_positive()
+        raise Http404
+    # Auth checks, only needed when not everybody can see the version.
+    if not target.is_public:
+        proj = get_object_or_404(Project, pk=target.project_pk)
+        if not proj.versions.public(request.user, proj).filter(
+                pk=target.version_pk).exists():
+            res = HttpResponse("You don't have access to this version.")
+            res.status_code = 401
+            return res
 
     # Normal handling
 
@@ -320,7 +342,7 @@ def serve_docs(request, lang_slug, version_slug, filename, project_slug=None):
         filename = "index.html"
     # This is required because we're forming the filenames outselves instead of
     # letting the web server do it.
-    elif (proj.documentation_type == 'sphinx_htmldir'
+    elif (target.documentation_type == 'sphinx_htmldir'
           and "_static" not in filename
           and "_images" not in filename
           and "html" not in filename
@@ -328,15 +350,8 @@ def serve_docs(request, lang_slug, version_slug, filename, project_slug=None):
         filename += "index.html"
     else:
         filename = filename.rstrip('/')
-    # Use the old paths if we're on our old location.
-    # Otherwise use the new language symlinks.
-    # This can be removed once we have 'en' symlinks for every project.
-    if lang_slug == proj.language:
-        basepath = proj.rtd_build_path(version_slug)
-    else:
-        basepath = proj.translations_path(lang_slug)
-        basepath = os.path.join(basepath, version_slug)
-    log.info('Serving %s for %s' % (filename, proj))
+    basepath = target.base_path(lang_slug)
+    log.info('Serving %s for %s' % (filename, target.project_slug))
     if not settings.DEBUG:
         fullpath = os.path.join(basepath, filename)
         mimetype, encoding = mimetypes.guess_type(fullpath)
@@ -346,7 +361,7 @@ def serve_docs(request, lang_slug, version_slug, filename, project_slug=None):
             response["Content-Encoding"] = encoding
         try:
             response['X-Accel-Redirect'] = os.path.join('/user_builds',
-                                                        proj.slug,
+                                                        target.project_slug,
                                                         'rtd-builds',
                                                         version_slug, filename)
         except UnicodeEncodeError:
@@ -398,7 +413,9 @@ def morelikethis(request, project_slug, filename):
 class SearchView(TemplateView):
 
     template_name = "search/base_facet.html"
-    results = EmptySearchQuerySet()
+    results = []
+    facets = {}
+    results_per_page = 10
     form_class = FacetedSearchForm
     form = None
     query = ''
@@ -408,23 +425,20 @@ class SearchView(TemplateView):
     def get_context_data(self, request, **kwargs):
         context = super(SearchView, self).get_context_data(**kwargs)
         context['request'] = self.request
-        # causes solr request #1
-        context['facets'] = self.results.facet_counts()
+        context['facets'] = self.facets
         context['form'] = self.form
         context['query'] = self.query
         context['selected_facets'] = ('&'.join(self.selected_facets)
                                       if self.selected_facets else '')
         context['selected_facets_list'] = self.selected_facets_list
         context['results'] = self.results
-        context['count'] = len(self.results)  # causes solr request #2
+        context['count'] = len(self.results)
         return context
 
     def get(self, request, **kwargs):
         """
-        Performing the search causes three requests to be sent to Solr.
-            1. For the facets
-            2. For the count (unavoidable, as pagination will cause this anyay)
-            3. For the results
+        Performing the search sends one request to Solr, for the requested
+        page of results with the count and facets, see ``core.faceted_search``.
         """
         self.request = request
         self.form = self.build_form()
@@ -433,6 +447,7 @@ class SearchView(TemplateView):
         self.query = self.get_query()
         if self.form.is_valid():
             self.results = self.get_results()
+            self.facets = self.results.facets
         context = self.get_context_data(request, **kwargs)
 
         # For returning results partials for javascript
@@ -466,8 +481,20 @@ class SearchView(TemplateView):
         """
         return self.request.GET.get('q')
 
+    def get_page_number(self):
+        try:
+            return max(int(self.request.GET.get('page', 1)), 1)
+        except ValueError:
+            return 1
+
     def get_results(self):
         """
-        Fetches the results via the form.
+        Fetches the page of results the template paginates to. Searches in
+        one project are answered from its static index when it has one.
         """
-        return self.form.search()
+        results = static_search.facet_search(self.query, self.selected_facets)
+        if results is not None:
+            return results
+        start = (self.get_page_number() - 1) * self.results_per_page
+        return faceted_search.SearchResults(self.form.search(), start=start,
+                                            page_size=self.results_per_page)
@@ -1,4 +1,3 @@
-import redis
 import itertools
 import operator
 import urlparse
@@ -10,7 +9,9 @@ from django.shortcuts import render
 from django.shortcuts import redirect
 from django.utils.translation import ugettext_lazy as _
 
-r = redis.Redis(**settings.REDIS)
+from core import redis_pool
+
+r = redis_pool.get_redis()
 
 
 class RedirectForm(forms.Form):
@@ -0,0 +1,64 @@
+"""Recording of the downloadable files builders produce.
+
+The download pages used to ``os.path.exists`` every format of every version
+on each view. Builders now record each file they move into ``MEDIA_ROOT`` as
+a ``VersionArtifact``, and the pages only read those.
+"""
+import logging
+import os
+
+from django.conf import settings
+
+from doc_builder.dedupe import file_digest
+
+log = logging.getLogger(__name__)
+
+
+def media_path(path):
+    """
+    ``path`` relative to ``MEDIA_ROOT``.
+    """
+    return os.path.relpath(path, settings.MEDIA_ROOT)
+
+
+def artifact_data(artifact_type, to_file, local_file=None):
+    """
+    The ``VersionArtifact`` fields for ``to_file``, or None if it's missing.
+
+    ``local_file`` is a copy of it on this server, for when it was copied to
+    the app servers; size and hash are computed from it.
+    """
+    if local_file is None:
+        local_file = to_file
+    if not os.path.exists(local_file):
+        return None
+    return {
+        'type': artifact_type,
+        'path': media_path(to_file),
+        'size': os.path.getsize(local_file),
+        'sha1': file_digest(local_file),
+    }
+
+
+def record_artifact(version, artifact_type, to_file, local_file=None):
+    """
+    Record that ``to_file`` is the ``artifact_type`` download of ``version``.
+    """
+    data = artifact_data(artifact_type, to_file, local_file)
+    if data is None:
+        log.warning("Not recording missing %s artifact %s"
+                    % (artifact_type, local_file or to_file))
+        return None
+    log.info("Recording %s artifact for %s: %s"
+             % (artifact_type, version, data['path']))
+    if getattr(settings, 'DONT_HIT_DB', True):
+        from tastyapi import api
+        data['version'] = "/api/v1/version/%s/" % version.pk
+        try:
+            return api.artifact.post(data)
+        except Exception:
+            log.exception("Unable to record %s artifact for %s"
+                          % (artifact_type, version))
+            return None
+    from builds.models import VersionArtifact
+    return VersionArtifact.objects.record(version, data)
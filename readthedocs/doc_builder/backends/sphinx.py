@@ -10,7 +10,11 @@ from django.contrib.auth.models import SiteProfileNotAvailable
 from django.core.exceptions import ObjectDoesNotExist
 from django.conf import settings
 
+from doc_builder.artifacts import record_artifact
 from doc_builder.base import BaseBuilder, restoring_chdir
+from doc_builder.dedupe import dedupe_path
+from doc_builder import search_index
+from projects import file_index
 from projects.utils import run
 from core.utils import copy_to_app_servers, copy_file_to_app_servers
 
@@ -181,11 +185,25 @@ class Builder(BaseBuilder):
             build_command = ("sphinx-build %s -b html . _build/html"
                              % (force_str))
         build_results = run(build_command, shell=True)
+        self._write_search_index()
         self._zip_html()
         if 'no targets are out of date.' in build_results[1]:
             self._changed = False
         return build_results
 
+    def _write_search_index(self):
+        """
+        Write the static search index into the build output, so it's
+        published with the docs.
+        """
+        html_path = self.version.project.full_build_path(self.version.slug)
+        try:
+            search_index.write_index(
+                html_path, file_index.build_index(html_path).match('*.html'))
+        except Exception:
+            log.error("Unable to write the search index of %s"
+                      % self.version, exc_info=True)
+
     @restoring_chdir
     def _zip_html(self, **kwargs):
         from_path = self.version.project.full_build_path(self.version.slug)
@@ -193,18 +211,18 @@ class Builder(BaseBuilder):
         to_file = os.path.join(to_path, '%s.zip' % self.version.project.slug)
 
         log.info("Creating zip file from %s" % from_path)
+        # Index the fresh build output once, move() and fileify reuse it.
+        index = file_index.build_index(from_path)
         # Create a <slug>.zip file containing all files in file_path
         os.chdir(from_path)
         archive = zipfile.ZipFile(to_file, 'w')
-        for root, subfolders, files in os.walk('.'):
-            for file in files:
-                to_write = os.path.join(root, file)
-                archive.write(
-                    filename=to_write,
-                    arcname=os.path.join("%s-%s" % (self.version.project.slug,
-                                                    self.version.slug),
-                                         to_write)
-                )
+        for to_write in index:
+            archive.write(
+                filename=to_write,
+                arcname=os.path.join("%s-%s" % (self.version.project.slug,
+                                                self.version.slug),
+                                     to_write)
+            )
         archive.close()
 
         return to_file
@@ -232,6 +250,11 @@ class Builder(BaseBuilder):
                     log.info("Copying docs on the local filesystem")
                     shutil.copytree(
                         project.full_build_path(self.version.slug), target)
+                    dedupe_path(target)
+                    file_index.copy_index(
+                        file_index.get_index(
+                            project.full_build_path(self.version.slug)),
+                        target)
 
                 #Copy the zip file.
                 to_path = os.path.join(settings.MEDIA_ROOT, 'htmlzip',
@@ -241,9 +264,13 @@ class Builder(BaseBuilder):
                 from_file = os.path.join(from_path, '%s.zip' % project.slug)
                 if getattr(settings, "MULTIPLE_APP_SERVERS", None):
                     copy_file_to_app_servers(from_file, to_file)
+                    record_artifact(self.version, 'htmlzip', to_file,
+                                    from_file)
                 else:
                     if not os.path.exists(to_path):
                         os.makedirs(to_path)
                     run('mv -f %s %s' % (from_file, to_file))
+                    dedupe_path(to_file)
+                    record_artifact(self.version, 'htmlzip', to_file)
         else:
             log.warning("Not moving docs, because the build dir is unknown.")
@@ -1,6 +1,8 @@
 from glob import glob
 import os
 from doc_builder.base import restoring_chdir
+from doc_builder.artifacts import record_artifact
+from doc_builder.dedupe import dedupe_path
 from doc_builder.backends.sphinx import Builder as HtmlBuilder
 from projects.utils import run
 from core.utils import copy_file_to_app_servers
@@ -36,7 +38,10 @@ class Builder(HtmlBuilder):
             to_file = os.path.join(to_path, "%s.epub" % project.slug)
             if getattr(settings, "MULTIPLE_APP_SERVERS", None):
                 copy_file_to_app_servers(from_file, to_file)
+                record_artifact(self.version, 'epub', to_file, from_file)
             else:
                 if not os.path.exists(to_path):
                     os.makedirs(to_path)
                 run('mv -f %s %s' % (from_file, to_file))
+                dedupe_path(to_file)
+                record_artifact(self.version, 'epub', to_file)
@@ -3,7 +3,9 @@ import os
 import shutil
 
 from doc_builder.base import restoring_chdir
+from doc_builder.dedupe import dedupe_path
 from doc_builder.backends.sphinx import Builder as HtmlBuilder
+from projects import file_index
 from projects.utils import run
 from core.utils import copy_to_app_servers
 from django.conf import settings
@@ -23,6 +25,8 @@ class Builder(HtmlBuilder):
         else:
             build_command = "sphinx-build -b dirhtml . _build/html"
         build_results = run(build_command)
+        self._write_search_index()
+        file_index.build_index(project.full_build_path(self.version.slug))
         if 'no targets are out of date.' in build_results[1]:
             self._changed = False
         return build_results
@@ -49,5 +53,10 @@ class Builder(HtmlBuilder):
                     log.info("Copying docs on the local filesystem")
                     shutil.copytree(project.full_build_path(self.version.slug),
                                     target)
+                    dedupe_path(target)
+                    file_index.copy_index(
+                        file_index.get_index(
+                            project.full_build_path(self.version.slug)),
+                        target)
         else:
             log.warning("Not moving docs, because the build dir is unknown.")
@@ -4,7 +4,9 @@ import logging
 
 from django.conf import settings
 
+from doc_builder.artifacts import record_artifact
 from doc_builder.base import BaseBuilder, restoring_chdir
+from doc_builder.dedupe import dedupe_path
 from projects.utils import run
 from core.utils import copy_file_to_app_servers
 
@@ -60,7 +62,10 @@ class Builder(BaseBuilder):
             from_file = os.path.join(os.getcwd(), pdf_filename)
             if getattr(settings, "MULTIPLE_APP_SERVERS", None):
                 copy_file_to_app_servers(from_file, to_file)
+                record_artifact(self.version, 'pdf', to_file, from_file)
             else:
                 if not os.path.exists(to_path):
                     os.makedirs(to_path)
                 run('mv -f %s %s' % (from_file, to_file))
+                dedupe_path(to_file)
+                record_artifact(self.version, 'pdf', to_file)
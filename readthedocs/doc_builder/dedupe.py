@@ -0,0 +1,173 @@
+"""Content-addressed hardlink deduplication of build artifacts.
+
+Most of what ends up under ``rtd-builds/<version>`` (and in the media
+downloads) is byte-identical between versions and projects: jQuery, the
+theme CSS, fonts, images.  After a builder has moved its output into place
+we hash every file and hardlink it against a shared object store, so each
+distinct file is only stored once on disk.
+
+Builders always replace their output wholesale (``rmtree`` + ``copytree`` or
+``mv -f``), never write into an existing file, so sharing inodes between
+versions is safe.
+"""
+import errno
+import hashlib
+import logging
+import os
+import stat
+
+from django.conf import settings
+
+log = logging.getLogger(__name__)
+
+BLOCK_SIZE = 64 * 1024
+
+
+def store_path():
+    return getattr(settings, 'DEDUPE_ROOT',
+                   os.path.join(settings.DOCROOT, '.dedupe'))
+
+
+def is_enabled():
+    if getattr(settings, 'MULTIPLE_APP_SERVERS', None):
+        # Output is rsynced to the app servers, there is nothing local to
+        # deduplicate.
+        return False
+    return getattr(settings, 'DEDUPE_BUILDS', False)
+
+
+def file_digest(path):
+    sha = hashlib.sha1()
+    with open(path, 'rb') as fh:
+        for block in iter(lambda: fh.read(BLOCK_SIZE), ''):
+            sha.update(block)
+    return sha.hexdigest()
+
+
+def _replace_with_link(source, path):
+    """
+    Atomically replace ``path`` with a hardlink to ``source``.
+    """
+    tmp_path = '%s.dedupe-tmp' % path
+    try:
+        os.link(source, tmp_path)
+        os.rename(tmp_path, path)
+    except OSError:
+        if os.path.exists(tmp_path):
+            os.remove(tmp_path)
+        raise
+
+
+def dedupe_file(path, store=None):
+    """
+    Hardlink ``path`` against the object store.
+
+    Returns the number of bytes saved, which is 0 when this is the first copy
+    of the file we have seen or when it can't be linked.
+    """
+    if store is None:
+        store = store_path()
+    file_stat = os.lstat(path)
+    min_size = getattr(settings, 'DEDUPE_MIN_SIZE', 1)
+    if not stat.S_ISREG(file_stat.st_mode) or file_stat.st_size < min_size:
+        return 0
+    digest = file_digest(path)
+    stored = os.path.join(store, digest[:2], digest)
+    try:
+        stored_stat = os.stat(stored)
+    except OSError:
+        # First time we see this content, seed the store with it.
+        if not os.path.exists(os.path.dirname(stored)):
+            try:
+                os.makedirs(os.path.dirname(stored))
+            except OSError:
+                pass
+        try:
+            os.link(path, stored)
+        except OSError as e:
+            if e.errno != errno.EEXIST:
+                log.warning("Dedupe: Unable to store %s: %s" % (path, e))
+        return 0
+
+    if (stored_stat.st_dev, stored_stat.st_ino) == (file_stat.st_dev,
+                                                    file_stat.st_ino):
+        return 0
+    if stored_stat.st_size != file_stat.st_size:
+        log.warning("Dedupe: Size mismatch for %s, skipping" % digest)
+        return 0
+    try:
+        _replace_with_link(stored, path)
+    except OSError as e:
+        if e.errno == errno.EMLINK:
+            # The stored inode hit the filesystem link limit, start a fresh
+            # one from this file. Existing links keep pointing at the old one.
+            try:
+                _replace_with_link(path, stored)
+            except OSError:
+                log.warning("Dedupe: Unable to rotate %s" % digest,
+                            exc_info=True)
+        else:
+            log.warning("Dedupe: Unable to link %s: %s" % (path, e))
+        return 0
+    return file_stat.st_size
+
+
+def dedupe_tree(root, store=None):
+    """
+    Deduplicate every file below ``root``.
+
+    Returns the number of bytes saved.
+    """
+    saved = 0
+    for dirpath, dirnames, filenames in os.walk(root):
+        for filename in filenames:
+            path = os.path.join(dirpath, filename)
+            try:
+                saved += dedupe_file(path, store=store)
+            except (IOError, OSError):
+                log.warning("Dedupe: Failed on %s" % path, exc_info=True)
+    log.info("Dedupe: Saved %s bytes in %s" % (saved, root))
+    return saved
+
+
+def dedupe_path(path, store=None):
+    """
+    Deduplicate a build artifact, either a single file or a whole tree.
+
+    Does nothing unless ``DEDUPE_BUILDS`` is on. Returns the bytes saved.
+    """
+    if not is_enabled() or not os.path.exists(path):
+        return 0
+    if os.path.isdir(path):
+        return dedupe_tree(path, store=store)
+    try:
+        saved = dedupe_file(path, store=store)
+    except (IOError, OSError):
+        log.warning("Dedupe: Failed on %s" % path, exc_info=True)
+        return 0
+    log.info("Dedupe: Saved %s bytes in %s" % (saved, path))
+    return saved
+
+
+def prune_store(store=None):
+    """
+    Remove objects from the store that no build links to anymore.
+
+    Returns the number of bytes freed.
+    """
+    if store is None:
+        store = store_path()
+    freed = 0
+    for dirpath, dirnames, filenames in os.walk(store):
+        for filename in filenames:
+            path = os.path.join(dirpath, filename)
+            try:
+                file_stat = os.lstat(path)
+                if file_stat.st_nlink == 1:
+                    os.remove(path)
+                    freed += file_stat.st_size
+            except OSError:
+                log.warning("Dedupe: Unable to prune %s" % path,
+                            exc_info=True)
+    log.info("Dedupe: Pruned %s bytes from %s" % (freed, store))
+    return freed
@@ -0,0 +1,131 @@
+# -*- coding: utf-8 -*-
+"""A static search index of a version's HTML, written at build time.
+
+Searching inside one project's docs used to always go to Solr. The HTML
+builders now write ``rtd_search_index.json`` (and a gzipped copy next to it,
+for servers that send precompressed files) into the build output, so it's
+published along with the docs. It holds:
+
+* ``pages``: ``[path, title, excerpt]`` for every page, ``path`` relative to
+  the docs root,
+* ``sections``: the ``[anchor, title]`` of the sections of every page, in the
+  same order as ``pages``,
+* ``terms``: for every term, a flat ``[page, weight, page, weight, ...]``
+  posting list sorted by page, where terms in titles weigh more.
+
+The browser can answer searches from it, and so can the app server, see
+``core.static_search``.
+"""
+import gzip
+import json
+import logging
+import os
+import re
+
+from projects.bulk_index import document_selector, parse_document
+
+log = logging.getLogger(__name__)
+
+INDEX_NAME = 'rtd_search_index.json'
+FORMAT_VERSION = 1
+
+TERM_RE = re.compile(r'\w+', re.UNICODE)
+MAX_TERM_LENGTH = 30
+EXCERPT_LENGTH = 160
+TITLE_WEIGHT = 10
+SECTION_WEIGHT = 5
+STOPWORDS = frozenset([
+    'a', 'an', 'and', 'are', 'as', 'at', 'be', 'by', 'for', 'from', 'if',
+    'in', 'into', 'is', 'it', 'of', 'on', 'or', 'that', 'the', 'this', 'to',
+    'was', 'will', 'with',
+])
+
+
+def tokenize(text):
+    """
+    The terms of ``text``, lowercased, in order.
+    """
+    return [term for term in TERM_RE.findall(text.lower())
+            if 1 < len(term) <= MAX_TERM_LENGTH and term not in STOPWORDS]
+
+
+def _clean(text):
+    return u' '.join(text.replace(u'¶', u'').split())
+
+
+def parse_page(file_path, selector=None):
+    """
+    The title, sections and text of an HTML page, or None if it can't be read
+    or has no document part.
+    """
+    from lxml.cssselect import CSSSelector
+    parsed = parse_document(file_path, selector)
+    if parsed is None:
+        return None
+    root, document = parsed
+    sections = []
+    for section in CSSSelector('div.section[id]')(document):
+        headings = CSSSelector('h1, h2, h3, h4, h5, h6')(section)
+        if headings:
+            sections.append([section.get('id'),
+                             _clean(headings[0].text_content())])
+    if sections:
+        title = sections[0][1]
+    else:
+        titles = root.xpath('//title')
+        title = _clean(titles[0].text_content()) if titles else u''
+    return title, sections, _clean(document.text_content())
+
+
+def build_index(html_path, paths):
+    """
+    The search index of the pages ``paths``, relative to ``html_path``.
+    """
+    selector = document_selector()
+    pages = []
+    sections = []
+    postings = {}
+    for path in sorted(paths):
+        parsed = parse_page(os.path.join(html_path, path), selector)
+        if parsed is None:
+            continue
+        title, page_sections, text = parsed
+        page = len(pages)
+        pages.append([path, title, text[:EXCERPT_LENGTH]])
+        sections.append(page_sections)
+        weights = {}
+        for term in tokenize(text):
+            weights[term] = weights.get(term, 0) + 1
+        for section_title in [section[1] for section in page_sections]:
+            for term in tokenize(section_title):
+                weights[term] = weights.get(term, 0) + SECTION_WEIGHT
+        for term in tokenize(title):
+            weights[term] = weights.get(term, 0) + TITLE_WEIGHT
+        for term, weight in weights.items():
+            postings.setdefault(term, []).extend([page, weight])
+    return {
+        'version': FORMAT_VERSION,
+        'pages': pages,
+        'sections': sections,
+        'terms': postings,
+    }
+
+
+def write_index(html_path, paths):
+    """
+    Write the search index of the pages ``paths`` into ``html_path``.
+    Returns the path of the index.
+    """
+    index = build_index(html_path, paths)
+    data = json.dumps(index, separators=(',', ':'))
+    index_path = os.path.join(html_path, INDEX_NAME)
+    with open(index_path, 'w') as fh:
+        fh.write(data)
+    compressed = gzip.open(index_path + '.gz', 'wb')
+    try:
+        compressed.write(data)
+    finally:
+        compressed.close()
+    log.info("Wrote search index of %s pages and %s terms to %s"
+             % (len(index['pages']), len(index['terms']), index_path))
+    return index_path
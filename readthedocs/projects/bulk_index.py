@@ -0,0 +1,273 @@
+# -*- coding: utf-8 -*-
+"""Bulk indexing of a version's files for search.
+
+Indexing through ``ImportedFileIndex`` one object at a time parses every HTML
+file with PyQuery in the indexing process and queries the project's users for
+every file. ``index_version`` instead:
+
+* loads a version's files with one query and shares one project and version
+  instance (and the author) between them,
+* extracts the text of the files in a pool of ``SEARCH_INDEX_PROCESSES``
+  processes with lxml, streaming the results back in order,
+* sends the documents to the backend in batches of ``SEARCH_INDEX_BATCH_SIZE``
+  and only commits with the last one,
+
+and logs its throughput as it goes.
+
+Files aren't indexed as they are saved. After a build ``fileify`` hands the
+paths of the version's files to the ``update_search_index`` task, which syncs
+the version's ImportedFiles with ``sync_files``, then indexes the version and
+removes the deleted files in one go.
+"""
+import logging
+import multiprocessing
+import os
+import time
+
+from django.conf import settings
+
+log = logging.getLogger(__name__)
+
+FILE_BATCH_SIZE = 100
+# Stays below Solr's default maxBooleanClauses of 1024.
+REMOVE_BATCH_SIZE = 500
+
+
+def document_selector():
+    return getattr(settings, 'DOCUMENT_PYQUERY_PATH', 'div.document')
+
+
+def parse_document(file_path, selector=None):
+    """
+    The root element and the document part of an HTML file, or None if the
+    file can't be read or has no such part.
+
+    Sphinx writes UTF-8, so it's parsed as such. Without a charset meta tag
+    libxml2 would read the bytes as Latin-1.
+    """
+    from lxml import etree, html
+    from lxml.cssselect import CSSSelector
+    if selector is None:
+        selector = document_selector()
+    try:
+        with open(file_path, 'rb') as fh:
+            root = html.parse(
+                fh, parser=html.HTMLParser(encoding='utf-8')).getroot()
+    except (IOError, etree.XMLSyntaxError), e:
+        log.info('Unable to index file: %s, error :%s' % (file_path, e))
+        return None
+    if root is None:
+        return None
+    matches = CSSSelector(selector)(root)
+    if not matches:
+        return None
+    return root, matches[0]
+
+
+def extract_text(file_path, selector=None):
+    """
+    The text of the document part of an HTML file, or None if the file can't
+    be read or has no such part.
+    """
+    parsed = parse_document(file_path, selector)
+    if parsed is None:
+        return None
+    return parsed[1].text_content().replace(u'¶', u'')
+
+
+def _extract(args):
+    # Runs in the pool, takes and returns plain values only.
+    pk, file_path, selector = args
+    return pk, extract_text(file_path, selector)
+
+
+def _processes():
+    return getattr(settings, 'SEARCH_INDEX_PROCESSES',
+                   multiprocessing.cpu_count())
+
+
+def _extracted(files, root, processes):
+    selector = document_selector()
+    jobs = ((obj.pk, os.path.join(root, obj.path.lstrip('/')), selector)
+            for obj in files)
+    if processes <= 1:
+        # Celery workers can't fork a pool of their own.
+        for job in jobs:
+            yield _extract(job)
+        return
+    pool = multiprocessing.Pool(processes)
+    try:
+        for result in pool.imap(_extract, jobs, chunksize=20):
+            yield result
+    finally:
+        pool.terminate()
+
+
+def _send(backend, index, batch, commit):
+    start = time.time()
+    backend.update(index, batch, commit=commit)
+    for obj in batch:
+        del obj._prepared_text
+    log.debug("Sent %s documents in %.2f seconds"
+              % (len(batch), time.time() - start))
+
+
+def search_identifier(pk):
+    from projects.models import ImportedFile
+    return '%s.%s.%s' % (ImportedFile._meta.app_label,
+                         ImportedFile._meta.module_name, pk)
+
+
+def sync_files(project, version, paths):
+    """
+    Create the ImportedFiles of ``version`` that are missing from ``paths``
+    and delete the ones that aren't in it anymore.
+
+    Returns the search identifiers of the deleted files.
+    """
+    from projects.models import ImportedFile
+    existing = dict(ImportedFile.objects.filter(version=version)
+                    .values_list('path', 'pk'))
+    to_create = [ImportedFile(project=project, version=version, path=path,
+                              name=os.path.basename(path))
+                 for path in paths if path not in existing]
+    for start in range(0, len(to_create), FILE_BATCH_SIZE):
+        ImportedFile.objects.bulk_create(
+            to_create[start:start + FILE_BATCH_SIZE])
+    wanted = set(paths)
+    stale = [pk for path, pk in existing.items() if path not in wanted]
+    for start in range(0, len(stale), FILE_BATCH_SIZE):
+        ImportedFile.objects.filter(
+            pk__in=stale[start:start + FILE_BATCH_SIZE]).delete()
+    log.info("Synced files of %s: %s new, %s deleted"
+             % (version, len(to_create), len(stale)))
+    return [search_identifier(pk) for pk in stale]
+
+
+def _solr_backend(backend):
+    try:
+        from haystack.backends.solr_backend import SolrSearchBackend
+    except Exception:
+        # Solr isn't installed, haystack raises MissingDependency.
+        return False
+    return isinstance(backend, SolrSearchBackend)
+
+
+def remove_documents(identifiers, commit=True):
+    """
+    Remove documents from the index, committing with the last one.
+
+    Solr gets one delete by query per ``REMOVE_BATCH_SIZE`` documents, other
+    backends a removal per document.
+    """
+    from haystack import connections
+    from haystack.constants import ID
+    backend = connections['default'].get_backend()
+    identifiers = list(identifiers)
+    if not _solr_backend(backend):
+        for num, identifier in enumerate(identifiers, 1):
+            backend.remove(identifier,
+                           commit=commit and num == len(identifiers))
+        return
+    for start in range(0, len(identifiers), REMOVE_BATCH_SIZE):
+        batch = identifiers[start:start + REMOVE_BATCH_SIZE]
+        query = ' OR '.join('%s:"%s"' % (ID, identifier)
+                            for identifier in batch)
+        try:
+            backend.conn.delete(
+                q=query,
+                commit=commit and start + len(batch) == len(identifiers))
+        except Exception:
+            if not backend.silently_fail:
+                raise
+            log.error("Failed to remove %s documents from Solr"
+                      % len(batch), exc_info=True)
+
+
+def version_identifiers(version):
+    """
+    The search identifiers of all of the files of ``version``.
+    """
+    from projects.models import ImportedFile
+    return [search_identifier(pk) for pk in
+            ImportedFile.objects.filter(version=version)
+            .values_list('pk', flat=True)]
+
+
+def index_files(version, files, processes=None, batch_size=None,
+                removed=()):
+    """
+    Index ``files``, ImportedFiles of ``version``, and remove the documents
+    in ``removed``, with one commit at the end.
+
+    Returns the number of documents sent.
+    """
+    from haystack import connections
+    from projects.models import ImportedFile
+    if processes is None:
+        processes = _processes()
+    if batch_size is None:
+        batch_size = getattr(settings, 'SEARCH_INDEX_BATCH_SIZE', 500)
+    project = version.project
+    by_pk = {}
+    for obj in files:
+        # Share the instances, so the index reads them without queries.
+        obj.project = project
+        obj.version = version
+        by_pk[obj.pk] = obj
+    if not by_pk:
+        remove_documents(removed)
+        return 0
+    users = list(project.users.all()[:1])
+    author = users[0] if users else None
+    backend = connections['default'].get_backend()
+    index = connections['default'].get_unified_index().get_index(ImportedFile)
+
+    sent = 0
+    skipped = 0
+    start = time.time()
+    batch = []
+    pending = None
+    for pk, text in _extracted(by_pk.values(),
+                               project.rtd_build_path(version.slug),
+                               processes):
+        if text is None:
+            skipped += 1
+            continue
+        obj = by_pk[pk]
+        obj._prepared_text = text
+        obj._prepared_author = author
+        batch.append(obj)
+        if len(batch) >= batch_size:
+            # Hold a batch back, so the last one can carry the commit.
+            if pending:
+                _send(backend, index, pending, commit=False)
+                sent += len(pending)
+                elapsed = time.time() - start
+                log.info("Indexed %s files of %s in %.1f seconds "
+                         "(%.1f files/second)"
+                         % (sent, version, elapsed,
+                            sent / max(elapsed, 0.001)))
+            pending, batch = batch, []
+    last = (pending or []) + batch
+    # The last batch commits the removals. When every file was skipped there
+    # is none, and the last removal commits.
+    remove_documents(removed, commit=not last)
+    if last:
+        _send(backend, index, last, commit=True)
+        sent += len(last)
+    elapsed = time.time() - start
+    log.info("Indexed %s files of %s in %.1f seconds (%.1f files/second), "
+             "skipped %s" % (sent, version, elapsed,
+                             sent / max(elapsed, 0.001), skipped))
+    return sent
+
+
+def index_version(version, processes=None, batch_size=None, removed=()):
+    """
+    Index all the files of ``version``, see ``index_files``.
+    """
+    from projects.models import ImportedFile
+    files = list(ImportedFile.objects.filter(version=version))
+    return index_files(version, files, processes=processes,
+                       batch_size=batch_size, removed=removed)
@@ -0,0 +1,211 @@
+"""An in-memory index of the files in a checkout or build output directory.
+
+Finding ``conf.py``, ``objects.inv`` or all the HTML pages of a build used to
+mean a fresh ``os.walk`` of the tree for every question. Instead the tree is
+walked once into a ``FileIndex``, which is kept in memory and on disk keyed by
+a fingerprint of the tree:
+
+* For VCS checkouts the fingerprint is the checkout revision, so the index is
+  rebuilt after every checkout.
+* For build output it is a random token in a marker file kept with the
+  cached index, outside of the published tree. ``build_index`` and
+  ``copy_index`` write a new one, so any index cached before is invalid. The
+  marker also records the inode and ctime of the tree's root directory, so a
+  tree replaced or copied over without them doesn't match it. Builders call
+  ``build_index`` right after writing the output and ``copy_index`` after
+  copying it, so nothing needs to walk the tree again. Other changes to the
+  tree aren't noticed.
+"""
+import fnmatch
+import hashlib
+import json
+import logging
+import os
+import uuid
+
+from django.conf import settings
+
+from vcs_support.utils import checkout_revision
+
+log = logging.getLogger(__name__)
+
+_index_cache = {}
+
+
+class FileIndex(object):
+    """
+    The files below ``root``, as a sorted list of paths relative to it.
+    """
+
+    def __init__(self, root, files):
+        self.root = root
+        self.files = files
+
+    def __len__(self):
+        return len(self.files)
+
+    def __iter__(self):
+        return iter(self.files)
+
+    def match(self, pattern):
+        """
+        Relative paths of the files whose name matches ``pattern``.
+        """
+        return [path for path in self.files
+                if fnmatch.fnmatch(os.path.basename(path), pattern)]
+
+    def find(self, pattern, under=None):
+        """
+        Absolute paths of the files whose name matches ``pattern``, optionally
+        only those inside the directory ``under``.
+        """
+        prefix = ''
+        if under is not None:
+            prefix = os.path.relpath(under, self.root)
+            prefix = '' if prefix == '.' else prefix + os.sep
+        return [os.path.join(self.root, path) for path in self.match(pattern)
+                if path.startswith(prefix)]
+
+
+def index_root():
+    return getattr(settings, 'FILE_INDEX_ROOT',
+                   os.path.join(settings.DOCROOT, '.file_index'))
+
+
+def _tree_id(root):
+    stat = os.stat(root)
+    return [stat.st_ino, stat.st_ctime]
+
+
+def fingerprint(root):
+    """
+    The key the index of ``root`` is cached under, or None if it has none
+    and must be walked.
+    """
+    revision = checkout_revision(root)
+    if revision is not None:
+        return 'rev:%r' % (revision,)
+    try:
+        with open(_marker_file(root)) as fh:
+            marker = json.load(fh)
+        if marker['tree'] != _tree_id(root):
+            return None
+        return 'mark:%s' % marker['token']
+    except (IOError, OSError, ValueError, KeyError):
+        return None
+
+
+def _mark(root):
+    """
+    Give ``root`` a new fingerprint, unless it's a checkout.
+    """
+    if checkout_revision(root) is not None:
+        return fingerprint(root)
+    marker_file = _marker_file(root)
+    tmp_file = '%s.%s.tmp' % (marker_file, os.getpid())
+    try:
+        if not os.path.exists(os.path.dirname(marker_file)):
+            os.makedirs(os.path.dirname(marker_file))
+        with open(tmp_file, 'w') as fh:
+            json.dump({'token': uuid.uuid4().hex,
+                       'tree': _tree_id(root)}, fh)
+        os.rename(tmp_file, marker_file)
+    except (IOError, OSError):
+        log.warning("Unable to mark %s for the file index" % root,
+                    exc_info=True)
+        return None
+    return fingerprint(root)
+
+
+def _cache_file(root, suffix='json'):
+    digest = hashlib.sha1(os.path.abspath(root)).hexdigest()
+    return os.path.join(index_root(), digest[:2],
+                        '%s.%s' % (digest, suffix))
+
+
+def _marker_file(root):
+    return _cache_file(root, 'mark')
+
+
+def _walk(root):
+    files = []
+    for dirpath, dirnames, filenames in os.walk(root):
+        rel_dir = os.path.relpath(dirpath, root)
+        for filename in filenames:
+            if rel_dir == '.':
+                files.append(filename)
+            else:
+                files.append(os.path.join(rel_dir, filename))
+    files.sort()
+    return files
+
+
+def _load(root, key):
+    try:
+        with open(_cache_file(root)) as fh:
+            data = json.load(fh)
+    except (IOError, ValueError):
+        return None
+    if data.get('root') != root or data.get('fingerprint') != key:
+        return None
+    return FileIndex(root, data['files'])
+
+
+def _store(index, key):
+    if key is None:
+        return
+    _index_cache[index.root] = (key, index)
+    cache_file = _cache_file(index.root)
+    tmp_file = '%s.%s.tmp' % (cache_file, os.getpid())
+    try:
+        if not os.path.exists(os.path.dirname(cache_file)):
+            os.makedirs(os.path.dirname(cache_file))
+        with open(tmp_file, 'w') as fh:
+            json.dump({'root': index.root, 'fingerprint': key,
+                       'files': index.files}, fh)
+        os.rename(tmp_file, cache_file)
+    except (IOError, OSError):
+        log.warning("Unable to store file index for %s" % index.root,
+                    exc_info=True)
+
+
+def build_index(root):
+    """
+    Walk ``root`` and cache the resulting index, replacing any cached one.
+    """
+    if not os.path.isdir(root):
+        return FileIndex(root, [])
+    index = FileIndex(root, _walk(root))
+    _store(index, _mark(root))
+    log.debug("Indexed %s files in %s" % (len(index), root))
+    return index
+
+
+def get_index(root):
+    """
+    The index of ``root``, from memory or disk if the tree hasn't changed.
+    """
+    if not os.path.isdir(root):
+        return FileIndex(root, [])
+    key = fingerprint(root)
+    if key is None:
+        return build_index(root)
+    cached = _index_cache.get(root)
+    if cached and cached[0] == key:
+        return cached[1]
+    index = _load(root, key)
+    if index is not None:
+        _index_cache[root] = (key, index)
+        return index
+    return build_index(root)
+
+
+def copy_index(index, root):
+    """
+    Cache ``index`` for ``root``, a fresh copy of the tree it was built from.
+    """
+    if not os.path.isdir(root):
+        return FileIndex(root, [])
+    copied = FileIndex(root, list(index.files))
+    _store(copied, _mark(root))
+    return copied
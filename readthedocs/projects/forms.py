@@ -6,6 +6,7 @@ from django.template.loader import render_to_string
 from django.utils.translation import ugettext_lazy as _
 from django.utils.safestring import mark_safe
 
+from core.permissions import sync_project_permissions
 from projects import constants
 from projects.models import Project, EmailHook
 from projects.tasks import update_docs
@@ -244,6 +245,7 @@ class UserForm(forms.Form):
 
     def save(self):
         self.project.users.add(self.user)
+        sync_project_permissions(self.project, [self.user])
         return self.user
 
 
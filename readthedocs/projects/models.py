@@ -1,4 +1,3 @@
-import fnmatch
 import logging
 import os
 
@@ -9,22 +8,27 @@ from django.db import models
 from django.template.defaultfilters import slugify
 from django.utils.translation import ugettext_lazy as _
 
-from guardian.shortcuts import assign, get_objects_for_user
+from guardian.shortcuts import get_objects_for_user
 
-from projects import constants
+from core.permissions import grant_object_permissions
+from projects import constants, file_index
 from projects.exceptions import ProjectImportError
-from projects.templatetags.projects_tags import sort_version_aware
-from projects.utils import highest_version as _highest, make_api_version
+from projects.utils import (highest_version as _highest, make_api_version,
+                            sort_versions)
 from taggit.managers import TaggableManager
 from tastyapi.slum import api
 
 from vcs_support.base import VCSProject
 from vcs_support.backends import backend_cls
-from vcs_support.utils import Lock
+from vcs_support.utils import Lock, checkout_revision
 
 
 log = logging.getLogger(__name__)
 
+# conf.py paths found by Project.conf_file, keyed by checkout path. Each entry
+# holds the checkout revision it was found at and is ignored once that changes.
+_conf_file_cache = {}
+
 
 class ProjectManager(models.Manager):
     def _filter_queryset(self, user, privacy_level):
@@ -268,8 +272,7 @@ class Project(models.Model):
             if self.slug == '':
                 raise Exception(_("Model must have slug"))
         obj = super(Project, self).save(*args, **kwargs)
-        for owner in self.users.all():
-            assign('view_project', owner, self)
+        grant_object_permissions('view_project', self.users.all(), [self])
         return obj
 
     def get_absolute_url(self):
@@ -471,6 +474,23 @@ class Project(models.Model):
         if self.conf_py_file:
             log.debug('Inserting conf.py file path from model')
             return os.path.join(self.checkout_path(version), self.conf_py_file)
+        checkout_path = self.checkout_path(version)
+        revision = checkout_revision(checkout_path)
+        cached = _conf_file_cache.get(checkout_path)
+        if revision is not None and cached and cached[0] == revision:
+            return cached[1]
+        conf_file = self._find_conf_file(version)
+        if revision is not None:
+            _conf_file_cache[checkout_path] = (revision, conf_file)
+        return conf_file
+
+    def clear_conf_file_cache(self, version='latest'):
+        """
+        Forget the conf.py found for a version, call after checking it out.
+        """
+        _conf_file_cache.pop(self.checkout_path(version), None)
+
+    def _find_conf_file(self, version):
         files = self.find('conf.py', version)
         if not files:
             files = self.full_find('conf.py', version)
@@ -558,21 +578,14 @@ class Project(models.Model):
         """
         A balla API to find files inside of a projects dir.
         """
-        matches = []
-        for root, dirnames, filenames in os.walk(self.full_doc_path(version)):
-            for filename in fnmatch.filter(filenames, file):
-                matches.append(os.path.join(root, filename))
-        return matches
+        index = file_index.get_index(self.checkout_path(version))
+        return index.find(file, under=self.full_doc_path(version))
 
     def full_find(self, file, version):
         """
         A balla API to find files inside of a projects dir.
         """
-        matches = []
-        for root, dirnames, filenames in os.walk(self.checkout_path(version)):
-            for filename in fnmatch.filter(filenames, file):
-                matches.append(os.path.join(root, filename))
-        return matches
+        return file_index.get_index(self.checkout_path(version)).find(file)
 
     def get_latest_build(self):
         try:
@@ -586,14 +599,15 @@ class Project(models.Model):
                                             active=True)['objects']:
             version = make_api_version(version_data)
             ret.append(version)
-        return sort_version_aware(ret)
+        return sort_versions(ret)
 
     def active_versions(self):
         return (self.versions.filter(built=True, active=True) |
                 self.versions.filter(active=True, uploaded=True))
 
     def ordered_active_versions(self):
-        return sort_version_aware(self.versions.filter(active=True))
+        return self.versions.filter(active=True).order_by('-sort_key',
+                                                          '-verbose_name')
 
     def all_active_versions(self):
         """A temporary workaround for active_versions filtering out things
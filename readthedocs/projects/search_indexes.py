@@ -1,17 +1,14 @@
 # -*- coding: utf-8 -*-
 
-import codecs
 import os
 
-from django.conf import settings
-from django.utils.html import strip_tags
-
 #from haystack import site
 from haystack import indexes
 from haystack.fields import CharField
 from celery_haystack import indexes as celery_indexes
 
 from projects import constants
+from projects.bulk_index import extract_text
 from projects.models import ImportedFile, Project
 
 import logging
@@ -41,7 +38,11 @@ class ProjectIndex(celery_indexes.CelerySearchIndex, indexes.Indexable):
 
 
 #Should prob make a common subclass for this and FileIndex
-class ImportedFileIndex(celery_indexes.CelerySearchIndex, indexes.Indexable):
+class ImportedFileIndex(indexes.SearchIndex, indexes.Indexable):
+    """
+    Not updated on save: files are indexed a version at a time by the
+    ``update_search_index`` task, see ``projects.bulk_index``.
+    """
     text = CharField(document=True)
     author = CharField()
     project = CharField(model_attr='project__name', faceted=True)
@@ -50,6 +51,9 @@ class ImportedFileIndex(celery_indexes.CelerySearchIndex, indexes.Indexable):
     absolute_url = CharField()
 
     def prepare_author(self, obj):
+        if hasattr(obj, '_prepared_author'):
+            # Set once per version by projects.bulk_index.
+            return obj._prepared_author
         return obj.project.users.all()[0]
 
     def prepare_title(self, obj):
@@ -64,25 +68,13 @@ class ImportedFileIndex(celery_indexes.CelerySearchIndex, indexes.Indexable):
         This only works on machines that have the html
         files for the projects checked out.
         """
-        #Import this here to hopefully fix tests for now.
-        from pyquery import PyQuery
-        full_path = obj.project.rtd_build_path()
+        if hasattr(obj, '_prepared_text'):
+            return obj._prepared_text
+        version_slug = obj.version.slug if obj.version_id else 'latest'
+        full_path = obj.project.rtd_build_path(version_slug)
         file_path = os.path.join(full_path, obj.path.lstrip('/'))
-        try:
-            with codecs.open(file_path, encoding='utf-8', mode='r') as f:
-                content = f.read()
-        except IOError as e:
-            log.info('Unable to index file: %s, error :%s' % (file_path, e))
-            return
         log.debug('Indexing %s:%s' % (obj.project, obj.path))
-        DOCUMENT_PYQUERY_PATH = getattr(settings, 'DOCUMENT_PYQUERY_PATH',
-                                        'div.document')
-        try:
-            to_index = strip_tags(PyQuery(content)(
-                DOCUMENT_PYQUERY_PATH).html()).replace(u'¶', '')
-        except ValueError:
-            #Pyquery returns ValueError if div.document doesn't exist.
-            return
+        to_index = extract_text(file_path)
         if not to_index:
             log.info('Unable to index file: %s:%s, empty file' % (obj.project,
                                                                   file_path))
@@ -2,13 +2,14 @@
 ``conf.py`` files, and rebuilding documentation.
 
 """
-import fnmatch
+import hashlib
 import os
 import re
 import shutil
 import json
 import logging
 import operator
+import time
 
 from celery.decorators import task
 from django.conf import settings
@@ -27,11 +28,13 @@ from builds.models import Build, Version
 from doc_builder import loading as builder_loading
 from doc_builder.base import restoring_chdir
 from projects.exceptions import ProjectImportError
-from projects.models import ImportedFile, Project
+from projects.models import Project
 from projects.utils import (mkversion, purge_version, run, slugify_uniquely,
                             make_api_version, make_api_project)
+from projects import bulk_index, constants, file_index, workspace_gc
 from tastyapi import client as tastyapi_client
 from tastyapi import api, apiv2
+from core import domains, metrics, redis_pool, slug_filter
 from core.utils import copy_to_app_servers, run_on_app_servers
 
 ghetto_hack = re.compile(
@@ -139,18 +142,26 @@ def update_docs(pk, record=True, pdf=True, man=True, epub=True, dash=True,
     else:
         build = {}
 
+    start = time.time()
     try:
         log.info("Updating docs from VCS")
         update_output = update_imported_docs(version.pk)
         #update_output = update_result.get()
     except ProjectImportError, err:
         log.error("Failed to import project; skipping build.", exc_info=True)
+        metrics.observe('rtd_build_phase_seconds', time.time() - start,
+                        metrics.BUILD_BUCKETS, phase='setup',
+                        outcome='failure')
+        metrics.inc('rtd_builds_total', outcome='setup_failure')
+        metrics.flush()
         build['state'] = 'finished'
         build['setup_error'] = ('Failed to import project; skipping build.\n'
                                 'Please make sure your repo is correct and '
                                 'you have a conf.py')
         api.build(build['id']).put(build)
         return False
+    metrics.observe('rtd_build_phase_seconds', time.time() - start,
+                    metrics.BUILD_BUCKETS, phase='setup', outcome='success')
 
     # kick off a build
     if record:
@@ -171,6 +182,7 @@ def update_docs(pk, record=True, pdf=True, man=True, epub=True, dash=True,
         api.build(build['id']).put(build)
 
     log.info("Building docs")
+    start = time.time()
     # This is only checking the results of the HTML build, as it's a canary
     try:
         results = build_docs(version_pk=version.pk, pdf=pdf, man=man,
@@ -188,6 +200,10 @@ def update_docs(pk, record=True, pdf=True, man=True, epub=True, dash=True,
         # epub_results = (999, "Project build Failed", str(e))
         # dash_results = (999, "Project build Failed", str(e))
         (ret, out, err) = html_results
+    outcome = 'success' if ret == 0 else 'failure'
+    metrics.observe('rtd_build_phase_seconds', time.time() - start,
+                    metrics.BUILD_BUCKETS, phase='build', outcome=outcome)
+    start = time.time()
 
     if record:
         # Update builds
@@ -246,6 +262,11 @@ def update_docs(pk, record=True, pdf=True, man=True, epub=True, dash=True,
         # Needs to happen after update_intersphinx
         clear_artifacts(version.pk)
 
+    metrics.observe('rtd_build_phase_seconds', time.time() - start,
+                    metrics.BUILD_BUCKETS, phase='finish', outcome=outcome)
+    metrics.inc('rtd_builds_total', outcome=outcome)
+    metrics.flush()
+
     # Try importing from Open Comparison sites.
     try:
         result = tastyapi_client.import_project(project)
@@ -304,6 +325,8 @@ def update_imported_docs(version_pk):
             version_slug = 'latest'
             version_repo = project.vcs_repo(version_slug)
             update_docs_output['checkout'] = version_repo.update()
+        workspace_gc.record_access(project, version_slug)
+        project.clear_conf_file_cache(version_slug)
 
         # Ensure we have a conf file (an exception is raised if not)
         project.conf_file(version.slug)
@@ -386,14 +409,55 @@ def update_imported_docs(version_pk):
                  } for v in version_repo.branches
             ]
 
-        try:
-            api.project(project.pk).sync_versions.post(json.dumps(version_post_data))
-        except Exception, e:
-            print "Sync Verisons Exception: %s" % e.message
+        sync_versions(project, version_post_data)
 
     return update_docs_output
 
 
+def sync_versions(project, version_post_data):
+    """
+    Send the repo's tags and branches to the API.
+
+    When they hash the same as the last successful sync, only the hash is
+    sent. The API answers that with a 409 if it doesn't know the hash, and we
+    send everything.
+    """
+    sync_hash = hashlib.sha1(
+        json.dumps(version_post_data, sort_keys=True)).hexdigest()
+    hash_file = os.path.join(project.doc_path, 'sync_hash')
+    try:
+        with open(hash_file) as fh:
+            last_hash = fh.read().strip()
+    except IOError:
+        last_hash = None
+    if last_hash == sync_hash:
+        try:
+            api.project(project.pk).sync_versions.post(json.dumps({
+                'repo': version_post_data['repo'],
+                'hash': sync_hash,
+            }))
+            log.info("Versions unchanged for %s" % project)
+            return
+        except slumber.exceptions.HttpClientError:
+            log.info("Version sync hash unknown for %s, sending all versions"
+                     % project)
+        except (slumber.exceptions.HttpServerError,
+                requests.exceptions.RequestException), e:
+            log.warning("Version sync hash check failed for %s, sending all "
+                        "versions: %s" % (project, e))
+    version_post_data['hash'] = sync_hash
+    try:
+        api.project(project.pk).sync_versions.post(json.dumps(version_post_data))
+    except Exception:
+        log.error("Unable to sync versions of %s" % project, exc_info=True)
+        return
+    try:
+        with open(hash_file, 'w') as fh:
+            fh.write(sync_hash)
+    except IOError:
+        log.warning("Unable to record version sync hash for %s" % project)
+
+
 @task
 def build_docs(version_pk, pdf, man, epub, dash, record, force):
     """
@@ -407,6 +471,7 @@ def build_docs(version_pk, pdf, man, epub, dash, record, force):
         return ('', 'Conf file not found.', -1)
 
     with project.repo_lock(getattr(settings, 'REPO_LOCK_SECONDS', 30)):
+        workspace_gc.record_build(project, version.slug)
 
         html_builder = builder_loading.get(project.documentation_type)(version)
         if force:
@@ -461,34 +526,51 @@ def fileify(version_pk):
     """
     Create ImportedFile objects for all of a version's files.
 
-    This is a prereq for indexing the docs for search.
-    It also causes celery-haystack to kick off an index of the file.
+    This is a prereq for indexing the docs for search. The paths of the
+    build's files are handed to one ``update_search_index`` task, which runs
+    with database access even when this task doesn't (``DONT_HIT_DB``).
     """
     version_data = api.version(version_pk).get()
     version = make_api_version(version_data)
     project = version.project
     path = project.rtd_build_path(version.slug)
     log.info('Indexing files for %s' % project)
-    if path:
-        for root, dirnames, filenames in os.walk(path):
-            for filename in filenames:
-                if fnmatch.fnmatch(filename, '*.html'):
-                    dirpath = os.path.join(root.replace(path, '').lstrip('/'),
-                                           filename.lstrip('/'))
-                    if getattr(settings, 'DONT_HIT_DB', True):
-                        api.file.post(dict(
-                            project="/api/v1/project/%s/" % project.pk,
-                            version="/api/v1/version/%s/" % version.pk,
-                            path=dirpath,
-                            name=filename))
-                    else:
-                        obj, created = ImportedFile.objects.get_or_create(
-                            project=project,
-                            version=version,
-                            path=dirpath,
-                            name=filename)
-                        if not created:
-                            obj.save()
+    if not path:
+        return
+    paths = file_index.get_index(path).match('*.html')
+    update_search_index.delay(version.pk, paths)
+
+
+@task
+def update_search_index(version_pk, paths=None):
+    """
+    Sync the ImportedFiles of a version with the ``paths`` of its build,
+    then index them and remove the documents of the deleted files from the
+    index, in batches with a single commit.
+    """
+    try:
+        version = Version.objects.select_related('project').get(pk=version_pk)
+    except Version.DoesNotExist:
+        log.info('Not indexing deleted version %s' % version_pk)
+        return
+    removed = []
+    if paths is not None:
+        removed = bulk_index.sync_files(version.project, version, paths)
+    if version.project.privacy_level != constants.PUBLIC:
+        # Only public projects are searchable, see ImportedFileIndex. The
+        # project may have been public when its files were indexed.
+        bulk_index.remove_documents(
+            removed + bulk_index.version_identifiers(version))
+        return
+    bulk_index.index_version(version, processes=1, removed=removed)
+
+
+@task
+def remove_search_documents(identifiers):
+    """
+    Remove the documents of deleted files from the index with one commit.
+    """
+    bulk_index.remove_documents(identifiers)
 
 
 #@periodic_task(run_every=crontab(hour="*", minute="*/5", day_of_week="*"))
@@ -524,7 +606,10 @@ def update_intersphinx(version_pk):
     project = version.project
 
     try:
-        object_file = version.project.find('objects.inv', version.slug)[0]
+        # objects.inv is build output, look in the index the html builder
+        # made instead of the checkout's, which only tracks the VCS revision.
+        object_file = file_index.get_index(
+            project.full_build_path(version.slug)).find('objects.inv')[0]
     except IndexError:
         print "Failed to find objects file"
         return None
@@ -533,6 +618,8 @@ def update_intersphinx(version_pk):
     f.readline()
     urlpattern = "http://%s/en/%s/%%s" % (project.subdomain, version.slug)
     data = intersphinx.read_inventory_v2(f, urlpattern, operator.mod)
+    # Send all the terms to redis in one round trip.
+    pipe = redis_pool.pipeline()
     for top_key in data.keys():
         #print "KEY: %s" % top_key
         inner_keys = data[top_key].keys()
@@ -547,19 +634,21 @@ def update_intersphinx(version_pk):
             if ":" in url_key:
                 #This dumps junk data into the url namespace we don't need
                 #print "INNER: %s->%s" % (inner_key, url)
-                save_term(version, inner_key, url)
+                save_term(version, inner_key, url, pipe)
             else:
                 last_key = url_key.split('.')[-1]
                 if last_key != url_key:
                     #Only save last key if it differes
                     #print "LAST: %s->%s" % (last_key, url)
-                    save_term(version, last_key, url)
+                    save_term(version, last_key, url, pipe)
                 #print "URL: %s->%s" % (url_key, url)
-                save_term(version, url_key, url)
+                save_term(version, url_key, url, pipe)
+    pipe.execute()
 
 
-def save_term(version, term, url):
-    redis_obj = redis.Redis(**settings.REDIS)
+def save_term(version, term, url, redis_obj=None):
+    if redis_obj is None:
+        redis_obj = redis_pool.get_redis()
     lang = "en"
     project_slug = version.project.slug
     version_slug = version.slug
@@ -574,7 +663,7 @@ def symlink_cname(version):
     build_dir = version.project.rtd_build_path(version.slug)
     # Chop off the version from the end.
     build_dir = '/'.join(build_dir.split('/')[:-1])
-    redis_conn = redis.Redis(**settings.REDIS)
+    redis_conn = redis_pool.get_redis()
     try:
         cnames = redis_conn.smembers('rtd_slug:v1:%s' % version.project.slug)
     except redis.ConnectionError:
@@ -665,7 +754,7 @@ def webhook_notification(project_id, build, hook_url):
 def zenircbot_notification(version_id):
     version = Version.objects.get(id=version_id)
     message = "Build of %s successful" % version
-    redis_obj = redis.Redis(**settings.REDIS)
+    redis_obj = redis_pool.get_redis()
     IRC = getattr(settings, 'IRC_CHANNEL', '#readthedocs-build')
     try:
         redis_obj.publish('out',
@@ -681,6 +770,43 @@ def zenircbot_notification(version_id):
         return
 
 
+@task
+def collect_workspaces():
+    """
+    Evict least recently used checkouts and virtualenvs from the build server
+    to stay under ``WORKSPACE_DISK_BUDGET``.
+    """
+    freed = workspace_gc.collect()
+    log.info("Workspace collection freed %s bytes" % freed)
+    return freed
+
+
+@task
+def resolve_domain(host):
+    """
+    Resolve a host and add it to the domain map, queued by requests for
+    hosts the map doesn't know.
+    """
+    return domains.update_host(host)
+
+
+@task
+def refresh_domains():
+    """
+    Re-check stale entries in the domain map.
+    """
+    return domains.refresh()
+
+
+@task
+def rebuild_slug_filter():
+    """
+    Rebuild the filter of existing project and version slugs used to 404
+    requests for nonexistent docs without a query.
+    """
+    slug_filter.rebuild()
+
+
 @task
 def clear_artifacts(version_pk):
     """ Remove artifacts from the build server. """
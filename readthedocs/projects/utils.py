@@ -9,9 +9,11 @@ import logging
 from httplib2 import Http
 
 from django.conf import settings
+from django.db.models.query import QuerySet
 
 from distutils2.version import NormalizedVersion, suggest_normalized_version
-import redis
+
+from core import redis_pool
 
 
 log = logging.getLogger(__name__)
@@ -118,20 +120,74 @@ def mkversion(version_obj):
         return None
 
 
+# Sort key prefixes. Slugs that aren't versions sort above all versions, the
+# way sort_version_aware has always listed them first.
+SORT_KEY_VERSION = '1'
+SORT_KEY_OTHER = '2'
+
+
+def _sort_key_part(value):
+    """
+    Encode a piece of ``NormalizedVersion.parts`` so that comparing the
+    encoded strings gives the same result as comparing the tuples.
+    """
+    if isinstance(value, tuple):
+        # '0' ends a tuple and sorts below any element, so prefixes of a
+        # tuple come first.
+        return ''.join(_sort_key_part(item) for item in value) + '0'
+    if isinstance(value, (int, long)):
+        digits = str(value)
+        return '1%02d%s' % (len(digits), digits)
+    return '2%s ' % value
+
+
+def version_sort_key(slug):
+    """
+    A string for ``slug`` that sorts like its ``NormalizedVersion``.
+
+    This is what ``Version.sort_key`` stores, so versions can be ordered in
+    the database instead of parsing every slug in Python.
+    """
+    ver = mkversion({'slug': slug})
+    if ver is None:
+        return SORT_KEY_OTHER
+    key = SORT_KEY_VERSION + ''.join(_sort_key_part(part)
+                                     for part in ver.parts)
+    return key[:255]
+
+
+def get_sort_key(version_obj):
+    if hasattr(version_obj, 'slug'):
+        return (getattr(version_obj, 'sort_key', None) or
+                version_sort_key(version_obj.slug))
+    return version_obj.get('sort_key') or version_sort_key(version_obj['slug'])
+
+
+def sort_versions(version_list):
+    """
+    Sort versions highest first, using their stored sort keys.
+    """
+    return sorted(version_list, key=get_sort_key, reverse=True)
+
+
 def highest_version(version_list):
-    highest = [None, None]
-    for version in version_list:
+    """
+    Return ``[version, NormalizedVersion]`` for the highest version in
+    ``version_list``, or ``[None, None]``.
+
+    Querysets are ordered and limited in the database.
+    """
+    if isinstance(version_list, QuerySet):
+        candidates = (version_list
+                      .filter(sort_key__startswith=SORT_KEY_VERSION)
+                      .order_by('-sort_key')[:1])
+    else:
+        candidates = sort_versions(version_list)
+    for version in candidates:
         ver = mkversion(version)
-        if not ver:
-            continue
-        elif highest[1] and ver:
-            # If there's a highest, and no version, we don't need to set
-            # anything
-            if ver > highest[1]:
-                highest = [version, ver]
-        else:
-            highest = [version, ver]
-    return highest
+        if ver:
+            return [version, ver]
+    return [None, None]
 
 
 def purge_version(version, mainsite=False, subdomain=False, cname=False):
@@ -158,7 +214,7 @@ def purge_version(version, mainsite=False, subdomain=False, cname=False):
                 log.info("Purging %s on readthedocs.org" % root_url)
                 h.request(to_purge, method="PURGE", headers=headers)
             if cname:
-                redis_conn = redis.Redis(**settings.REDIS)
+                redis_conn = redis_pool.get_redis()
                 for cnamed in redis_conn.smembers('rtd_slug:v1:%s'
                                                   % version.project.slug):
                     headers = {'Host': cnamed}
@@ -11,11 +11,10 @@ from django.shortcuts import get_object_or_404, render_to_response
 from django.template import RequestContext
 from django.views.generic.list_detail import object_list
 
-from guardian.shortcuts import assign
-
 from builds.forms import AliasForm, VersionForm
 from builds.filters import VersionFilter
 from builds.models import Version
+from core.permissions import sync_project_permissions
 from projects.forms import (ImportProjectForm, build_versions_form,
                             build_upload_html_form, SubprojectForm,
                             UserForm, EmailHookForm, TranslationForm)
@@ -165,7 +164,7 @@ def project_import(request):
     if request.method == 'POST' and form.is_valid():
         project = form.save()
         form.instance.users.add(request.user)
-        assign('view_project', request.user, project)
+        sync_project_permissions(project, [request.user])
         project_manage = reverse('projects_detail', args=[project.slug])
         return HttpResponseRedirect(project_manage + '?docs_not_built=True')
 
@@ -6,12 +6,13 @@ from django.http import HttpResponse, HttpResponseRedirect, Http404
 from django.shortcuts import get_object_or_404, render_to_response
 from django.template import RequestContext
 from django.views.generic.list_detail import object_list
-from django.utils.datastructures import SortedDict
 
 from taggit.models import Tag
 
 from builds.filters import VersionSlugFilter
-from builds.models import Version
+from builds.models import Version, VersionArtifact
+from core import autocomplete
+from projects import constants
 from projects.models import Project
 
 
@@ -68,23 +69,8 @@ def project_downloads(request, project_slug):
     project = get_object_or_404(Project.objects.protected(request.user),
                                 slug=project_slug)
     versions = project.ordered_active_versions()
-    version_data = SortedDict()
-    for version in versions:
-        data = {}
-        if project.has_pdf(version.slug):
-            data['pdf_url'] = project.get_pdf_url(version.slug)
-        if project.has_htmlzip(version.slug):
-            data['htmlzip_url'] = project.get_htmlzip_url(version.slug)
-        if project.has_epub(version.slug):
-            data['epub_url'] = project.get_epub_url(version.slug)
-        if project.has_manpage(version.slug):
-            data['manpage_url'] = project.get_manpage_url(version.slug)
-        if project.has_dash(version.slug):
-            data['dash_url'] = project.get_dash_url(version.slug)
-            data['dash_feed_url'] = project.get_dash_feed_url(version.slug)
-        # Kill ones that have no downloads.
-        if data:
-            version_data[version.slug] = data
+    # Only versions with downloads, as recorded by the builders.
+    version_data = VersionArtifact.objects.download_urls(project)
 
     # in case the MEDIA_URL is a protocol relative URL we just assume
     # we want http as the protcol, so that Dash is able to handle the URL
@@ -151,30 +137,41 @@ def search_autocomplete(request):
         term = request.GET['term']
     else:
         raise Http404
-    queryset = (Project.objects.public(request.user)
-                .filter(name__icontains=term)[:20])
-
-    project_names = queryset.values_list('name', flat=True)
-    json_response = json.dumps(list(project_names))
+    project_names = autocomplete.search_projects(term)
+    if request.user.is_authenticated():
+        # Only public projects are in the index.
+        private = (Project.objects.public(request.user)
+                   .exclude(privacy_level=constants.PUBLIC)
+                   .values_list('name', flat=True))
+        project_names = autocomplete.merge(term, project_names, list(private))
+    json_response = json.dumps(project_names)
 
     return HttpResponse(json_response, mimetype='text/javascript')
 
 
+def _version_names(request, project, term, limit=autocomplete.LIMIT):
+    names = autocomplete.search_versions(project, term, limit)
+    if request.user.is_authenticated():
+        # Only public versions are in the index.
+        private = (Version.objects.public(request.user, project)
+                   .exclude(privacy_level=constants.PUBLIC)
+                   .values_list('slug', flat=True))
+        names = (names + autocomplete.rank(term, private, limit))[:limit]
+    return names
+
+
 def version_autocomplete(request, project_slug):
     """
     return a json list of version names
     """
     queryset = Project.objects.protected(request.user)
-    get_object_or_404(queryset, slug=project_slug)
-    versions = Version.objects.public(request.user)
+    project = get_object_or_404(queryset, slug=project_slug)
     if 'term' in request.GET:
         term = request.GET['term']
     else:
         raise Http404
-    version_queryset = versions.filter(slug__icontains=term)[:20]
-
-    names = version_queryset.values_list('slug', flat=True)
-    json_response = json.dumps(list(names))
+    names = _version_names(request, project, term)
+    json_response = json.dumps(names)
 
     return HttpResponse(json_response, mimetype='text/javascript')
 
@@ -182,13 +179,17 @@ def version_autocomplete(request, project_slug):
 def version_filter_autocomplete(request, project_slug):
     queryset = Project.objects.protected(request.user)
     project = get_object_or_404(queryset, slug=project_slug)
-    versions = Version.objects.public(request.user)
+    versions = Version.objects.public(request.user, project)
     filter = VersionSlugFilter(request.GET, queryset=versions)
     format = request.GET.get('format', 'json')
 
     if format == 'json':
-        names = filter.qs.values_list('slug', flat=True)
-        json_response = json.dumps(list(names))
+        term = request.GET.get('slug')
+        if term and not request.GET.get('tag'):
+            names = _version_names(request, project, term, limit=None)
+        else:
+            names = list(filter.qs.values_list('slug', flat=True))
+        json_response = json.dumps(names)
         return HttpResponse(json_response, mimetype='text/javascript')
     elif format == 'html':
         return render_to_response(
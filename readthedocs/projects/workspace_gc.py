@@ -0,0 +1,200 @@
+"""Disk budget garbage collection for version checkouts and virtualenvs.
+
+Every version that has ever been built keeps a full checkout under
+``<slug>/checkouts/<version>`` and possibly a virtualenv under
+``<slug>/envs/<version>``. We record when a version workspace was last
+checked out and last built, and evict the least recently used workspaces
+once the build server goes over ``WORKSPACE_DISK_BUDGET`` bytes.
+
+Eviction takes the project's repo lock without waiting, so a project that is
+currently building is simply skipped until the next run.
+"""
+from collections import namedtuple
+import logging
+import os
+import shutil
+import time
+
+from django.conf import settings
+
+from vcs_support.utils import LockTimeout, NonBlockingLock
+
+log = logging.getLogger(__name__)
+
+WORKSPACE_DIRS = ('checkouts', 'envs')
+
+
+class DiskProject(namedtuple('DiskProject', 'slug doc_path')):
+    """A project as it is laid out on disk, enough to take its repo lock."""
+    pass
+
+
+class Workspace(namedtuple('Workspace',
+                           'project version paths size last_used')):
+    pass
+
+
+def _usage_path(doc_path, version_slug, kind):
+    return os.path.join(doc_path, 'usage', '%s.%s' % (version_slug, kind))
+
+
+def _touch(path):
+    dirname = os.path.dirname(path)
+    if not os.path.exists(dirname):
+        os.makedirs(dirname)
+    with open(path, 'a'):
+        os.utime(path, None)
+
+
+def record_access(project, version_slug):
+    """
+    Mark a version workspace as used (checked out or updated) right now.
+    """
+    try:
+        _touch(_usage_path(project.doc_path, version_slug, 'access'))
+    except (IOError, OSError):
+        log.warning("Unable to record workspace access for %s:%s"
+                    % (project.slug, version_slug), exc_info=True)
+
+
+def record_build(project, version_slug):
+    """
+    Mark a version workspace as built right now.
+    """
+    try:
+        _touch(_usage_path(project.doc_path, version_slug, 'build'))
+    except (IOError, OSError):
+        log.warning("Unable to record workspace build for %s:%s"
+                    % (project.slug, version_slug), exc_info=True)
+
+
+def last_used(doc_path, version_slug, paths):
+    """
+    The newest of the recorded access and build times.
+
+    Falls back to the directory mtimes for workspaces that predate the
+    usage records.
+    """
+    times = []
+    for kind in ['access', 'build']:
+        try:
+            times.append(os.path.getmtime(
+                _usage_path(doc_path, version_slug, kind)))
+        except OSError:
+            pass
+    if not times:
+        for path in paths:
+            try:
+                times.append(os.path.getmtime(path))
+            except OSError:
+                pass
+    return max(times or [0])
+
+
+def disk_usage(path):
+    total = 0
+    for dirpath, dirnames, filenames in os.walk(path):
+        for filename in filenames:
+            try:
+                total += os.lstat(os.path.join(dirpath, filename)).st_size
+            except OSError:
+                pass
+    return total
+
+
+def find_workspaces(root=None):
+    """
+    Return a list of ``Workspace`` for every version on disk under ``root``.
+    """
+    if root is None:
+        root = settings.DOCROOT
+    workspaces = []
+    if not os.path.isdir(root):
+        return workspaces
+    for slug in os.listdir(root):
+        doc_path = os.path.join(root, slug)
+        versions = {}
+        for kind in WORKSPACE_DIRS:
+            kind_path = os.path.join(doc_path, kind)
+            if not os.path.isdir(kind_path):
+                continue
+            for version_slug in os.listdir(kind_path):
+                versions.setdefault(version_slug, []).append(
+                    os.path.join(kind_path, version_slug))
+        project = DiskProject(slug, doc_path)
+        for version_slug, paths in versions.items():
+            workspaces.append(Workspace(
+                project=project,
+                version=version_slug,
+                paths=paths,
+                size=sum(disk_usage(path) for path in paths),
+                last_used=last_used(doc_path, version_slug, paths),
+            ))
+    return workspaces
+
+
+def evict(workspace):
+    """
+    Remove a workspace while holding its project's repo lock.
+
+    Returns False if the project is busy and nothing was removed.
+    """
+    trash = os.path.join(workspace.project.doc_path, 'trash')
+    to_remove = []
+    try:
+        with NonBlockingLock(workspace.project):
+            # Only move things out of the way while holding the lock, builds
+            # waiting on it will force it open after REPO_LOCK_SECONDS.
+            if not os.path.exists(trash):
+                os.makedirs(trash)
+            for path in workspace.paths:
+                log.info("Evicting workspace %s" % path)
+                target = os.path.join(trash, '%s-%s-%s' % (
+                    os.path.basename(os.path.dirname(path)),
+                    workspace.version, time.time()))
+                os.rename(path, target)
+                to_remove.append(target)
+            for kind in ['access', 'build']:
+                usage = _usage_path(workspace.project.doc_path,
+                                    workspace.version, kind)
+                if os.path.exists(usage):
+                    os.remove(usage)
+    except LockTimeout:
+        log.info("Not evicting %s:%s, project is locked"
+                 % (workspace.project.slug, workspace.version))
+        return False
+    finally:
+        for path in to_remove:
+            shutil.rmtree(path, ignore_errors=True)
+    return True
+
+
+def collect(budget=None, root=None, min_idle=None):
+    """
+    Evict least recently used workspaces until we're under ``budget`` bytes.
+
+    Workspaces used in the last ``min_idle`` seconds are never evicted.
+    Returns the number of bytes freed.
+    """
+    if budget is None:
+        budget = getattr(settings, 'WORKSPACE_DISK_BUDGET', None)
+    if budget is None:
+        return 0
+    if min_idle is None:
+        min_idle = getattr(settings, 'WORKSPACE_MIN_IDLE_SECONDS', 60 * 60)
+    workspaces = sorted(find_workspaces(root), key=lambda w: w.last_used)
+    total = sum(w.size for w in workspaces)
+    log.info("Workspaces use %s bytes of a %s byte budget" % (total, budget))
+    cutoff = time.time() - min_idle
+    freed = 0
+    for workspace in workspaces:
+        if total - freed <= budget:
+            break
+        if workspace.last_used > cutoff:
+            break
+        if evict(workspace):
+            freed += workspace.size
+    if total - freed > budget:
+        log.warning("Workspaces still use %s bytes, over the %s byte budget"
+                    % (total - freed, budget))
+    return freed
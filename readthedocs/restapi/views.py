@@ -7,16 +7,64 @@ from rest_framework.decorators import link
 from rest_framework.renderers import JSONRenderer, BrowsableAPIRenderer
 from rest_framework.response import Response
 
+from api import response_cache
 from betterversion.better import version_windows, BetterVersion 
+from core import autocomplete
 from projects.models import Project, EmailHook
 
 from .serializers import ProjectSerializer
 from .permissions import RelatedProjectIsOwner
 
-class ProjectViewSet(viewsets.ModelViewSet):
+
+class CachedViewSetMixin(object):
+    """
+    Answers list and retrieve requests from the cached responses of
+    ``response_scope``, see ``api.response_cache``.
+    """
+    response_scope = None
+    cached_actions = ('list', 'retrieve')
+
+    def response_project(self, obj):
+        """
+        The pk of the project whose changes invalidate ``obj``.
+        """
+        return obj.project_id
+
+    def _depends_on(self, objects):
+        # The cache sees the Django request, not DRF's wrapper around it.
+        request = getattr(self.request, '_request', self.request)
+        response_cache.depends_on(
+            request, *[self.response_project(obj) for obj in objects])
+
+    def get_serializer(self, instance=None, *args, **kwargs):
+        if instance is not None:
+            self._depends_on(instance if kwargs.get('many') else [instance])
+        return super(CachedViewSetMixin, self).get_serializer(
+            instance, *args, **kwargs)
+
+    def get_pagination_serializer(self, page):
+        self._depends_on(page.object_list)
+        return super(CachedViewSetMixin, self).get_pagination_serializer(page)
+
+    def dispatch(self, request, *args, **kwargs):
+        parent = super(CachedViewSetMixin, self).dispatch
+        action = self.action_map.get(request.method.lower())
+        if action not in self.cached_actions:
+            return parent(request, *args, **kwargs)
+        return response_cache.cached_response(
+            self.response_scope, request,
+            lambda request: parent(request, *args, **kwargs),
+            is_list=action == 'list')
+
+
+class ProjectViewSet(CachedViewSetMixin, viewsets.ModelViewSet):
     permission_classes = [permissions.IsAuthenticatedOrReadOnly]
     renderer_classes = (JSONRenderer, BrowsableAPIRenderer)
     model = Project
+    response_scope = 'project'
+
+    def response_project(self, obj):
+        return obj.pk
 
     @link()
     def valid_versions(self, request, **kwargs):
@@ -44,6 +92,8 @@ class ProjectViewSet(viewsets.ModelViewSet):
         # Disable making old versions inactive for now.
         #project.versions.exclude(verbose_name__in=version_strings).update(active=False)
         project.versions.filter(verbose_name__in=version_strings).update(active=True)
+        response_cache.bump(project.pk)
+        autocomplete.changed(project.pk)
         return Response({
             'flat': version_strings,
             })
@@ -1,7 +1,14 @@
+from django.contrib.auth.models import User
+from django.core.cache import get_cache
+from django.db import connection
 from django.test import TestCase
 import json
 import base64
 
+from api import response_cache
+from builds.models import Build, Version, VersionArtifact
+from projects.models import ImportedFile, Project
+
 
 super_auth = base64.b64encode('super:test')
 eric_auth = base64.b64encode('eric:test')
@@ -123,3 +130,135 @@ class APITests(TestCase):
         self.assertEqual(resp.status_code, 200)
         obj = json.loads(resp.content)
         self.assertEqual(obj['is_highest'], True)
+
+
+class APIQueryCountTests(TestCase):
+    """
+    List endpoints must fetch related objects for a whole page at once.
+    """
+    fixtures = ['eric.json', 'test_data.json']
+    endpoints = ['/api/v1/project/', '/api/v1/version/', '/api/v1/file/',
+                 '/api/v1/build/', '/api/v1/artifact/', '/api/v1/user/']
+
+    def add_projects(self, count, offset=0):
+        user = User.objects.get(username='eric')
+        for num in range(offset, offset + count):
+            project = Project.objects.create(name='Project %s' % num,
+                                             slug='project-%s' % num)
+            project.users.add(user)
+            version = Version.objects.create(
+                project=project, slug='latest', verbose_name='latest',
+                identifier='origin/master', active=True)
+            VersionArtifact.objects.create(
+                version=version, type='pdf',
+                path='pdf/project-%s/latest/project-%s.pdf' % (num, num))
+            Build.objects.create(project=project, version=version,
+                                 success=True)
+            # Skip the search index signals.
+            ImportedFile.objects.bulk_create([
+                ImportedFile(project=project, version=version,
+                             name='index.html', path='index.html')])
+
+    def count_queries(self, url):
+        # The same bookkeeping assertNumQueries does.
+        old_debug_cursor = connection.use_debug_cursor
+        connection.use_debug_cursor = True
+        start = len(connection.queries)
+        try:
+            resp = self.client.get(url, data={'format': 'json',
+                                              'limit': 100})
+            self.assertEqual(resp.status_code, 200)
+        finally:
+            connection.use_debug_cursor = old_debug_cursor
+        return len(connection.queries) - start
+
+    def test_list_queries_are_constant(self):
+        self.add_projects(1)
+        counts = dict((url, self.count_queries(url))
+                      for url in self.endpoints)
+        self.add_projects(10, offset=1)
+        for url in self.endpoints:
+            self.assertEqual(self.count_queries(url), counts[url], url)
+
+    def test_project_downloads(self):
+        self.add_projects(1)
+        resp = self.client.get('/api/v1/project/project-0/',
+                               data={'format': 'json'})
+        obj = json.loads(resp.content)
+        self.assertEqual(obj['downloads'].keys(), ['pdf'])
+        self.assertTrue(obj['downloads']['pdf'].endswith(
+            'pdf/project-0/latest/project-0.pdf'))
+        resp = self.client.get('/api/v1/version/',
+                               data={'format': 'json', 'project__slug':
+                                     'project-0'})
+        obj = json.loads(resp.content)['objects'][0]
+        self.assertEqual(obj['project']['downloads'].keys(), ['pdf'])
+
+    def test_invalid_search(self):
+        for url in ['/api/v1/project/search/', '/api/v1/file/search/']:
+            resp = self.client.get(url, data={'format': 'json', 'q': 'test',
+                                              'selected_facets': 'project'})
+            self.assertEqual(resp.status_code, 400, url)
+            self.assertIn('selected_facets',
+                          json.loads(resp.content)['errors'])
+
+
+class APIResponseCacheTests(TestCase):
+    fixtures = ['eric.json', 'test_data.json']
+
+    def setUp(self):
+        self.old_cache = response_cache.cache
+        response_cache.cache = get_cache(
+            'django.core.cache.backends.locmem.LocMemCache')
+        response_cache.cache.clear()
+
+    def tearDown(self):
+        response_cache.cache = self.old_cache
+
+    def get(self, url, **extra):
+        return self.client.get(url, data={'format': 'json'}, **extra)
+
+    def test_conditional_get(self):
+        resp = self.get('/api/v1/version/1/')
+        self.assertEqual(resp.status_code, 200)
+        etag = resp['ETag']
+        resp = self.get('/api/v1/version/1/', HTTP_IF_NONE_MATCH=etag)
+        self.assertEqual(resp.status_code, 304)
+        self.assertEqual(resp.content, '')
+        resp = self.get('/api/v1/version/1/',
+                        HTTP_IF_MODIFIED_SINCE=resp['Last-Modified'])
+        self.assertEqual(resp.status_code, 304)
+        resp = self.get('/api/v1/version/1/', HTTP_IF_NONE_MATCH='"other"')
+        self.assertEqual(resp.status_code, 200)
+
+    def test_cached_response(self):
+        first = self.get('/api/v1/build/')
+        with self.assertNumQueries(0):
+            second = self.get('/api/v1/build/')
+        self.assertEqual(first.content, second.content)
+        self.assertEqual(first['ETag'], second['ETag'])
+
+    def test_save_invalidates(self):
+        etag = self.get('/api/v1/version/1/')['ETag']
+        version = Version.objects.get(pk=1)
+        version.verbose_name = 'changed'
+        version.save()
+        resp = self.get('/api/v1/version/1/', HTTP_IF_NONE_MATCH=etag)
+        self.assertEqual(resp.status_code, 200)
+        self.assertEqual(json.loads(resp.content)['verbose_name'], 'changed')
+        project = Project.objects.get(pk=1)
+        etag = self.get('/api/v1/project/1/')['ETag']
+        project.name = 'Changed'
+        project.save()
+        self.assertNotEqual(self.get('/api/v1/project/1/')['ETag'], etag)
+
+    def test_other_projects_keep_cache(self):
+        version = Version.objects.get(pk=1)
+        self.get('/api/v1/version/1/')
+        other = Project.objects.exclude(pk=version.project_id)[0]
+        Version.objects.create(project=other, slug='new', identifier='new',
+                               verbose_name='new')
+        with self.assertNumQueries(0):
+            resp = self.get('/api/v1/version/1/')
+        self.assertEqual(resp.status_code, 200)
+
@@ -0,0 +1,78 @@
+import hashlib
+import os
+import shutil
+from tempfile import mkdtemp
+
+from django.test import TestCase
+
+from builds.models import VersionArtifact
+from doc_builder.artifacts import record_artifact
+from projects.models import Project
+
+
+class ArtifactTests(TestCase):
+    fixtures = ['eric', 'test_data']
+
+    def setUp(self):
+        self.media_root = mkdtemp()
+        self.project = Project.objects.get(slug='read-the-docs')
+        # Fixtures are loaded without save(), compute the sort keys.
+        for version in self.project.versions.all():
+            version.save()
+        self.version = self.project.versions.get(slug='0.2.1')
+
+    def tearDown(self):
+        shutil.rmtree(self.media_root)
+
+    def _write(self, *parts):
+        path = os.path.join(self.media_root, *parts)
+        os.makedirs(os.path.dirname(path))
+        with open(path, 'w') as fh:
+            fh.write('%PDF')
+        return path
+
+    def test_record_artifact(self):
+        path = self._write('pdf', 'read-the-docs', '0.2.1', 'read-the-docs.pdf')
+        with self.settings(MEDIA_ROOT=self.media_root, DONT_HIT_DB=False):
+            record_artifact(self.version, 'pdf', path)
+            record_artifact(self.version, 'pdf', path)
+        artifact = self.version.artifacts.get()
+        self.assertEqual(artifact.type, 'pdf')
+        self.assertEqual(artifact.path,
+                         'pdf/read-the-docs/0.2.1/read-the-docs.pdf')
+        self.assertEqual(artifact.size, 4)
+        self.assertEqual(artifact.sha1, hashlib.sha1('%PDF').hexdigest())
+
+    def test_missing_file_is_not_recorded(self):
+        with self.settings(MEDIA_ROOT=self.media_root, DONT_HIT_DB=False):
+            record_artifact(self.version, 'epub',
+                            os.path.join(self.media_root, 'missing.epub'))
+        self.assertFalse(self.version.artifacts.exists())
+
+    def test_download_urls(self):
+        for slug in ['0.2.1', '0.2.2']:
+            VersionArtifact.objects.create(
+                version=self.project.versions.get(slug=slug), type='pdf',
+                path='pdf/read-the-docs/%s/read-the-docs.pdf' % slug)
+        VersionArtifact.objects.create(
+            version=self.version, type='dash',
+            path='dash/read-the-docs/0.2.1/read-the-docs.tgz')
+        with self.settings(MEDIA_URL='/media/'):
+            with self.assertNumQueries(1):
+                downloads = VersionArtifact.objects.download_urls(
+                    self.project)
+        self.assertEqual(downloads.keys(), ['0.2.2', '0.2.1'])
+        self.assertEqual(downloads['0.2.2'], {
+            'pdf_url': '/media/pdf/read-the-docs/0.2.2/read-the-docs.pdf'})
+        self.assertEqual(
+            downloads['0.2.1']['dash_url'],
+            '/media/dash/read-the-docs/0.2.1/read-the-docs.tgz')
+        self.assertTrue('dash_feed_url' in downloads['0.2.1'])
+
+    def test_downloads_page(self):
+        VersionArtifact.objects.create(
+            version=self.version, type='epub',
+            path='epub/read-the-docs/0.2.1/read-the-docs.epub')
+        response = self.client.get('/projects/read-the-docs/downloads/')
+        self.assertContains(response, 'read-the-docs/0.2.1/read-the-docs.epub')
+        self.assertNotContains(response, '.pdf')
@@ -0,0 +1,76 @@
+import json
+
+from django.test import TestCase
+from django.utils import unittest
+
+from builds.models import Version
+from core import autocomplete
+from projects.models import Project
+
+
+class PrefixIndexTests(unittest.TestCase):
+
+    def setUp(self):
+        self.names = [u'Read The Docs', u'Docs', u'Docstrings', u'Sphinx',
+                      u'sphinx-docs', u'Readme']
+        self.index = autocomplete.PrefixIndex(self.names,
+                                              precomputed_length=2)
+
+    def test_ranking(self):
+        # Exact match, then names starting with the term, then word starts.
+        self.assertEqual(self.index.search(u'docs'),
+                         [u'Docs', u'Docstrings', u'sphinx-docs',
+                          u'Read The Docs'])
+        self.assertEqual(self.index.search(u'the d'), [u'Read The Docs'])
+        self.assertEqual(self.index.search(u'ocs'), [])
+
+    def test_precomputed_terms(self):
+        for term in [u'd', u'do', u're', u'sp', u'x']:
+            self.assertEqual(self.index.search(term),
+                             self.index._search(term))
+        self.assertEqual(self.index.search(u'zz'), [])
+
+    def test_rank(self):
+        self.assertEqual(autocomplete.rank(u'docs', self.names, limit=2),
+                         [u'Docs', u'Docstrings'])
+
+
+class AutocompleteViewTests(TestCase):
+    fixtures = ['eric', 'test_data']
+
+    def setUp(self):
+        autocomplete.changed()
+        self.project = Project.objects.get(slug='read-the-docs')
+        for version in Version.objects.all():
+            # Fixtures don't set the sort keys.
+            version.save()
+        Version.objects.create(project=Project.objects.get(slug='pip'),
+                               slug='0.2.3', identifier='0.2.3',
+                               verbose_name='0.2.3', active=True)
+
+    def test_search_autocomplete(self):
+        resp = self.client.get('/projects/search/autocomplete/',
+                               {'term': 'django'})
+        self.assertEqual(json.loads(resp.content),
+                         [u'Djangoembed', u'Django Uni Form',
+                          u'Django Test Utils'])
+        resp = self.client.get('/projects/search/autocomplete/',
+                               {'term': 'form'})
+        self.assertEqual(json.loads(resp.content), [u'Django Uni Form'])
+
+    def test_new_project_is_found(self):
+        Project.objects.create(name='Djangofest', slug='djangofest',
+                               repo='https://github.com/example/djangofest')
+        resp = self.client.get('/projects/search/autocomplete/',
+                               {'term': 'djangof'})
+        self.assertEqual(json.loads(resp.content), [u'Djangofest'])
+
+    def test_version_autocomplete_is_scoped_to_project(self):
+        resp = self.client.get(
+            '/projects/autocomplete/version/read-the-docs/', {'term': '0.2'})
+        self.assertEqual(json.loads(resp.content), [u'0.2.2', u'0.2.1'])
+        resp = self.client.get(
+            '/projects/autocomplete/filter/version/read-the-docs/',
+            {'slug': 'a'})
+        self.assertEqual(sorted(json.loads(resp.content)),
+                         [u'awesome', u'latest'])
@@ -1,4 +1,4 @@
-from os.path import exists
+from os.path import exists, join as pjoin
 
 from django.contrib.admin.models import User
 
@@ -23,22 +23,28 @@ class TestGitBackend(RTDTestCase):
         )
         self.project.users.add(self.eric)
 
-    def test_parse_branches(self):
-        data = """\
-        develop
-        master
-        release/2.0.0
-        remotes/origin/2.0.X
-        remotes/origin/HEAD -> origin/master
-        remotes/origin/master
-        remotes/origin/release/2.0.0"""
-
+    def test_parse_branch_refs(self):
+        refs = [
+            ('3b32886c8d3cb815df3793b3937b2e91d0fb00f1', 'refs/heads/develop'),
+            ('3b32886c8d3cb815df3793b3937b2e91d0fb00f1', 'refs/heads/master'),
+            ('a63a2de628a3ce89034b7d1a5ca5e8159534eef0',
+             'refs/heads/release/2.0.0'),
+            ('bd533a768ff661991a689d3758fcfe72f455435d',
+             'refs/remotes/origin/2.0.X'),
+            ('3b32886c8d3cb815df3793b3937b2e91d0fb00f1',
+             'refs/remotes/origin/HEAD'),
+            ('3b32886c8d3cb815df3793b3937b2e91d0fb00f1',
+             'refs/remotes/origin/master'),
+            ('a63a2de628a3ce89034b7d1a5ca5e8159534eef0',
+             'refs/remotes/origin/release/2.0.0'),
+            ('c0288a17899b2c6818f74e3a90b77e2a1779f96a', 'refs/tags/2.0.1'),
+        ]
         expected_ids = [('develop', 'develop'), ('master', 'master'),
                         ('release/2.0.0', 'release-2.0.0'),
                         ('remotes/origin/2.0.X', '2.0.X'),
                         ('remotes/origin/release/2.0.0', 'release-2.0.0')]
         given_ids = [(x.identifier, x.verbose_name) for x in
-                     self.project.vcs_repo().parse_branches(data)]
+                     self.project.vcs_repo().parse_branch_refs(refs)]
         assert expected_ids == given_ids
 
     def test_git_checkout(self):
@@ -46,27 +52,77 @@ class TestGitBackend(RTDTestCase):
         repo.checkout()
         assert exists(repo.working_dir)
 
-    def test_parse_git_tags(self):
-        data = """\
-            3b32886c8d3cb815df3793b3937b2e91d0fb00f1 refs/tags/2.0.0
-            bd533a768ff661991a689d3758fcfe72f455435d refs/tags/2.0.1
-            c0288a17899b2c6818f74e3a90b77e2a1779f96a refs/tags/2.0.2
-            a63a2de628a3ce89034b7d1a5ca5e8159534eef0 refs/tags/2.1.0.beta2
-            c7fc3d16ed9dc0b19f0d27583ca661a64562d21e refs/tags/2.1.0.rc1
-            edc0a2d02a0cc8eae8b67a3a275f65cd126c05b1 refs/tags/2.1.0.rc2
-         """
-        expected_tags = [
-            ('3b32886c8d3cb815df3793b3937b2e91d0fb00f1', '2.0.0'),
-            ('bd533a768ff661991a689d3758fcfe72f455435d', '2.0.1'),
-            ('c0288a17899b2c6818f74e3a90b77e2a1779f96a', '2.0.2'),
-            ('a63a2de628a3ce89034b7d1a5ca5e8159534eef0', '2.1.0.beta2'),
-            ('c7fc3d16ed9dc0b19f0d27583ca661a64562d21e', '2.1.0.rc1'),
-            ('edc0a2d02a0cc8eae8b67a3a275f65cd126c05b1', '2.1.0.rc2'),
-        ]
-
+    def test_clone_from_mirror(self):
+        with self.settings(GIT_SHARED_MIRROR=True, GIT_SHALLOW_DEPTH=None):
+            repo = self.project.vcs_repo()
+            repo.checkout()
+        assert exists(pjoin(repo.mirror_dir, 'HEAD'))
+        alternates = pjoin(repo.working_dir, '.git', 'objects', 'info',
+                           'alternates')
+        assert exists(alternates)
+        code, out, err = repo.run('git', 'config', '--get',
+                                  'remote.origin.url')
+        assert out.strip() == self.project.repo
+
+    def test_mirror_url_change(self):
+        with self.settings(GIT_SHARED_MIRROR=True, GIT_SHALLOW_DEPTH=None):
+            latest = self.project.vcs_repo()
+            latest.checkout()
+            self.project.repo = make_test_git()
+            self.project.save()
+            other = self.project.vcs_repo('other')
+            other.checkout()
+        assert other.mirror_dir == latest.mirror_dir
+        code, out, err = other.run_mirror('config', '--get',
+                                          'remote.origin.url')
+        assert out.strip() == self.project.repo
+        # The existing checkout still finds its objects in the mirror.
+        code, out, err = latest.run('git', 'fsck')
+        assert code == 0
+        code, out, err = latest.run('git', 'log', '-1')
+        assert code == 0
+
+    def test_local_refs_are_cached(self):
+        with self.settings(GIT_SHALLOW_DEPTH=None):
+            repo = self.project.vcs_repo()
+            repo.checkout()
+            repo.run('git', 'tag', '1.0')
+            code, head, err = repo.run('git', 'rev-parse', 'HEAD')
+            assert ([(x.identifier, x.verbose_name) for x in repo.tags]
+                    == [(head.strip(), '1.0')])
+            assert 'master' in [x.verbose_name for x in repo.branches]
+            assert exists(pjoin(repo.working_dir, '.git', 'rtd-refs.json'))
+
+            # Unchanged refs are read from the cache without running git.
+            cached = self.project.vcs_repo()
+            cached.run = lambda *args: (1, '', 'git was run')
+            assert ([x.verbose_name for x in cached.tags] == ['1.0'])
+
+            # A new ref changes the fingerprint.
+            repo.run('git', 'tag', '1.1')
+            fresh = self.project.vcs_repo()
+            assert ([x.verbose_name for x in fresh.tags] == ['1.0', '1.1'])
+
+    def test_parse_refs(self):
+        data = (
+            "3b32886c8d3cb815df3793b3937b2e91d0fb00f1\tHEAD\n"
+            "3b32886c8d3cb815df3793b3937b2e91d0fb00f1\trefs/heads/master\n"
+            "a63a2de628a3ce89034b7d1a5ca5e8159534eef0\trefs/heads/release/2.0\n"
+            "bd533a768ff661991a689d3758fcfe72f455435d\trefs/tags/2.0.1\n"
+            "c0288a17899b2c6818f74e3a90b77e2a1779f96a\trefs/tags/2.0.1^{}\n"
+        )
+        repo = self.project.vcs_repo()
+        repo._remote_refs = repo.parse_refs(data)
+        assert len(repo._remote_refs) == 4
         given_ids = [(x.identifier, x.verbose_name) for x in
-                     self.project.vcs_repo().parse_tags(data)]
-        assert expected_tags == given_ids
+                     repo.remote_branches()]
+        assert given_ids == [('master', 'master'),
+                             ('remotes/origin/release/2.0', 'release-2.0')]
+        assert (repo.resolve_remote_ref('bd533a768ff661991a689d3758fcfe72f455435d')
+                == 'refs/tags/2.0.1')
+        assert (repo.resolve_remote_ref('remotes/origin/release/2.0')
+                == 'refs/heads/release/2.0')
+        assert repo.resolve_remote_ref('missing') is None
 
 
 class TestHgBackend(RTDTestCase):
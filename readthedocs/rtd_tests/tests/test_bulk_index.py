@@ -0,0 +1,185 @@
+# -*- coding: utf-8 -*-
+import os
+import shutil
+from tempfile import mkdtemp
+
+from django.test import TestCase
+
+from haystack import connections
+
+from projects import bulk_index, constants, tasks
+from projects.models import ImportedFile, Project
+
+PAGE = u"""<html><body>
+<div class="related">Navigation</div>
+<div class="document"><h1>Title¶</h1><p>Some <em>text</em></p></div>
+</body></html>"""
+
+
+class FakeBackend(object):
+
+    def __init__(self):
+        self.updates = []
+        self.removals = []
+
+    def update(self, index, iterable, commit=True):
+        self.updates.append(([obj._prepared_text for obj in iterable],
+                             commit))
+
+    def remove(self, obj_or_string, commit=True):
+        self.removals.append((obj_or_string, commit))
+
+
+class FakeSolr(object):
+
+    def __init__(self):
+        self.deletes = []
+
+    def delete(self, id=None, q=None, commit=True):
+        self.deletes.append((q, commit))
+
+
+class BulkIndexTests(TestCase):
+    fixtures = ['eric', 'test_data']
+
+    def setUp(self):
+        self.docroot = mkdtemp()
+        self.project = Project.objects.get(slug='read-the-docs')
+        self.version = self.project.versions.get(slug='latest')
+        self.backend = FakeBackend()
+        connections['default'].get_backend = lambda: self.backend
+
+    def tearDown(self):
+        del connections['default'].get_backend
+        shutil.rmtree(self.docroot)
+
+    def write_files(self, count):
+        root = os.path.join(self.docroot, self.project.slug, 'rtd-builds',
+                            'latest')
+        os.makedirs(root)
+        files = []
+        for num in range(count):
+            name = 'page%s.html' % num
+            with open(os.path.join(root, name), 'w') as fh:
+                fh.write(PAGE.replace(u'Title', u'Page %s' % num)
+                         .encode('utf-8'))
+            files.append(ImportedFile(project=self.project,
+                                      version=self.version,
+                                      name=name, path=name))
+        ImportedFile.objects.bulk_create(files)
+
+    def test_extract_text(self):
+        path = os.path.join(self.docroot, 'page.html')
+        with open(path, 'w') as fh:
+            fh.write(PAGE.encode('utf-8'))
+        self.assertEqual(bulk_index.extract_text(path), u'TitleSome text')
+        self.assertEqual(bulk_index.extract_text(path, 'div.missing'), None)
+        self.assertEqual(
+            bulk_index.extract_text(os.path.join(self.docroot, 'missing')),
+            None)
+
+    def test_batches_commit_once(self):
+        self.write_files(5)
+        with self.settings(DOCROOT=self.docroot):
+            sent = bulk_index.index_version(self.version, processes=1,
+                                            batch_size=2)
+        self.assertEqual(sent, 5)
+        self.assertEqual([(len(texts), commit)
+                          for texts, commit in self.backend.updates],
+                         [(2, False), (3, True)])
+        texts = sorted(sum([texts for texts, commit in self.backend.updates],
+                           []))
+        self.assertEqual(texts[0], u'Page 0Some text')
+
+    def test_sync_files(self):
+        self.write_files(3)
+        gone = ImportedFile.objects.get(version=self.version,
+                                        path='page2.html')
+        removed = bulk_index.sync_files(self.project, self.version,
+                                        ['page0.html', 'page1.html',
+                                         'new.html'])
+        self.assertEqual(removed, ['projects.importedfile.%s' % gone.pk])
+        self.assertEqual(
+            sorted(ImportedFile.objects.filter(version=self.version)
+                   .values_list('path', flat=True)),
+            ['new.html', 'page0.html', 'page1.html'])
+
+    def test_removals_commit_with_updates(self):
+        self.write_files(2)
+        with self.settings(DOCROOT=self.docroot):
+            bulk_index.index_version(self.version, processes=1,
+                                     removed=['projects.importedfile.98',
+                                              'projects.importedfile.99'])
+        self.assertEqual(self.backend.removals,
+                         [('projects.importedfile.98', False),
+                          ('projects.importedfile.99', False)])
+        self.assertEqual([commit for texts, commit in self.backend.updates],
+                         [True])
+
+    def test_removals_commit_without_updates(self):
+        bulk_index.index_version(self.version, processes=1,
+                                 removed=['projects.importedfile.98',
+                                          'projects.importedfile.99'])
+        self.assertEqual(self.backend.removals,
+                         [('projects.importedfile.98', False),
+                          ('projects.importedfile.99', True)])
+        self.assertEqual(self.backend.updates, [])
+
+    def test_removals_commit_when_every_file_is_skipped(self):
+        ImportedFile.objects.bulk_create([
+            ImportedFile(project=self.project, version=self.version,
+                         name='missing.html', path='missing.html')])
+        with self.settings(DOCROOT=self.docroot):
+            sent = bulk_index.index_version(
+                self.version, processes=1,
+                removed=['projects.importedfile.98',
+                         'projects.importedfile.99'])
+        self.assertEqual(sent, 0)
+        self.assertEqual(self.backend.removals,
+                         [('projects.importedfile.98', False),
+                          ('projects.importedfile.99', True)])
+        self.assertEqual(self.backend.updates, [])
+
+    def test_solr_removals_are_batched(self):
+        self.backend.conn = FakeSolr()
+        self.backend.silently_fail = False
+        old_solr_backend = bulk_index._solr_backend
+        bulk_index._solr_backend = lambda backend: True
+        try:
+            bulk_index.remove_documents(['projects.importedfile.%s' % num
+                                         for num in range(501)])
+        finally:
+            bulk_index._solr_backend = old_solr_backend
+        self.assertEqual([commit for q, commit in self.backend.conn.deletes],
+                         [False, True])
+        first, last = [q for q, commit in self.backend.conn.deletes]
+        self.assertTrue(first.startswith('id:"projects.importedfile.0" OR '))
+        self.assertEqual(last, 'id:"projects.importedfile.500"')
+        self.assertEqual(self.backend.removals, [])
+
+    def test_update_search_index_syncs_files(self):
+        self.write_files(3)
+        gone = ImportedFile.objects.get(version=self.version,
+                                        path='page2.html')
+        with self.settings(DOCROOT=self.docroot):
+            tasks.update_search_index(self.version.pk,
+                                      ['page0.html', 'page1.html'])
+        self.assertEqual(self.backend.removals,
+                         [(bulk_index.search_identifier(gone.pk), False)])
+        self.assertEqual([len(texts) for texts, commit
+                          in self.backend.updates], [2])
+
+    def test_private_projects_are_removed(self):
+        self.write_files(2)
+        gone = ImportedFile.objects.get(version=self.version,
+                                        path='page1.html')
+        self.project.privacy_level = constants.PRIVATE
+        self.project.save()
+        tasks.update_search_index(self.version.pk, ['page0.html'])
+        expected = [bulk_index.search_identifier(gone.pk)] + [
+            bulk_index.search_identifier(pk) for pk in
+            ImportedFile.objects.filter(version=self.version)
+            .values_list('pk', flat=True)]
+        self.assertEqual([identifier for identifier, commit
+                          in self.backend.removals], expected)
+        self.assertEqual(self.backend.updates, [])
@@ -0,0 +1,50 @@
+import os
+import shutil
+import time
+from tempfile import mkdtemp
+
+from django.test import TestCase
+
+from projects.models import Project
+
+
+class ConfFileCacheTests(TestCase):
+
+    def setUp(self):
+        self.root = mkdtemp()
+        self.project = Project(name='Pip', slug='pip')
+        with self.settings(DOCROOT=self.root):
+            self.checkout = self.project.checkout_path('latest')
+        os.makedirs(os.path.join(self.checkout, '.git'))
+        os.makedirs(os.path.join(self.checkout, 'docs'))
+        self.head = os.path.join(self.checkout, '.git', 'HEAD')
+        open(self.head, 'w').close()
+        self.conf = os.path.join(self.checkout, 'docs', 'conf.py')
+        open(self.conf, 'w').close()
+
+    def tearDown(self):
+        # The cache is keyed on the checkout path, which depends on DOCROOT.
+        with self.settings(DOCROOT=self.root):
+            self.project.clear_conf_file_cache()
+        shutil.rmtree(self.root)
+
+    def test_conf_file_is_cached_per_revision(self):
+        with self.settings(DOCROOT=self.root):
+            self.assertEqual(self.project.conf_file(), self.conf)
+            os.makedirs(os.path.join(self.checkout, 'docs', 'source'))
+            moved = os.path.join(self.checkout, 'docs', 'source', 'conf.py')
+            os.rename(self.conf, moved)
+            # Same revision, no walk.
+            self.assertEqual(self.project.conf_file(), self.conf)
+            # A new checkout changes the VCS state and finds the new file.
+            future = time.time() + 10
+            os.utime(self.head, (future, future))
+            self.assertEqual(self.project.conf_file(), moved)
+
+    def test_clear_conf_file_cache(self):
+        with self.settings(DOCROOT=self.root):
+            self.assertEqual(self.project.conf_file(), self.conf)
+            moved = os.path.join(self.checkout, 'conf.py')
+            os.rename(self.conf, moved)
+            self.project.clear_conf_file_cache()
+            self.assertEqual(self.project.conf_file(), moved)
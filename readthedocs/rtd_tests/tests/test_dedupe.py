@@ -0,0 +1,43 @@
+import os
+import shutil
+from tempfile import mkdtemp
+
+from django.utils import unittest
+
+from doc_builder.dedupe import dedupe_tree, prune_store
+
+
+class DedupeTests(unittest.TestCase):
+
+    def setUp(self):
+        self.root = mkdtemp()
+        self.store = os.path.join(self.root, 'store')
+        for version in ['1.0', '2.0']:
+            static = os.path.join(self.root, version, '_static')
+            os.makedirs(static)
+            with open(os.path.join(static, 'jquery.js'), 'w') as f:
+                f.write('jquery' * 100)
+            with open(os.path.join(self.root, version, 'index.html'), 'w') as f:
+                f.write(version)
+
+    def tearDown(self):
+        shutil.rmtree(self.root)
+
+    def test_identical_files_are_linked(self):
+        self.assertEqual(dedupe_tree(os.path.join(self.root, '1.0'),
+                                     store=self.store), 0)
+        self.assertEqual(dedupe_tree(os.path.join(self.root, '2.0'),
+                                     store=self.store), 600)
+        old = os.stat(os.path.join(self.root, '1.0', '_static', 'jquery.js'))
+        new = os.stat(os.path.join(self.root, '2.0', '_static', 'jquery.js'))
+        self.assertEqual(old.st_ino, new.st_ino)
+        old = os.stat(os.path.join(self.root, '1.0', 'index.html'))
+        new = os.stat(os.path.join(self.root, '2.0', 'index.html'))
+        self.assertNotEqual(old.st_ino, new.st_ino)
+
+    def test_prune_store(self):
+        version_dir = os.path.join(self.root, '1.0')
+        dedupe_tree(version_dir, store=self.store)
+        self.assertEqual(prune_store(store=self.store), 0)
+        shutil.rmtree(version_dir)
+        self.assertEqual(prune_store(store=self.store), 603)
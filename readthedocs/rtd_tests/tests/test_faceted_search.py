@@ -0,0 +1,59 @@
+from django.utils import unittest
+
+from haystack.query import EmptySearchQuerySet
+
+from core import faceted_search
+
+
+class CacheKeyTests(unittest.TestCase):
+
+    def test_normalized(self):
+        params = {'facets': set(['project', 'author']),
+                  'narrow_queries': set(['project_exact:"Read The Docs"']),
+                  'start_offset': 0, 'end_offset': 10}
+        reordered = {'facets': set(['author', 'project']),
+                     'narrow_queries': set(['project_exact:"Read The Docs"']),
+                     'start_offset': 0, 'end_offset': 10}
+        self.assertEqual(faceted_search.cache_key(u'(docs  search)', params),
+                         faceted_search.cache_key(u' (docs search)',
+                                                  reordered))
+
+    def test_pages_differ(self):
+        first = {'start_offset': 0, 'end_offset': 10}
+        second = {'start_offset': 10, 'end_offset': 20}
+        self.assertNotEqual(faceted_search.cache_key(u'docs', first),
+                            faceted_search.cache_key(u'docs', second))
+
+
+class SearchResultsTests(unittest.TestCase):
+
+    def setUp(self):
+        self.requests = []
+        self.old_search_page = faceted_search.search_page
+
+        def search_page(searchqueryset, start, end, load_all=False):
+            self.requests.append((start, end))
+            hits = range(25)
+            return faceted_search.SearchPage(start, end, hits[start:end], 25,
+                                             {'fields': {'project': []}})
+        faceted_search.search_page = search_page
+
+    def tearDown(self):
+        faceted_search.search_page = self.old_search_page
+
+    def test_one_request_per_page(self):
+        results = faceted_search.SearchResults(None, start=20, page_size=10)
+        self.assertEqual(len(results), 25)
+        self.assertEqual(results.facets, {'fields': {'project': []}})
+        # The last page is cut short at the total.
+        self.assertEqual(results[20:25], [20, 21, 22, 23, 24])
+        self.assertEqual(self.requests, [(20, 30)])
+        self.assertEqual(results[0:10], range(10))
+        self.assertEqual(self.requests, [(20, 30), (0, 10)])
+
+    def test_empty_search(self):
+        faceted_search.search_page = self.old_search_page
+        results = faceted_search.SearchResults(EmptySearchQuerySet())
+        self.assertEqual(len(results), 0)
+        self.assertEqual(list(results), [])
+        self.assertEqual(results.facets, {})
@@ -0,0 +1,70 @@
+import os
+import shutil
+from tempfile import mkdtemp
+
+from django.test import TestCase
+
+from projects import file_index
+
+
+class FileIndexTests(TestCase):
+
+    def setUp(self):
+        self.root = mkdtemp()
+        self.tree = os.path.join(self.root, 'html')
+        for path in ['index.html', 'objects.inv', 'api/index.html',
+                     'api/module.html', '_static/style.css']:
+            full_path = os.path.join(self.tree, path)
+            if not os.path.exists(os.path.dirname(full_path)):
+                os.makedirs(os.path.dirname(full_path))
+            open(full_path, 'w').close()
+
+    def tearDown(self):
+        file_index._index_cache.clear()
+        shutil.rmtree(self.root)
+
+    def test_queries(self):
+        with self.settings(FILE_INDEX_ROOT=os.path.join(self.root, 'idx')):
+            index = file_index.build_index(self.tree)
+        self.assertEqual(index.match('*.html'),
+                         ['api/index.html', 'api/module.html', 'index.html'])
+        self.assertEqual(index.find('objects.inv'),
+                         [os.path.join(self.tree, 'objects.inv')])
+        self.assertEqual(
+            index.find('index.html', under=os.path.join(self.tree, 'api')),
+            [os.path.join(self.tree, 'api', 'index.html')])
+
+    def test_disk_cache_and_copy(self):
+        with self.settings(FILE_INDEX_ROOT=os.path.join(self.root, 'idx')):
+            file_index.build_index(self.tree)
+            file_index._index_cache.clear()
+            self.assertEqual(len(file_index.get_index(self.tree)), 5)
+            # Builders index the tree again after writing to it.
+            open(os.path.join(self.tree, 'api', 'new.html'), 'w').close()
+            file_index.build_index(self.tree)
+            file_index._index_cache.clear()
+            self.assertEqual(len(file_index.get_index(self.tree)), 6)
+
+            target = os.path.join(self.root, 'copy')
+            shutil.copytree(self.tree, target)
+            copied = file_index.copy_index(
+                file_index.get_index(self.tree), target)
+            self.assertEqual(copied.root, target)
+            self.assertEqual(file_index.get_index(target).files, copied.files)
+
+            # Replacing the tree wholesale invalidates it, even when it
+            # reuses the inode of the old one.
+            shutil.rmtree(target)
+            shutil.copytree(self.tree, target)
+            open(os.path.join(target, 'extra.html'), 'w').close()
+            self.assertEqual(len(file_index.get_index(target)), 7)
+
+            # The marker is kept out of the published tree.
+            self.assertEqual(sorted(os.listdir(target)),
+                             sorted(os.listdir(self.tree) + ['extra.html']))
+
+            # Trees without a marker are always walked.
+            os.remove(file_index._marker_file(target))
+            self.assertEqual(file_index.fingerprint(target), None)
+            open(os.path.join(target, 'other.html'), 'w').close()
+            self.assertEqual(len(file_index.get_index(target)), 8)
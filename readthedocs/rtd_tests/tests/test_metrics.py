@@ -0,0 +1,114 @@
+import os
+
+from django.http import Http404, HttpResponse
+from django.test import TestCase
+
+from core import metrics, redis_pool
+
+
+class FakePipeline(object):
+
+    def __init__(self, data):
+        self.data = data
+        self.commands = []
+
+    def hincrbyfloat(self, key, field, amount):
+        self.commands.append(('hincrbyfloat', field, amount))
+
+    def hgetall(self, key):
+        self.commands.append(('hgetall', key))
+
+    def llen(self, key):
+        self.commands.append(('llen', key))
+
+    def execute(self):
+        results = []
+        for command in self.commands:
+            if command[0] == 'hincrbyfloat':
+                field, amount = command[1:]
+                self.data[field] = self.data.get(field, 0) + amount
+                results.append(self.data[field])
+            elif command[0] == 'hgetall':
+                results.append(dict(self.data))
+            else:
+                results.append(3)
+        self.commands = []
+        return results
+
+
+class MetricsTests(TestCase):
+
+    def setUp(self):
+        self.data = {}
+        self.old_pipeline = redis_pool.pipeline
+        redis_pool.pipeline = lambda *args, **kwargs: FakePipeline(self.data)
+        metrics._pending.clear()
+        # Don't let a flusher thread empty _pending under the tests.
+        self.old_flusher = dict(metrics._flusher)
+        metrics._flusher['pid'] = os.getpid()
+
+    def tearDown(self):
+        redis_pool.pipeline = self.old_pipeline
+        metrics._pending.clear()
+        metrics._flusher.update(self.old_flusher)
+
+    def test_histogram(self):
+        with self.settings(METRICS_FLUSH_SECONDS=3600):
+            metrics.observe('rtd_serve_docs_seconds', 0.2, status=200)
+            metrics.observe('rtd_serve_docs_seconds', 3, status=200)
+        pending = metrics._pending
+        self.assertEqual(
+            pending['rtd_serve_docs_seconds_bucket{le="0.005",status="200"}'],
+            0)
+        self.assertEqual(
+            pending['rtd_serve_docs_seconds_bucket{le="0.25",status="200"}'],
+            1)
+        self.assertEqual(
+            pending['rtd_serve_docs_seconds_bucket{le="5.0",status="200"}'],
+            2)
+        self.assertEqual(
+            pending['rtd_serve_docs_seconds_bucket{le="+Inf",status="200"}'],
+            2)
+        self.assertEqual(pending['rtd_serve_docs_seconds_count{status="200"}'],
+                         2)
+
+    def test_flush_and_render(self):
+        with self.settings(METRICS_FLUSH_SECONDS=3600):
+            metrics.inc('rtd_builds_total', outcome='success')
+            metrics.inc('rtd_builds_total', outcome='success')
+            metrics.observe('rtd_lock_wait_seconds', 0.5)
+        metrics.flush()
+        self.assertEqual(metrics._pending, {})
+        self.assertEqual(self.data['rtd_builds_total{outcome="success"}'], 2)
+        lines = metrics.collect().splitlines()
+        self.assertTrue('# TYPE rtd_builds_total counter' in lines)
+        self.assertTrue('rtd_builds_total{outcome="success"} 2.0' in lines)
+        self.assertTrue('# TYPE rtd_lock_wait_seconds histogram' in lines)
+        self.assertTrue('rtd_queue_depth{queue="celery"} 3.0' in lines)
+        buckets = [line for line in lines
+                   if line.startswith('rtd_lock_wait_seconds_bucket')]
+        self.assertEqual(len(buckets), len(metrics.LATENCY_BUCKETS) + 1)
+        self.assertEqual(buckets[0],
+                         'rtd_lock_wait_seconds_bucket{le="0.005"} 0.0')
+        self.assertTrue('rtd_lock_wait_seconds_bucket{le="0.5"} 1.0' in lines)
+        self.assertEqual(buckets[-1],
+                         'rtd_lock_wait_seconds_bucket{le="+Inf"} 1.0')
+
+    def test_timed_view(self):
+        @metrics.timed_view('rtd_serve_docs_seconds')
+        def view(request, missing=False):
+            if missing:
+                raise Http404
+            return HttpResponse('')
+        with self.settings(METRICS_FLUSH_SECONDS=3600):
+            view(None)
+            self.assertRaises(Http404, view, None, missing=True)
+        self.assertEqual(
+            metrics._pending['rtd_serve_docs_seconds_count{status="200"}'], 1)
+        self.assertEqual(
+            metrics._pending['rtd_serve_docs_seconds_count{status="404"}'], 1)
+
+    def test_view(self):
+        resp = self.client.get('/metrics/')
+        self.assertEqual(resp.status_code, 200)
+        self.assertTrue(resp['Content-Type'].startswith('text/plain'))
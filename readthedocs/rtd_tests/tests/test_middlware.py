@@ -1,10 +1,64 @@
+import time
+
 from django.http import Http404
-from django.core.cache import cache
 from django.utils import unittest
 from django.test.client import RequestFactory
 from django.test.utils import override_settings
 
+from core import domains
+from core.domains import domain_map
 from core.middleware import SubdomainMiddleware
+from projects import tasks
+
+
+class FakeRedis(object):
+    """
+    The hash and string commands the domain map uses.
+    """
+
+    def __init__(self):
+        self.hashes = {}
+        self.strings = {}
+        self.expiring = set()
+
+    def hget(self, name, key):
+        return self.hashes.get(name, {}).get(key)
+
+    def hset(self, name, key, value):
+        self.hashes.setdefault(name, {})[key] = value
+
+    def hdel(self, name, key):
+        self.hashes.get(name, {}).pop(key, None)
+
+    def hkeys(self, name):
+        return self.hashes.get(name, {}).keys()
+
+    def hgetall(self, name):
+        return dict(self.hashes.get(name, {}))
+
+    def set(self, name, value):
+        self.strings[name] = value
+
+    def setnx(self, name, value):
+        if name in self.strings:
+            return False
+        self.strings[name] = value
+        return True
+
+    def expire(self, name, seconds):
+        self.expiring.add(name)
+
+    def delete(self, name):
+        self.strings.pop(name, None)
+
+    def sadd(self, name, value):
+        pass
+
+    def pipeline(self, *args, **kwargs):
+        return self
+
+    def execute(self):
+        return []
 
 
 class MiddlewareTests(unittest.TestCase):
@@ -28,7 +82,8 @@ class MiddlewareTests(unittest.TestCase):
         self.assertEqual(request.slug, 'pip')
 
     def test_proper_cname(self):
-        cache.get = lambda x: 'my_slug'
+        domain_map.table = {'my.valid.homename': 'my_slug'}
+        domain_map.loaded = time.time()
         request = self.factory.get(self.url, HTTP_HOST='my.valid.homename')
         self.middleware.process_request(request)
         self.assertEqual(request.urlconf, 'core.subdomain_urls')
@@ -50,6 +105,65 @@ class MiddlewareTests(unittest.TestCase):
         self.assertEqual(request.slug, 'pip')
         self.assertFalse(hasattr(request, 'subdomain'))
 
+    def test_failed_cname_is_cached(self):
+        domain_map.table = {'bad.host.com': ''}
+        domain_map.loaded = time.time()
+        request = self.factory.get(self.url, HTTP_HOST='bad.host.com')
+        with self.assertRaises(Http404):
+            self.middleware.process_request(request)
+
+    def test_unknown_cname_is_queued(self):
+        redis_conn = FakeRedis()
+        queued = []
+        old_get_redis = domains.get_redis
+        domains.get_redis = lambda: redis_conn
+        tasks.resolve_domain.delay = queued.append
+        try:
+            domain_map.table = {}
+            domain_map.loaded = time.time()
+            domain_map.misses.clear()
+            for i in range(2):
+                request = self.factory.get(self.url,
+                                           HTTP_HOST='docs.new.host')
+                with self.assertRaises(Http404):
+                    self.middleware.process_request(request)
+            # Another worker doesn't queue it again.
+            other_map = domains.DomainMap()
+            other_map.table = {}
+            other_map.loaded = time.time()
+            self.assertEqual(other_map.lookup('docs.new.host'), None)
+            self.assertEqual(queued, ['docs.new.host'])
+
+            # Once resolved, workers pick it up from Redis.
+            redis_conn.hset(domains.DOMAINS_KEY, 'docs.new.host', 'new_slug')
+            domain_map.misses.clear()
+            request = self.factory.get(self.url, HTTP_HOST='docs.new.host')
+            self.middleware.process_request(request)
+            self.assertEqual(request.slug, 'new_slug')
+        finally:
+            domains.get_redis = old_get_redis
+            del tasks.resolve_domain.delay
+
+    def test_failed_cnames_expire(self):
+        redis_conn = FakeRedis()
+        redis_conn.hset(domains.DOMAINS_KEY, 'old.host', 'pip')
+        redis_conn.hset(domains.CHECKED_KEY, 'old.host', 0)
+        redis_conn.hset(domains.DOMAINS_KEY, 'new.host', 'pip')
+        redis_conn.hset(domains.CHECKED_KEY, 'new.host', time.time())
+        old_resolve_cname = domains.resolve_cname
+        domains.resolve_cname = lambda host: None
+        try:
+            self.assertEqual(domains.refresh(redis_conn), 1)
+        finally:
+            domains.resolve_cname = old_resolve_cname
+        self.assertEqual(redis_conn.hgetall(domains.DOMAINS_KEY),
+                         {'new.host': 'pip'})
+        self.assertEqual(redis_conn.hgetall(domains.CHECKED_KEY).keys(),
+                         ['new.host'])
+        negative = domains.NEGATIVE_KEY % 'old.host'
+        self.assertTrue(negative in redis_conn.strings)
+        self.assertTrue(negative in redis_conn.expiring)
+
     @override_settings(DEBUG=True)
     def test_debug_on(self):
         request = self.factory.get(self.url, HTTP_HOST='doesnt.really.matter')
@@ -0,0 +1,42 @@
+from django.contrib.auth.models import User
+from django.test import TestCase
+
+from guardian.models import UserObjectPermission
+
+from core.permissions import (grant_object_permissions,
+                              sync_project_permissions)
+from projects.models import Project
+
+
+class TestObjectPermissions(TestCase):
+    fixtures = ['eric', 'test_data']
+
+    def setUp(self):
+        self.project = Project.objects.get(slug='read-the-docs')
+        self.user = User.objects.create_user('tester', 'tester@example.com',
+                                             'test')
+
+    def _granted(self, codename, obj):
+        return UserObjectPermission.objects.filter(
+            user=self.user, permission__codename=codename,
+            object_pk=str(obj.pk)).count()
+
+    def test_grant_skips_existing(self):
+        self.assertEqual(
+            grant_object_permissions('view_project', [self.user],
+                                     [self.project]), 1)
+        self.assertEqual(
+            grant_object_permissions('view_project', [self.user],
+                                     [self.project]), 0)
+        self.assertEqual(self._granted('view_project', self.project), 1)
+
+    def test_sync_project_permissions(self):
+        self.project.users.add(self.user)
+        versions = list(self.project.versions.all())
+        created = sync_project_permissions(self.project, [self.user])
+        self.assertEqual(created, len(versions) + 1)
+        self.assertEqual(self._granted('view_project', self.project), 1)
+        for version in versions:
+            self.assertEqual(self._granted('view_version', version), 1)
+        self.assertEqual(
+            sync_project_permissions(self.project, [self.user]), 0)
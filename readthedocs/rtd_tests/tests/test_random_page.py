@@ -0,0 +1,61 @@
+import random
+
+from django.core.cache import cache
+from django.test import TestCase
+
+from core import random_page
+from projects.models import ImportedFile, Project
+
+
+class RandomPageTests(TestCase):
+    fixtures = ['eric', 'test_data']
+
+    def setUp(self):
+        for slug in ['', 'read-the-docs', 'pip', 'missing']:
+            cache.delete(random_page.CACHE_KEY % slug)
+        for slug in ['read-the-docs', 'pip']:
+            project = Project.objects.get(slug=slug)
+            version = project.versions.get_or_create(
+                slug='latest', defaults={'identifier': 'latest',
+                                         'verbose_name': 'latest'})[0]
+            ImportedFile.objects.bulk_create([
+                ImportedFile(project=project, version=version,
+                             name='page%s.html' % num,
+                             path='page%s.html' % num)
+                for num in range(5)])
+
+    def test_random_file_of_project(self):
+        for _ in range(10):
+            imp_file = random_page.random_file('pip')
+            self.assertEqual(imp_file.project.slug, 'pip')
+        self.assertEqual(random_page.random_file('missing'), None)
+
+    def test_every_file_can_be_picked(self):
+        random.seed(0)
+        paths = set(random_page.random_file('pip').path for _ in range(100))
+        self.assertEqual(paths, set('page%s.html' % num for num in range(5)))
+
+    def test_deleted_files(self):
+        self.assertTrue(random_page.random_file('read-the-docs'))
+        # The cached pool still includes the deleted files.
+        ImportedFile.objects.filter(project__slug='read-the-docs').exclude(
+            path='page0.html').delete()
+        for _ in range(10):
+            self.assertEqual(random_page.random_file('read-the-docs').path,
+                             'page0.html')
+
+    def test_pool_size(self):
+        with self.settings(RANDOM_PAGE_POOL_SIZE=2):
+            paths = set(random_page.random_file('pip').path
+                        for _ in range(20))
+        self.assertEqual(len(paths), 2)
+        self.assertEqual(len(cache.get(random_page.CACHE_KEY % 'pip')), 2)
+
+    def test_view(self):
+        resp = self.client.get('/random/')
+        self.assertEqual(resp.status_code, 302)
+        resp = self.client.get('/random/pip')
+        self.assertEqual(resp.status_code, 302)
+        self.assertTrue('/pip/' in resp['Location'])
+        resp = self.client.get('/random/missing')
+        self.assertEqual(resp.status_code, 404)
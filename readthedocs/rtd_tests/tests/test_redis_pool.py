@@ -0,0 +1,34 @@
+from django.test import TestCase
+
+from core import redis_pool
+
+
+class RedisPoolTests(TestCase):
+
+    def tearDown(self):
+        redis_pool._pools.pop('test-pool', None)
+
+    def test_clients_share_pools(self):
+        first = redis_pool.get_redis()
+        second = redis_pool.get_redis()
+        self.assertTrue(first.connection_pool is second.connection_pool)
+        other = redis_pool.get_redis('test-pool')
+        self.assertFalse(other.connection_pool is first.connection_pool)
+        self.assertEqual(other.pool_name, 'test-pool')
+
+    def test_pool_settings(self):
+        with self.settings(REDIS={'host': 'localhost', 'port': 6379, 'db': 0},
+                           REDIS_POOLS={'test-pool': {'db': 2,
+                                                      'max_connections': 5}}):
+            pool = redis_pool.get_pool('test-pool')
+        self.assertEqual(pool.max_connections, 5)
+        self.assertEqual(pool.connection_kwargs['db'], 2)
+
+    def test_timings(self):
+        redis_pool._record('test-pool', 'GET', 0.01)
+        redis_pool._record('test-pool', 'GET', 0.03)
+        timing = redis_pool.stats()['test-pool']['commands']['GET']
+        self.assertEqual(timing['count'], 2)
+        self.assertAlmostEqual(timing['seconds'], 0.04)
+        self.assertAlmostEqual(timing['max_seconds'], 0.03)
+        redis_pool._timings.pop(('test-pool', 'GET'))
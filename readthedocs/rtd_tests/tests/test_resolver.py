@@ -0,0 +1,83 @@
+from django.test import TestCase
+
+from builds.models import Version, VersionAlias
+from core import resolver
+from projects.models import Project
+
+
+class ResolverTests(TestCase):
+    fixtures = ['eric', 'test_data']
+
+    def setUp(self):
+        resolver.local_cache.clear()
+
+    def tearDown(self):
+        resolver.local_cache.clear()
+
+    def test_resolve_is_cached(self):
+        target = resolver.resolve('read-the-docs', 'latest')
+        self.assertEqual(target.version_slug, 'latest')
+        self.assertTrue(target.is_public)
+        self.assertTrue(target.base_path('en').endswith(
+            'read-the-docs/rtd-builds/latest'))
+        with self.assertNumQueries(0):
+            self.assertEqual(resolver.resolve('read-the-docs', 'latest'),
+                             target)
+
+    def test_missing_version(self):
+        self.assertEqual(resolver.resolve('read-the-docs', 'nope'), None)
+
+    def test_save_invalidates(self):
+        resolver.resolve('read-the-docs', 'latest')
+        version = Version.objects.get(project__slug='read-the-docs',
+                                      slug='latest')
+        version.privacy_level = 'private'
+        version.save()
+        target = resolver.resolve('read-the-docs', 'latest')
+        self.assertFalse(target.is_public)
+
+    def test_lru_eviction(self):
+        cache = resolver.LRUCache(max_size=2, timeout=60)
+        cache.set('a', 1)
+        cache.set('b', 2)
+        cache.get('a')
+        cache.set('c', 3)
+        self.assertEqual(cache.get('b'), None)
+        self.assertEqual(cache.get('a'), 1)
+        self.assertEqual(cache.get('c'), 3)
+
+
+class RoutingTableTests(TestCase):
+    fixtures = ['eric', 'test_data']
+
+    def setUp(self):
+        resolver.local_cache.clear()
+        self.project = Project.objects.get(slug='read-the-docs')
+        # Fixtures are loaded without save(), fill in the sort keys.
+        for version in self.project.versions.all():
+            version.save()
+
+    def tearDown(self):
+        resolver.local_cache.clear()
+
+    def test_routes(self):
+        VersionAlias.objects.create(project=self.project, from_slug='0.2',
+                                    largest=True)
+        VersionAlias.objects.create(project=self.project, from_slug='stable',
+                                    to_slug='awesome')
+        routes = resolver.routes('read-the-docs')
+        self.assertEqual(routes.default_version, 'latest')
+        self.assertEqual(routes.aliases, {'0.2': '0.2.2',
+                                          'stable': 'awesome'})
+        with self.assertNumQueries(0):
+            resolver.routes('read-the-docs')
+
+    def test_alias_change_invalidates(self):
+        self.assertEqual(resolver.routes('read-the-docs').aliases, {})
+        VersionAlias.objects.create(project=self.project, from_slug='stable',
+                                    to_slug='awesome')
+        self.assertEqual(resolver.routes('read-the-docs').aliases,
+                         {'stable': 'awesome'})
+
+    def test_missing_project(self):
+        self.assertEqual(resolver.routes('no-such-project'), None)
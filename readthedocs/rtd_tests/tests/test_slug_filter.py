@@ -0,0 +1,110 @@
+from django.test import TestCase
+
+from builds.models import Version
+from core import redis_pool, slug_filter
+from projects.models import Project
+
+
+class BloomFilterTests(TestCase):
+
+    def test_membership(self):
+        bloom = slug_filter.BloomFilter.for_capacity(1000, 0.01)
+        for i in range(1000):
+            bloom.add(slug_filter.project_key('project-%s' % i))
+        for i in range(1000):
+            self.assertTrue(
+                slug_filter.project_key('project-%s' % i) in bloom)
+        false_positives = sum(
+            1 for i in range(1000)
+            if slug_filter.project_key('missing-%s' % i) in bloom)
+        self.assertTrue(false_positives < 50)
+
+    def test_round_trip(self):
+        bloom = slug_filter.BloomFilter.for_capacity(10)
+        bloom.add(slug_filter.version_key('pip', 'latest'))
+        loaded = slug_filter.BloomFilter.loads(bloom.dumps())
+        self.assertTrue(slug_filter.version_key('pip', 'latest') in loaded)
+        self.assertFalse(slug_filter.version_key('pip', 'nope') in loaded)
+
+
+class FakeRedis(object):
+    """
+    The sorted set commands the slug filter uses, with the argument order of
+    redis-py's ``Redis``.
+    """
+
+    def __init__(self):
+        self.sets = {}
+
+    def zadd(self, name, member, score):
+        self.sets.setdefault(name, {})[member] = score
+
+    def zscore(self, name, member):
+        return self.sets.get(name, {}).get(member)
+
+    def zremrangebyscore(self, name, low, high):
+        members = self.sets.get(name, {})
+        for member, score in members.items():
+            if score <= high:
+                del members[member]
+
+    def pipeline(self, *args, **kwargs):
+        return self
+
+    def execute(self):
+        return []
+
+
+class SlugFilterTests(TestCase):
+    fixtures = ['eric', 'test_data']
+
+    def setUp(self):
+        self.old_local = dict(slug_filter._local)
+        self.redis = FakeRedis()
+        self.old_get_redis = slug_filter.get_redis
+        self.old_pipeline = redis_pool.pipeline
+        slug_filter.get_redis = lambda: self.redis
+        redis_pool.pipeline = lambda *args, **kwargs: self.redis
+
+    def tearDown(self):
+        slug_filter._local.update(self.old_local)
+        slug_filter.get_redis = self.old_get_redis
+        redis_pool.pipeline = self.old_pipeline
+
+    def test_might_exist(self):
+        bloom = slug_filter.rebuild()
+        self.assertEqual(slug_filter.current(), bloom)
+        before = slug_filter.stats()
+        self.assertTrue(slug_filter.might_exist('read-the-docs'))
+        self.assertTrue(slug_filter.might_exist('read-the-docs', 'latest'))
+        self.assertFalse(
+            slug_filter.might_exist('read-the-docs', 'no-such-version'))
+        after = slug_filter.stats()
+        self.assertEqual(after['passed'] - before['passed'], 2)
+        self.assertEqual(after['rejected'] - before['rejected'], 1)
+
+    def test_new_versions_are_not_rejected(self):
+        slug_filter.rebuild()
+        project = Project.objects.get(slug='read-the-docs')
+        Version.objects.create(project=project, slug='brand-new',
+                               identifier='brand-new',
+                               verbose_name='brand-new')
+        # Processes holding the filter from before the save let it through.
+        self.assertFalse(slug_filter.version_key('read-the-docs', 'brand-new')
+                         in slug_filter.current())
+        self.assertTrue(slug_filter.might_exist('read-the-docs', 'brand-new'))
+        # A rebuild picks it up, but keeps it recorded for a while.
+        bloom = slug_filter.rebuild()
+        self.assertTrue(
+            slug_filter.version_key('read-the-docs', 'brand-new') in bloom)
+        self.assertNotEqual(self.redis.zscore(
+            slug_filter.RECENT_KEY,
+            slug_filter.version_key('read-the-docs', 'brand-new')), None)
+
+    def test_missing_subdomain_is_404(self):
+        slug_filter.rebuild()
+        before = slug_filter.stats()
+        r = self.client.get('/docs/no-such-project/en/latest/')
+        self.assertEqual(r.status_code, 404)
+        self.assertEqual(slug_filter.stats()['rejected'] - before['rejected'],
+                         1)
@@ -0,0 +1,97 @@
+# -*- coding: utf-8 -*-
+import gzip
+import json
+import os
+import shutil
+from tempfile import mkdtemp
+
+from django.test import TestCase
+
+from core import static_search
+from doc_builder import search_index
+from projects.models import Project
+
+PAGE = u"""<html><head><title>%(title)s</title></head><body>
+<div class="related">Navigation</div>
+<div class="document">
+<div class="section" id="%(anchor)s"><h1>%(title)s¶</h1><p>%(text)s</p></div>
+</div></body></html>"""
+
+
+class StaticSearchTests(TestCase):
+    fixtures = ['eric', 'test_data']
+
+    def setUp(self):
+        self.docroot = mkdtemp()
+        self.project = Project.objects.get(slug='read-the-docs')
+        self.html_path = os.path.join(self.docroot, self.project.slug,
+                                      'rtd-builds', 'latest')
+        os.makedirs(self.html_path)
+        self.write_page('install.html', 'install', u'Installation',
+                        u'Run the builder to build the docs.')
+        self.write_page('builds.html', 'builds', u'Builds',
+                        u'Install a builder and the docs get built.')
+
+    def tearDown(self):
+        shutil.rmtree(self.docroot)
+
+    def write_page(self, path, anchor, title, text):
+        with open(os.path.join(self.html_path, path), 'w') as fh:
+            fh.write((PAGE % {'anchor': anchor, 'title': title, 'text': text})
+                     .encode('utf-8'))
+
+    def test_write_index(self):
+        index_path = search_index.write_index(
+            self.html_path, ['builds.html', 'install.html'])
+        index = json.load(open(index_path))
+        self.assertEqual(json.load(gzip.open(index_path + '.gz')), index)
+        self.assertEqual([page[:2] for page in index['pages']],
+                         [[u'builds.html', u'Builds'],
+                          [u'install.html', u'Installation']])
+        self.assertEqual(index['sections'][1], [[u'install', u'Installation']])
+        self.assertEqual(index['terms']['builder'], [0, 1, 1, 1])
+        self.assertFalse('the' in index['terms'])
+
+    def test_search_ranks_titles_first(self):
+        search_index.write_index(self.html_path,
+                                 ['builds.html', 'install.html'])
+        with self.settings(DOCROOT=self.docroot):
+            results = static_search.facet_search(
+                u'builds', [u'project_exact:%s' % self.project.name])
+        self.assertEqual([result.title for result in results], [u'Builds'])
+        self.assertTrue(results[0].absolute_url.endswith(
+            '/latest/builds.html#builds'))
+        self.assertEqual(results.facets, {})
+
+    def test_all_terms_match(self):
+        index = search_index.build_index(self.html_path,
+                                         ['builds.html', 'install.html'])
+        self.assertEqual([page for page, score in
+                          static_search.search(index, u'builder docs')],
+                         [0, 1])
+        self.assertEqual(static_search.search(index, u'builder missing'), [])
+
+    def test_falls_back_to_solr(self):
+        facets = [u'project_exact:%s' % self.project.name]
+        with self.settings(DOCROOT=self.docroot):
+            # No index was written.
+            self.assertEqual(static_search.facet_search(u'builds', facets),
+                             None)
+            self.assertEqual(static_search.facet_search(
+                u'builds', facets + [u'version_exact:latest']), None)
+
+    def test_loaded_indexes_are_bounded(self):
+        old_loaded = static_search._loaded
+        static_search._loaded = static_search.LRUCache(1, 60)
+        try:
+            first = search_index.write_index(self.html_path, ['builds.html'])
+            other_path = os.path.join(self.docroot, 'other')
+            os.makedirs(other_path)
+            shutil.copy(os.path.join(self.html_path, 'install.html'),
+                        other_path)
+            second = search_index.write_index(other_path, ['install.html'])
+            self.assertNotEqual(static_search.load_index(first), None)
+            self.assertNotEqual(static_search.load_index(second), None)
+            self.assertEqual(static_search._loaded.get(first), None)
+        finally:
+            static_search._loaded = old_loaded
@@ -0,0 +1,40 @@
+from django.test import TestCase
+
+from builds.models import Version
+from projects.models import Project
+from projects.utils import highest_version, mkversion, version_sort_key
+
+
+class VersionSortKeyTests(TestCase):
+    fixtures = ['eric', 'test_data']
+
+    def test_key_orders_like_normalized_version(self):
+        slugs = ['0.9', '1.0', '1.0a1', '1.0b2', '1.0c1', '1.0.dev4',
+                 '1.0.post1', '1.0.1', '1.10', '1.2', '2.0', '10.0']
+        by_version = sorted(slugs, key=lambda s: mkversion({'slug': s}))
+        by_key = sorted(slugs, key=version_sort_key)
+        self.assertEqual(by_key, by_version)
+
+    def test_other_slugs_sort_first(self):
+        self.assertTrue(version_sort_key('latest') > version_sort_key('99.0'))
+
+    def test_unparsable_slugs_sort_like_other_slugs(self):
+        # Not a NormalizedVersion, so it sorts with the named branches.
+        self.assertEqual(mkversion({'slug': '2013.01'}), None)
+        self.assertEqual(version_sort_key('2013.01'),
+                         version_sort_key('latest'))
+        self.assertTrue(version_sort_key('2013.01') > version_sort_key('10.0'))
+
+    def test_database_ordering(self):
+        project = Project.objects.get(slug='read-the-docs')
+        # Fixtures are loaded without save(), fill in their sort keys.
+        for version in project.versions.all():
+            version.save()
+        for slug in ['0.10', '0.9']:
+            Version.objects.create(project=project, slug=slug,
+                                   identifier=slug, verbose_name=slug,
+                                   active=True)
+        slugs = [v.slug for v in project.ordered_active_versions()]
+        self.assertEqual(slugs[-4:], ['0.10', '0.9', '0.2.2', '0.2.1'])
+        highest = highest_version(project.versions.filter(active=True))
+        self.assertEqual(highest[0].slug, '0.10')
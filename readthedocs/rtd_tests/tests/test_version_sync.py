@@ -0,0 +1,160 @@
+import base64
+import json
+import os
+import shutil
+from tempfile import mkdtemp
+
+from django.core.cache import cache
+from django.test import TestCase
+
+from guardian.models import UserObjectPermission
+import slumber
+
+from builds.models import Version
+from builds.version_sync import sync_versions, unique_slug
+from projects import tasks
+from projects.models import Project
+
+super_auth = base64.b64encode('super:test')
+
+
+class TestVersionSync(TestCase):
+    fixtures = ['eric', 'test_data']
+
+    def setUp(self):
+        self.project = Project.objects.get(slug='read-the-docs')
+
+    def test_unique_slug(self):
+        taken = set(['foo', 'foo-0'])
+        self.assertEqual(unique_slug('Foo', taken), 'Foo-1')
+        self.assertEqual(unique_slug('Foo', taken), 'Foo-2')
+        self.assertEqual(unique_slug('bar', taken), 'bar')
+        self.assertEqual(unique_slug('BAR', taken), 'BAR-0')
+        self.assertTrue('bar' in taken)
+        self.assertTrue('foo-2' in taken)
+
+    def test_sync_creates_and_deletes(self):
+        Version.objects.create(project=self.project, slug='gone',
+                               identifier='gone', verbose_name='gone',
+                               active=False)
+        existing = list(self.project.versions.values_list('identifier',
+                                                          flat=True))
+        tags = [{'identifier': ident, 'verbose_name': ident}
+                for ident in existing if ident != 'gone']
+        tags.append({'identifier': '1234abcd', 'verbose_name': '1.0'})
+        branches = [{'identifier': 'origin/feature',
+                     'verbose_name': 'feature'},
+                    {'identifier': 'origin/Feature',
+                     'verbose_name': 'Feature'}]
+        deleted = sync_versions(self.project, tags, branches)
+        self.assertEqual(deleted, ['gone'])
+        self.assertFalse(self.project.versions.filter(slug='gone').exists())
+        self.assertEqual(
+            self.project.versions.get(identifier='1234abcd').slug, '1.0')
+        self.assertEqual(
+            self.project.versions.get(identifier='origin/Feature').slug,
+            'Feature-0')
+
+        version = self.project.versions.get(identifier='origin/feature')
+        perms = UserObjectPermission.objects.filter(
+            permission__codename='view_version', object_pk=str(version.pk))
+        self.assertEqual(
+            sorted(perms.values_list('user', flat=True)),
+            sorted(self.project.users.values_list('pk', flat=True)))
+
+    def test_sync_is_idempotent(self):
+        tags = [{'identifier': '1234abcd', 'verbose_name': '1.0'}]
+        sync_versions(self.project, tags, [])
+        count = self.project.versions.count()
+        sync_versions(self.project, tags, [])
+        self.assertEqual(self.project.versions.count(), count)
+
+
+class SyncAPI(object):
+    """
+    Stands in for the slumber API of the build servers, posting to the test
+    client instead.
+    """
+
+    def __init__(self, client, project):
+        self.client = client
+        self.project = project
+        self.posts = []
+
+    def post(self, data):
+        self.posts.append(json.loads(data))
+        resp = self.client.post(
+            '/api/v1/project/%s/sync_versions/' % self.project.pk,
+            data=json.dumps(data), content_type='application/json',
+            HTTP_AUTHORIZATION='Basic %s' % super_auth)
+        if resp.status_code == 409:
+            raise slumber.exceptions.HttpClientError('Client Error 409')
+        if resp.status_code >= 500:
+            raise slumber.exceptions.HttpServerError('Server Error 500')
+        return json.loads(resp.content)
+
+
+class TestSyncVersionsTask(TestCase):
+    fixtures = ['eric', 'test_data']
+
+    def setUp(self):
+        self.docroot = mkdtemp()
+        self.project = Project.objects.get(slug='read-the-docs')
+        self.sync_api = SyncAPI(self.client, self.project)
+        self.old_api = tasks.api
+        tasks.api = self
+        cache.clear()
+
+    def tearDown(self):
+        tasks.api = self.old_api
+        shutil.rmtree(self.docroot)
+
+    def project(self, pk):
+        # tasks.api.project(pk).sync_versions.post(...)
+        return self
+
+    @property
+    def sync_versions(self):
+        return self.sync_api
+
+    def version_data(self, *tags):
+        return {
+            'repo': self.project.repo,
+            'tags': [{'identifier': tag, 'verbose_name': tag}
+                     for tag in tags],
+            'branches': [],
+        }
+
+    def sync(self, data):
+        with self.settings(DOCROOT=self.docroot):
+            if not os.path.exists(self.project.doc_path):
+                os.makedirs(self.project.doc_path)
+            tasks.sync_versions(self.project, data)
+
+    def test_unchanged_versions_send_the_hash(self):
+        self.sync(self.version_data('1.0'))
+        self.sync(self.version_data('1.0'))
+        self.assertEqual(len(self.sync_api.posts), 2)
+        first, second = self.sync_api.posts
+        self.assertEqual(second, {'repo': self.project.repo,
+                                  'hash': first['hash']})
+        self.assertTrue(self.project.versions.filter(slug='1.0').exists())
+
+    def test_changed_versions_are_sent(self):
+        self.sync(self.version_data('1.0'))
+        self.sync(self.version_data('1.0', '1.1'))
+        self.assertEqual([sorted(post.keys()) for post in self.sync_api.posts],
+                         [['branches', 'hash', 'repo', 'tags']] * 2)
+        self.assertTrue(self.project.versions.filter(slug='1.1').exists())
+
+    def test_unknown_hash_sends_everything(self):
+        self.sync(self.version_data('1.0'))
+        # The API forgot the hash, it answers the hash alone with a 409.
+        cache.clear()
+        self.project.versions.filter(slug='1.0').delete()
+        self.sync(self.version_data('1.0'))
+        self.assertEqual([sorted(post.keys()) for post in self.sync_api.posts],
+                         [['branches', 'hash', 'repo', 'tags'],
+                          ['hash', 'repo'],
+                          ['branches', 'hash', 'repo', 'tags']])
+        self.assertTrue(self.project.versions.filter(slug='1.0').exists())
@@ -0,0 +1,46 @@
+import os
+import shutil
+import time
+from tempfile import mkdtemp
+
+from django.utils import unittest
+
+from projects import workspace_gc
+
+
+class WorkspaceGCTests(unittest.TestCase):
+
+    def setUp(self):
+        self.root = mkdtemp()
+        self.project = workspace_gc.DiskProject(
+            'pip', os.path.join(self.root, 'pip'))
+        for version, age in [('old', 3000), ('new', 2000)]:
+            for kind in ['checkouts', 'envs']:
+                path = os.path.join(self.project.doc_path, kind, version)
+                os.makedirs(path)
+                with open(os.path.join(path, 'file'), 'w') as f:
+                    f.write('x' * 100)
+            workspace_gc.record_build(self.project, version)
+            build_stamp = os.path.join(self.project.doc_path, 'usage',
+                                       '%s.build' % version)
+            used = time.time() - age
+            os.utime(build_stamp, (used, used))
+
+    def tearDown(self):
+        shutil.rmtree(self.root)
+
+    def test_lru_eviction(self):
+        freed = workspace_gc.collect(budget=300, root=self.root, min_idle=0)
+        self.assertEqual(freed, 200)
+        checkouts = os.path.join(self.project.doc_path, 'checkouts')
+        self.assertEqual(os.listdir(checkouts), ['new'])
+
+    def test_locked_project_is_skipped(self):
+        open(os.path.join(self.project.doc_path, 'rtdlock'), 'w').close()
+        freed = workspace_gc.collect(budget=0, root=self.root, min_idle=0)
+        self.assertEqual(freed, 0)
+
+    def test_recently_used_is_kept(self):
+        freed = workspace_gc.collect(budget=0, root=self.root,
+                                     min_idle=2500)
+        self.assertEqual(freed, 200)
@@ -161,6 +161,12 @@ CELERY_ROUTES = {
     'projects.tasks.fileify': {
         'queue': 'celery_haystack',
     },
+    'projects.tasks.update_search_index': {
+        'queue': 'celery_haystack',
+    },
+    'projects.tasks.remove_search_documents': {
+        'queue': 'celery_haystack',
+    },
 }
 
 
@@ -198,6 +204,18 @@ ANONYMOUS_USER_ID = -1
 # RTD Settings
 REPO_LOCK_SECONDS = 30
 ALLOW_PRIVATE_REPOS = False
+# Hardlink identical build artifacts across versions and projects
+DEDUPE_BUILDS = True
+# Disk budget in bytes for checkouts and virtualenvs on build servers, the
+# least recently used ones are evicted past it. None disables collection.
+WORKSPACE_DISK_BUDGET = None
+WORKSPACE_MIN_IDLE_SECONDS = 60 * 60
+# Fetch git repos once into a per-project bare mirror and make version
+# checkouts borrow its objects, instead of a full clone per version.
+GIT_SHARED_MIRROR = True
+# Set to a number of commits to only fetch the tip of the ref being built.
+# Bypasses the shared mirror. None does full fetches.
+GIT_SHALLOW_DEPTH = None
 
 LOG_FORMAT = "[%(asctime)s] %(levelname)s [%(name)s:%(lineno)s] %(message)s"
 
@@ -1,24 +1,47 @@
 import slumber
 import logging
+import requests
 
 from django.conf import settings
 
+from core import metrics
+
 log = logging.getLogger(__name__)
 
+
+def record_latency(response, *args, **kwargs):
+    metrics.observe('rtd_api_client_seconds',
+                    response.elapsed.total_seconds(),
+                    method=response.request.method,
+                    status=response.status_code)
+
+
+def session(auth=None):
+    """
+    A requests session that records how long API requests take.
+    """
+    api_session = requests.session()
+    api_session.auth = auth
+    api_session.hooks['response'].append(record_latency)
+    return api_session
+
 USER = getattr(settings, 'SLUMBER_USERNAME', None)
 PASS = getattr(settings, 'SLUMBER_PASSWORD', None)
 API_HOST = getattr(settings, 'SLUMBER_API_HOST', 'https://readthedocs.org')
 
 if USER and PASS:
     log.debug("Using slumber with user %s, pointed at %s" % (USER, API_HOST))
-    api = slumber.API(base_url='%s/api/v1/' % API_HOST, auth=(USER, PASS))
+    api = slumber.API(base_url='%s/api/v1/' % API_HOST,
+                      session=session((USER, PASS)))
 else:
     log.warning("SLUMBER_USERNAME/PASSWORD settings are not set")
-    api = slumber.API(base_url='%s/api/v1/' % API_HOST)
+    api = slumber.API(base_url='%s/api/v1/' % API_HOST, session=session())
 
 if USER and PASS:
     log.debug("Using slumber v2 with user %s, pointed at %s" % (USER, API_HOST))
-    apiv2 = slumber.API(base_url='%s/api/v2/' % API_HOST, auth=(USER, PASS))
+    apiv2 = slumber.API(base_url='%s/api/v2/' % API_HOST,
+                        session=session((USER, PASS)))
 else:
     log.warning("SLUMBER_USERNAME/PASSWORD settings are not set")
-    apiv2 = slumber.API(base_url='%s/api/v2/' % API_HOST)
+    apiv2 = slumber.API(base_url='%s/api/v2/' % API_HOST,
+                        session=session())
@@ -7,7 +7,7 @@ from tastypie.api import Api
 from rest_framework import routers
 
 from api.base import (ProjectResource, UserResource, BuildResource,
-                      VersionResource, FileResource)
+                      VersionResource, FileResource, ArtifactResource)
 from builds.filters import VersionFilter
 from core.forms import UserProfileForm
 from core.views import SearchView
@@ -23,6 +23,7 @@ v1_api.register(UserResource())
 v1_api.register(ProjectResource())
 v1_api.register(VersionResource())
 v1_api.register(FileResource())
+v1_api.register(ArtifactResource())
 
 # API v2
 router = routers.DefaultRouter()
@@ -82,6 +83,7 @@ urlpatterns = patterns(
         name='random_page'),
     url(r'^random/$', 'core.views.random_page', name='random_page'),
     url(r'^depth/$', 'core.views.queue_depth', name='queue_depth'),
+    url(r'^metrics/$', 'core.views.metrics_view', name='metrics'),
     url(r'^live/$', 'core.views.live_builds', name='live_builds'),
     url(r'^500/$', 'core.views.divide_by_zero', name='divide_by_zero'),
     url(r'^filter/version/$',
@@ -1,16 +1,21 @@
 import logging
-import csv
+import hashlib
+import json
 import os
+import re
 from os.path import exists, join as pjoin
-from StringIO import StringIO
 from shutil import rmtree
 
+from django.conf import settings
+
 from projects.exceptions import ProjectImportError
 from vcs_support.backends.github import GithubContributionBackend
 from vcs_support.base import BaseVCS, VCSVersion
 
 log = logging.getLogger(__name__)
 
+SHA_RE = re.compile(r'^[0-9a-f]{7,40}$')
+
 
 class Backend(BaseVCS):
     supports_tags = True
@@ -18,6 +23,66 @@ class Backend(BaseVCS):
     contribution_backends = [GithubContributionBackend]
     fallback_branch = 'master'  # default branch
 
+    @property
+    def use_mirror(self):
+        return getattr(settings, 'GIT_SHARED_MIRROR', False)
+
+    @property
+    def mirror_dir(self):
+        """
+        The bare repository shared by all versions of the project.
+
+        Our working_dir is always ``<doc_path>/checkouts/<version>``.
+        """
+        doc_path = os.path.dirname(os.path.dirname(self.working_dir))
+        return os.path.join(doc_path, 'mirror.git')
+
+    def run_mirror(self, *args):
+        # --git-dir wins over the GIT_DIR of our working_dir in self.env
+        return self.run('git', '--git-dir=%s' % self.mirror_dir, *args)
+
+    def update_mirror(self):
+        """
+        Fetch the upstream repository into the shared bare mirror, cloning it
+        first if needed.
+
+        The mirror is never removed or garbage collected, because version
+        checkouts borrow its objects through alternates. When the repo URL
+        changes it's pointed at the new one in place, and refs that only
+        existed upstream at the old URL are pruned, but their objects stay
+        for the checkouts still using them. Callers hold the project's repo
+        lock.
+        """
+        fetch_args = ['fetch', '--quiet']
+        if exists(self.mirror_dir):
+            code, out, err = self.run_mirror('config', '--get',
+                                             'remote.origin.url')
+            if out.strip() != self.repo_url:
+                log.info("Repo URL of %s changed, updating its mirror"
+                         % self.name)
+                self.run_mirror('config', 'remote.origin.url', self.repo_url)
+                fetch_args.append('--prune')
+        else:
+            code, out, err = self.run('git', 'clone', '--bare', '--quiet',
+                                      self.repo_url, self.mirror_dir)
+            if code != 0:
+                raise ProjectImportError(
+                    "Failed to get code from '%s' (git clone): %s" % (
+                        self.repo_url, code)
+                )
+            self.run_mirror('config', 'gc.auto', '0')
+            self.run_mirror('config', 'remote.origin.fetch',
+                            '+refs/heads/*:refs/heads/*')
+            self.run_mirror('config', '--add', 'remote.origin.fetch',
+                            '+refs/tags/*:refs/tags/*')
+            return
+        code, out, err = self.run_mirror(*(fetch_args + ['origin']))
+        if code != 0:
+            raise ProjectImportError(
+                "Failed to get code from '%s' (git fetch): %s" % (
+                    self.repo_url, code)
+            )
+
     def check_working_dir(self):
         if exists(self.working_dir):
             code, out, err = self.run('git', 'config', '-f',
@@ -39,6 +104,8 @@ class Backend(BaseVCS):
         return self.reset()
 
     def pull(self):
+        if self.use_mirror:
+            self.update_mirror()
         code, out, err = self.run('git', 'fetch')
         code, out, err = self.run('git',  'fetch', '-t')
         if code != 0:
@@ -59,6 +126,8 @@ class Backend(BaseVCS):
         return [code, out, err]
 
     def clone(self):
+        if self.use_mirror:
+            return self.clone_from_mirror()
         code, out, err = self.run('git', 'clone', '--recursive', '--quiet',
                                   self.repo_url, '.')
         if code != 0:
@@ -67,67 +136,234 @@ class Backend(BaseVCS):
                     self.repo_url, code)
             )
 
+    def clone_from_mirror(self):
+        """
+        Create a lightweight checkout that borrows the mirror's objects.
+
+        origin keeps pointing at the real repo URL, so relative submodule URLs
+        and check_working_dir keep working, but fetches are rewritten to go to
+        the local mirror.
+        """
+        self.update_mirror()
+        code, out, err = self.run('git', 'clone', '--shared', '--quiet',
+                                  self.mirror_dir, '.')
+        if code != 0:
+            raise ProjectImportError(
+                "Failed to get code from '%s' (git clone): %s" % (
+                    self.repo_url, code)
+            )
+        self.run('git', 'remote', 'set-url', 'origin', self.repo_url)
+        self.run('git', 'config', 'url.%s.insteadOf' % self.mirror_dir,
+                 self.repo_url)
+
     @property
-    def tags(self):
-        retcode, stdout, err = self.run('git', 'show-ref', '--tags')
-        # error (or no tags found)
-        if retcode != 0:
-            return []
-        return self.parse_tags(stdout)
+    def shallow_depth(self):
+        return getattr(settings, 'GIT_SHALLOW_DEPTH', None)
+
+    def init_shallow(self):
+        """
+        Make sure working_dir is a repository with origin pointing upstream.
 
-    def parse_tags(self, data):
+        Nothing is fetched here, shallow checkouts fetch exactly the ref they
+        need.
         """
-        Parses output of show-ref --tags, eg:
+        code, out, err = self.run('git', 'status')
+        if code != 0:
+            self.run('git', 'init', '--quiet')
+            self.run('git', 'remote', 'add', 'origin', self.repo_url)
+        # Don't read from a stale shared mirror, see update_mirror.
+        self.run('git', 'config', '--remove-section',
+                 'url.%s' % self.mirror_dir)
 
-            3b32886c8d3cb815df3793b3937b2e91d0fb00f1 refs/tags/2.0.0
-            bd533a768ff661991a689d3758fcfe72f455435d refs/tags/2.0.1
-            c0288a17899b2c6818f74e3a90b77e2a1779f96a refs/tags/2.0.2
-            a63a2de628a3ce89034b7d1a5ca5e8159534eef0 refs/tags/2.1.0.beta2
-            c7fc3d16ed9dc0b19f0d27583ca661a64562d21e refs/tags/2.1.0.rc1
-            edc0a2d02a0cc8eae8b67a3a275f65cd126c05b1 refs/tags/2.1.0.rc2
+    def remote_refs(self):
+        """
+        Return ``(hash, ref name)`` pairs for every ref upstream, without
+        fetching any objects.
+        """
+        if not hasattr(self, '_remote_refs'):
+            code, out, err = self.run('git', 'ls-remote', self.repo_url)
+            if code != 0:
+                raise ProjectImportError(
+                    "Failed to get code from '%s' (git ls-remote): %s" % (
+                        self.repo_url, code)
+                )
+            self._remote_refs = self.parse_refs(out)
+        return self._remote_refs
 
-        Into VCSTag objects with the tag name as verbose_name and the commit
-        hash as identifier.
+    def parse_refs(self, data):
         """
-        # parse the lines into a list of tuples (commit-hash, tag ref name)
-        raw_tags = csv.reader(StringIO(data), delimiter=' ')
-        vcs_tags = []
-        for row in raw_tags:
-            row = filter(lambda f: f != '', row)
-            if row == []:
+        Parses output of ls-remote or for-each-ref, eg:
+
+            3b32886c8d3cb815df3793b3937b2e91d0fb00f1\tHEAD
+            3b32886c8d3cb815df3793b3937b2e91d0fb00f1\trefs/heads/master
+            bd533a768ff661991a689d3758fcfe72f455435d\trefs/tags/2.0.1
+            c0288a17899b2c6818f74e3a90b77e2a1779f96a\trefs/tags/2.0.1^{}
+
+        Peeled tag entries are dropped, so tags are identified by the same
+        hash ``git show-ref --tags`` would give.
+        """
+        refs = []
+        for line in data.splitlines():
+            row = line.split()
+            if len(row) != 2 or row[1].endswith('^{}'):
                 continue
-            commit_hash, name = row
-            clean_name = name.split('/')[-1]
-            vcs_tags.append(VCSVersion(self, commit_hash, clean_name))
-        return vcs_tags
+            refs.append((row[0], row[1]))
+        return refs
 
-    @property
-    def branches(self):
-        retcode, stdout, err = self.run('git', 'branch', '-a')
-        # error (or no tags found)
+    def resolve_remote_ref(self, identifier):
+        """
+        Find the upstream ref to fetch for a version identifier.
+
+        Identifiers are branch names, ``remotes/origin/<branch>`` or the tag
+        hashes from ``tags``. Returns None when nothing matches.
+        """
+        if identifier.startswith('remotes/origin/'):
+            return 'refs/heads/%s' % identifier[15:]
+        candidates = ['refs/heads/%s' % identifier, 'refs/tags/%s' % identifier]
+        for commit_hash, ref in self.remote_refs():
+            if ref in candidates:
+                return ref
+        for commit_hash, ref in self.remote_refs():
+            if commit_hash == identifier and ref.startswith('refs/tags/'):
+                return ref
+        if SHA_RE.match(identifier):
+            # Some servers allow fetching reachable commits directly.
+            return identifier
+        return None
+
+    def deep_fetch(self):
+        args = ['git', 'fetch', '--quiet']
+        if exists(pjoin(self.working_dir, '.git', 'shallow')):
+            args.append('--unshallow')
+        args += ['origin', '+refs/heads/*:refs/remotes/origin/*',
+                 '+refs/tags/*:refs/tags/*']
+        code, out, err = self.run(*args)
+        if code != 0:
+            raise ProjectImportError(
+                "Failed to get code from '%s' (git fetch): %s" % (
+                    self.repo_url, code)
+            )
+
+    def shallow_checkout(self, identifier):
+        """
+        Fetch only the tip of the ref being built, ``GIT_SHALLOW_DEPTH``
+        commits deep, and check it out.
+
+        Falls back to fetching the full history when the identifier can't be
+        fetched on its own, eg. a commit the server won't serve directly.
+        """
+        self.init_shallow()
+        target = None
+        ref = self.resolve_remote_ref(identifier)
+        if ref:
+            code, out, err = self.run('git', 'fetch', '--quiet', '--depth',
+                                      str(self.shallow_depth), 'origin', ref)
+            if code == 0:
+                target = 'FETCH_HEAD'
+        if target is None:
+            log.info("Shallow fetch of '%s' failed, fetching full history"
+                     % identifier)
+            self.deep_fetch()
+            target = identifier
+            if not identifier.startswith('remotes/') and not SHA_RE.match(
+                    identifier):
+                target = 'origin/%s' % identifier
+        result = self.run('git', 'reset', '--hard', target, '--')
+        self.run('git', 'submodule', 'sync')
+        self.run('git', 'submodule', 'update', '--init', '--recursive')
+        return result
+
+    def refs_fingerprint(self):
+        """
+        A hash of the state of HEAD, packed-refs and the loose refs.
+
+        Anything that adds, moves or removes a ref changes it, without having
+        to spawn git.
+        """
+        git_dir = pjoin(self.working_dir, '.git')
+        sha = hashlib.sha1()
+        for name in ['HEAD', 'packed-refs']:
+            try:
+                stat = os.stat(pjoin(git_dir, name))
+                sha.update('%s:%s:%s\n' % (name, stat.st_mtime, stat.st_size))
+            except OSError:
+                sha.update('%s:-\n' % name)
+        for root, dirnames, filenames in os.walk(pjoin(git_dir, 'refs')):
+            for filename in sorted(filenames):
+                path = pjoin(root, filename)
+                try:
+                    stat = os.stat(path)
+                    sha.update('%s:%s:%s\n' % (path, stat.st_mtime,
+                                               stat.st_size))
+                except OSError:
+                    pass
+        return sha.hexdigest()
+
+    def local_refs(self):
+        """
+        Return ``(hash, ref name)`` pairs for all local tags and branches.
+
+        This is a single ``git for-each-ref`` call, cached on disk until the
+        refs change.
+        """
+        if hasattr(self, '_local_refs'):
+            return self._local_refs
+        cache_file = pjoin(self.working_dir, '.git', 'rtd-refs.json')
+        fingerprint = self.refs_fingerprint()
+        try:
+            with open(cache_file) as fh:
+                cached = json.load(fh)
+            if cached['fingerprint'] == fingerprint:
+                self._local_refs = [tuple(ref) for ref in cached['refs']]
+                return self._local_refs
+        except (IOError, ValueError, KeyError):
+            pass
+        retcode, stdout, err = self.run(
+            'git', 'for-each-ref', '--format=%(objectname) %(refname)',
+            'refs/tags', 'refs/heads', 'refs/remotes')
+        # error (or no refs found)
         if retcode != 0:
             return []
-        return self.parse_branches(stdout)
-
-    def parse_branches(self, data):
-        """
-        Parse output of git branch -a, eg:
-              develop
-              master
-            * release/2.0.0
-              rtd-jonas
-              remotes/origin/2.0.X
-              remotes/origin/HEAD -> origin/master
-              remotes/origin/develop
-              remotes/origin/master
-              remotes/origin/release/2.0.0
-              remotes/origin/release/2.1.0
+        self._local_refs = self.parse_refs(stdout)
+        try:
+            with open(cache_file, 'w') as fh:
+                json.dump({'fingerprint': fingerprint,
+                           'refs': self._local_refs}, fh)
+        except IOError:
+            log.warning("Unable to cache refs for %s" % self.working_dir)
+        return self._local_refs
+
+    @property
+    def tags(self):
+        if self.shallow_depth:
+            refs = self.remote_refs()
+        else:
+            refs = self.local_refs()
+        return [VCSVersion(self, commit_hash, ref.split('/')[-1])
+                for commit_hash, ref in refs if ref.startswith('refs/tags/')]
+
+    @property
+    def branches(self):
+        if self.shallow_depth:
+            return self.remote_branches()
+        return self.parse_branch_refs(self.local_refs())
+
+    def parse_branch_refs(self, refs):
+        """
+        Turn ``(hash, ref name)`` pairs into branch VCSVersions.
+
+        Local branches are identified by their name and origin's by
+        ``remotes/origin/<branch>``, with slashes in the slugs made dashes.
+        Origin's HEAD and fallback branch are left out.
         """
         clean_branches = []
-        raw_branches = csv.reader(StringIO(data), delimiter=' ')
-        for branch in raw_branches:
-            branch = filter(lambda f: f != '' and f != '*', branch)
-            branch = branch[0]
+        for commit_hash, ref in refs:
+            if ref.startswith('refs/heads/'):
+                branch = ref[11:]
+            elif ref.startswith('refs/remotes/'):
+                branch = ref[5:]
+            else:
+                continue
             if branch.startswith('remotes/origin/'):
                 slug = branch[15:].replace('/', '-')
                 if slug in ['HEAD', self.fallback_branch]:
@@ -138,14 +374,36 @@ class Backend(BaseVCS):
                 clean_branches.append(VCSVersion(self, branch, slug))
         return clean_branches
 
+    def remote_branches(self):
+        """
+        Branches as ``parse_branch_refs`` would list them for a full clone:
+        the default branch by its local name, everything else as
+        remotes/origin.
+        """
+        default = self.default_branch or self.fallback_branch
+        clean_branches = []
+        for commit_hash, ref in self.remote_refs():
+            if not ref.startswith('refs/heads/'):
+                continue
+            name = ref[11:]
+            if name == default:
+                clean_branches.append(VCSVersion(self, name,
+                                                 name.replace('/', '-')))
+            elif name != self.fallback_branch:
+                clean_branches.append(VCSVersion(
+                    self, 'remotes/origin/%s' % name, name.replace('/', '-')))
+        return clean_branches
+
     def checkout(self, identifier=None):
         super(Backend, self).checkout()
-        #Run update so that we can pull new versions.
-        self.update()
         if not identifier:
             identifier = self.fallback_branch
             if self.default_branch:
                 identifier = self.default_branch
+        if self.shallow_depth:
+            return self.shallow_checkout(identifier)
+        #Run update so that we can pull new versions.
+        self.update()
         #Checkout the correct identifier for this branch.
         return self.run('git', 'reset', '--hard', identifier, '--')
 
@@ -2,8 +2,38 @@ import logging
 import os
 import time
 
+from core import metrics
+
 log = logging.getLogger(__name__)
 
+# Files each VCS rewrites when the working copy moves to another revision.
+CHECKOUT_STATE_FILES = (
+    os.path.join('.git', 'HEAD'),
+    os.path.join('.git', 'index'),
+    os.path.join('.hg', 'dirstate'),
+    os.path.join('.bzr', 'checkout', 'dirstate'),
+    os.path.join('.svn', 'wc.db'),
+    os.path.join('.svn', 'entries'),
+)
+
+
+def checkout_revision(path):
+    """
+    A cheap fingerprint of the revision checked out at ``path``, built from
+    the modification times of the VCS state files.
+
+    Returns None if ``path`` isn't a checkout we know how to fingerprint.
+    """
+    stamps = []
+    for name in CHECKOUT_STATE_FILES:
+        try:
+            stamps.append((name, os.path.getmtime(os.path.join(path, name))))
+        except OSError:
+            pass
+    if not stamps:
+        return None
+    return tuple(stamps)
+
 
 class Lock(object):
     """
@@ -35,7 +65,42 @@ class Lock(object):
             log.info(("%s still locked after %.2f seconds; retry for %.2f"
                       " seconds") % (self.name, timesince, self.timeout))
         open(self.fpath, 'w').close()
+        metrics.observe('rtd_lock_wait_seconds', time.time() - start)
+        log.info("Lock (%s): Lock aquired" % self.name)
+
+    def __exit__(self, exc, value, tb):
+        try:
+            log.info("Lock (%s): Releasing" % self.name)
+            os.remove(self.fpath)
+        except:
+            log.error("Lock (%s): Failed to release, ignoring..." % self.name,
+                      exc_info=True)
+
+
+class LockTimeout(Exception):
+    pass
+
+
+class NonBlockingLock(object):
+    """
+    Take the same file lock as ``Lock``, but never wait for or steal it.
+
+    Raises ``LockTimeout`` when the lock is held, so background jobs can skip
+    a project that is being built instead of forcing the lock open.
+    """
+
+    def __init__(self, project):
+        self.name = project.slug
+        self.fpath = os.path.join(project.doc_path, 'rtdlock')
+
+    def __enter__(self):
+        try:
+            fd = os.open(self.fpath, os.O_CREAT | os.O_EXCL | os.O_WRONLY)
+        except OSError:
+            raise LockTimeout("Lock (%s): Lock still active" % self.name)
+        os.close(fd)
         log.info("Lock (%s): Lock aquired" % self.name)
+        return self
 
     def __exit__(self, exc, value, tb):
         try: